@@ -1,7 +1,53 @@
+# Тип БД: 'mysql' - сервер MySQL, 'sqlite' - встроенная БД (файл или ':memory:')
+DB_BACKEND = 'mysql'
+
 # Словарь конфигурации БД
 DB_CONFIG = {
     'host': 'localhost',
     'user': 'root',
     'password': 'OOPe4pass',
-    'database': 'Hotel'
-}
\ No newline at end of file
+    'database': 'Hotel',
+    # Параметры пула соединений
+    'pool_size': 5,            # максимальное число открытых соединений
+    'pool_timeout': 30,        # сколько секунд ждать свободное соединение
+    'pool_idle_timeout': 300   # через сколько секунд простоя закрывать соединение
+}
+
+# Конфигурация встроенной БД SQLite
+SQLITE_CONFIG = {
+    'database': 'hotel.db',    # ':memory:' - БД в оперативной памяти
+    'pool_size': 5
+}
+
+# Запросы дольше порога (мс) записываются в logs/slow_queries.log
+SLOW_QUERY_THRESHOLD_MS = 200
+
+# Сколько записей каждой модели хранить в LRU-кэше get_by_id (0 - кэш отключен)
+MODEL_CACHE_SIZE = 1000
+
+# Проверять доступность комнат для подсказок в интерфейсе по индексу бронирований в памяти вместо запроса к БД.
+# Индекс видит только изменения из этого процесса, поэтому перед сохранением брони
+# пересечения всегда проверяются запросом к БД
+AVAILABILITY_INDEX = True
+
+# Сколько строк загружать в списки вкладок за один раз (остальные - при прокрутке вниз)
+LIST_PAGE_SIZE = 100
+
+# Допустимое время от запуска до появления главного окна (мс); превышение пишется в журнал perf
+STARTUP_BUDGET_MS = 1500
+
+# Как строить отчеты по занятости, финансам и гостям (результат во всех режимах одинаковый,
+# различаются только скорость и нагрузка на БД). Кнопка «Применить фильтры» строит отчет заново
+# с учетом изменений с других рабочих мест; повторное открытие отчета берет его из кэша:
+# 'incremental' - частичные агрегаты в памяти, обновляемые при каждом изменении бронирования
+#   (между обновлениями видят только изменения из этого процесса, как и AVAILABILITY_INDEX);
+# 'facts' - по таблице дней бронирований room_day_stats; она ведется только в этом режиме
+#   (в MySQL ее создает python -m database migrate, а после перехода на режим
+#   python -m models.room_day_stats backfill заполняет ее по истории);
+# 'sql' - агрегаты по таблице бронирований считает БД, из нее приходят только итоговые строки;
+# 'engine' - бронирования загружаются целиком и считаются в pandas/NumPy
+REPORT_MODE = 'sql'
+
+# Сколько готовых отчетов хранить в кэше (повторное открытие отчета за тот же период - без расчета; 0 - кэш отключен).
+# Кэш сбрасывается только изменениями из этого процесса, как и AVAILABILITY_INDEX
+REPORT_CACHE_SIZE = 32
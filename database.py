@@ -1,51 +1,928 @@
+import argparse
+import re
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import date, datetime
+
 import mysql.connector
-from config import DB_CONFIG
+from config import DB_CONFIG, DB_BACKEND, SQLITE_CONFIG, SLOW_QUERY_THRESHOLD_MS, REPORT_MODE
+from exceptions import PoolTimeoutError, SchemaNotMigratedError
+from log_config import get_logger
+
+# Ключи DB_CONFIG, которые относятся к пулу и не передаются в mysql.connector.connect
+POOL_OPTIONS = ('pool_size', 'pool_timeout', 'pool_idle_timeout')
+
+# Максимальное число строк в одном многострочном INSERT (ограничение max_allowed_packet)
+BATCH_CHUNK_SIZE = 1000
+
+# Максимальное число id в одном условии IN (...)
+ID_CHUNK_SIZE = 500
+
+# Индексы приложения: имя -> (таблица, колонки). SQLite создает их при подключении,
+# в MySQL - команда python -m database migrate
+INDEXES = {
+    # Проверка пересечения бронирований: по будущим датам выезда, а не по всей истории
+    'idx_bookings_room_dates': ('bookings', ('room_id', 'is_active', 'check_out_date', 'check_in_date')),
+    # Поиск свободных комнат с сортировкой по цене
+    'idx_rooms_price': ('rooms', ('price', 'capacity')),
+    # Поиск гостей по паспорту, телефону и ФИО
+    'idx_guests_passport': ('guests', ('passport_data',)),
+    'idx_guests_phone': ('guests', ('phone_num',)),
+    'idx_guests_name': ('guests', ('surname', 'name')),
+    # Постраничный вывод бронирований по дате заезда
+    'idx_bookings_check_in': ('bookings', ('check_in_date',)),
+    # Число и дата последнего бронирования по гостям в отчете без чтения таблицы
+    'idx_bookings_guest': ('bookings', ('guest_id', 'check_in_date')),
+    # Замена дней бронирования в таблице фактов
+    'idx_room_day_stats_booking': ('room_day_stats', ('booking_id',)),
+}
+
+# Таблицы приложения в MySQL, создаются командой python -m database migrate (основные таблицы - вручную)
+MYSQL_TABLES = {
+    # Дни бронирований по номерам для отчетов (см. models/room_day_stats.py)
+    'room_day_stats': """
+        CREATE TABLE IF NOT EXISTS room_day_stats (
+            day DATE NOT NULL,
+            room_id INT NOT NULL,
+            booking_id INT NOT NULL,
+            guest_id INT NOT NULL,
+            is_active BOOLEAN NOT NULL,
+            PRIMARY KEY (day, room_id, booking_id)
+        )
+    """,
+}
+
+
+def required_tables():
+    """Таблицы из MYSQL_TABLES, без которых приложение не работает при текущем REPORT_MODE"""
+    # room_day_stats ведется и читается только в режиме отчетов 'facts'
+    return [name for name in MYSQL_TABLES if name != 'room_day_stats' or REPORT_MODE == 'facts']
+
+# Схема встроенной БД, повторяющая таблицы MySQL
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS employees (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(50) NOT NULL,
+    surname VARCHAR(50) NOT NULL,
+    patronymic VARCHAR(50),
+    phone_num VARCHAR(20) NOT NULL,
+    position VARCHAR(50) NOT NULL,
+    mail VARCHAR(100) NOT NULL,
+    date_of_employment DATE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS guests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(50) NOT NULL,
+    surname VARCHAR(50) NOT NULL,
+    patronymic VARCHAR(50),
+    phone_num VARCHAR(20) NOT NULL,
+    passport_data VARCHAR(50) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_id VARCHAR(10) NOT NULL UNIQUE,
+    type VARCHAR(30) NOT NULL,
+    price REAL NOT NULL,
+    capacity INTEGER NOT NULL,
+    is_free BOOLEAN NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guest_id INTEGER NOT NULL,
+    room_id INTEGER NOT NULL,
+    check_in_date DATE NOT NULL,
+    check_out_date DATE NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS room_day_stats (
+    day DATE NOT NULL,
+    room_id INTEGER NOT NULL,
+    booking_id INTEGER NOT NULL,
+    guest_id INTEGER NOT NULL,
+    is_active BOOLEAN NOT NULL,
+    PRIMARY KEY (day, room_id, booking_id)
+) WITHOUT ROWID;
+"""
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений с выдачей соединения на поток"""
+
+    def __init__(self, connect, size=5, timeout=30, idle_timeout=300):
+        if size <= 0:
+            raise ValueError("Размер пула должен быть положительным числом")
+
+        self.logger = get_logger('database.pool')
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._cond = threading.Condition()
+        self._idle = []  # пары (соединение, время возврата в пул)
+        self._created = 0
+        self._local = threading.local()
+
+        self._stats = {
+            'acquired': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait': 0.0,
+            'timeouts': 0,
+            'reaped': 0,
+        }
+
+    @contextmanager
+    def checkout(self):
+        """Соединение текущего потока; вложенные вызовы в одном потоке получают то же соединение"""
+        local = self._local
+        if getattr(local, 'depth', 0):
+            local.depth += 1
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn = self.acquire()
+        local.conn = conn
+        local.depth = 1
+        try:
+            yield conn
+        finally:
+            local.depth = 0
+            local.conn = None
+            self.release(conn)
+
+    def acquire(self):
+        """Взять соединение из пула, при необходимости дождавшись освобождения"""
+        started = time.monotonic()
+        waited = False
+
+        with self._cond:
+            while True:
+                self._reap_idle_locked()
+
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                    break
+
+                if self._created < self.size:
+                    self._created += 1
+                    conn = None
+                    break
+
+                waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    self._stats['timeouts'] += 1
+                    self.logger.error(f"Истекло время ожидания соединения ({self.timeout} с)")
+                    raise PoolTimeoutError(self.size, self.timeout)
+
+            self._record_acquire(started, waited)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+            self.logger.debug(f"Открыто новое соединение ({self._created}/{self.size})")
+        return conn
+
+    def release(self, conn):
+        """Вернуть соединение в пул"""
+        try:
+            # Завершаем незакрытую транзакцию, чтобы следующий поток не увидел устаревший снимок данных
+            if getattr(conn, 'in_transaction', False):
+                conn.rollback()
+        except Exception as e:
+            self.logger.warning(f"Соединение закрыто при возврате в пул: {e}")
+            self.discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Закрыть соединение, не возвращая его в пул"""
+        self._close(conn)
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def reap_idle(self):
+        """Закрыть соединения, простаивающие дольше idle_timeout"""
+        with self._cond:
+            return self._reap_idle_locked()
+
+    def close_all(self):
+        """Закрыть все свободные соединения пула"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Метрики пула: число выдач, ожиданий и время ожидания"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._created - len(self._idle)
+            stats['avg_wait'] = stats['wait_time'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+
+    def _record_acquire(self, started, waited):
+        self._stats['acquired'] += 1
+        if waited:
+            wait = time.monotonic() - started
+            self._stats['waits'] += 1
+            self._stats['wait_time'] += wait
+            self._stats['max_wait'] = max(self._stats['max_wait'], wait)
+
+    def _reap_idle_locked(self):
+        if not self.idle_timeout:
+            return 0
+        deadline = time.monotonic() - self.idle_timeout
+        expired = [conn for conn, released in self._idle if released < deadline]
+        if expired:
+            self._idle = [(conn, released) for conn, released in self._idle if released >= deadline]
+            self._created -= len(expired)
+            self._stats['reaped'] += len(expired)
+            for conn in expired:
+                self._close(conn)
+            self.logger.debug(f"Закрыто {len(expired)} простаивающих соединений")
+            self._cond.notify_all()
+        return len(expired)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            self.logger.warning(f"Ошибка при закрытии соединения: {e}")
+
+
+class QueryStats:
+    """Время, число вызовов и строк по каждому нормализованному SQL-запросу за сессию"""
+
+    def __init__(self, slow_threshold_ms=SLOW_QUERY_THRESHOLD_MS):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.logger = get_logger('perf')
+        self.slow_logger = get_logger('perf.slow_queries')
+        self._lock = threading.Lock()
+        self._queries = {}
+
+    def record(self, query, elapsed, rows, caller):
+        sql = normalize_sql(query)
+        elapsed_ms = elapsed * 1000
+
+        with self._lock:
+            entry = self._queries.get(sql)
+            if entry is None:
+                entry = self._queries[sql] = {
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'callers': Counter()
+                }
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['rows'] += rows or 0
+            entry['callers'][caller] += 1
+
+        if self.slow_threshold_ms is not None and elapsed_ms >= self.slow_threshold_ms:
+            self.slow_logger.warning(f"{elapsed_ms:.1f} мс, строк: {rows}, вызов: {caller} | {sql}")
+
+    def summary(self):
+        """Агрегаты по запросам, отсортированные по суммарному времени"""
+        with self._lock:
+            items = [dict(entry, sql=sql, callers=dict(entry['callers']))
+                     for sql, entry in self._queries.items()]
+        for item in items:
+            item['avg_ms'] = item['total_ms'] / item['count']
+        return sorted(items, key=lambda item: item['total_ms'], reverse=True)
+
+    def dump(self, limit=None):
+        """Записать агрегаты в журнал perf и вернуть их в виде текста"""
+        items = self.summary()
+        total_count = sum(item['count'] for item in items)
+        total_ms = sum(item['total_ms'] for item in items)
+
+        lines = [f"Статистика запросов: {total_count} запросов, {total_ms:.1f} мс"]
+        for item in items[:limit]:
+            callers = ", ".join(f"{name} x{count}" for name, count in item['callers'].items())
+            lines.append(
+                f"{item['count']:>7} x {item['avg_ms']:8.2f} мс = {item['total_ms']:10.1f} мс "
+                f"(макс. {item['max_ms']:.1f}, строк {item['rows']}) {item['sql']} [{callers}]"
+            )
+        text = "\n".join(lines)
+        self.logger.info(text)
+        return text
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+
+def normalize_sql(query):
+    """SQL без литералов и лишних пробелов: запросы, отличающиеся только параметрами, совпадают"""
+    sql = _WHITESPACE_RE.sub(' ', query).strip()
+    sql = _LITERAL_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+def _find_caller():
+    """Метод модели (или первая функция вне модуля БД), из которого выполнен запрос"""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module != __name__ and module != 'contextlib':
+            name = getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+            if module.startswith('models'):
+                return name
+            if fallback is None:
+                fallback = f"{module}.{name}"
+        frame = frame.f_back
+    return fallback or '?'
+
+
+class MySQLBackend:
+    """Подключение к серверу MySQL"""
+    name = 'mysql'
+    # Небуферизованный курсор занимает соединение до конца чтения
+    streams_on_own_connection = True
+
+    def __init__(self, **params):
+        self.logger = get_logger('database')
+        self.params = {k: v for k, v in params.items() if k not in POOL_OPTIONS}
+        self.pool_options = {
+            'size': params.get('pool_size', 5),
+            'timeout': params.get('pool_timeout', 30),
+            'idle_timeout': params.get('pool_idle_timeout', 300),
+        }
+        self._schema_checked = False
+        self._schema_lock = threading.Lock()
+        # Соединение -> выдает ли сервер id многострочного INSERT подряд
+        self._consecutive_ids = weakref.WeakKeyDictionary()
+
+    def connect(self):
+        conn = mysql.connector.connect(**self.params)
+        self._check_schema(conn)
+        self._consecutive_ids[conn] = self._has_consecutive_ids(conn)
+        return conn
+
+    def cursor(self, conn, dictionary=False, buffered=None):
+        return conn.cursor(dictionary=dictionary, buffered=buffered)
+
+    def translate(self, query):
+        return query
+
+    def insert_many(self, conn, cursor, query, params_seq):
+        """Многострочный INSERT; MySQL выдает пакету из одного запроса последовательные id начиная с lastrowid.
+
+        Если на соединении id идут не подряд (auto_increment_increment > 1), строки вставляются по одной.
+        """
+        ids = []
+        if not self._consecutive_ids.get(conn, False):
+            for params in params_seq:
+                cursor.execute(query, params)
+                ids.append(cursor.lastrowid)
+            return ids
+
+        for start in range(0, len(params_seq), BATCH_CHUNK_SIZE):
+            chunk = params_seq[start:start + BATCH_CHUNK_SIZE]
+            cursor.executemany(query, chunk)
+            ids.extend(range(cursor.lastrowid, cursor.lastrowid + len(chunk)))
+        return ids
+
+    def _has_consecutive_ids(self, conn):
+        # Многострочный INSERT ... VALUES - "простая" вставка: при любом innodb_autoinc_lock_mode
+        # она получает id подряд, шаг между ними задает auto_increment_increment
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT @@auto_increment_increment")
+            increment = int(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+        if increment != 1:
+            self.logger.warning(f"auto_increment_increment = {increment}: пакетная вставка будет построчной")
+        return increment == 1
+
+    def _check_schema(self, conn):
+        """Проверить схему при первом подключении; схему не меняет.
+
+        Без нужных таблиц (required_tables) подключение завершается SchemaNotMigratedError,
+        о недостающих индексах и остальных таблицах только пишется предупреждение.
+        """
+        with self._schema_lock:
+            if self._schema_checked:
+                return
+            try:
+                missing = self._missing_schema(conn)
+            except Exception as e:
+                self._schema_checked = True
+                self.logger.warning(f"Не удалось проверить схему БД: {e}")
+                return
+
+            tables = [name for name in missing if name in required_tables()]
+            if tables:
+                conn.close()
+                self.logger.error(f"В БД нет таблиц: {', '.join(tables)}")
+                raise SchemaNotMigratedError(tables)
+            self._schema_checked = True
+        if missing:
+            # Без индексов (и таблиц, не нужных в текущем REPORT_MODE) приложение работает, только медленнее
+            self.logger.warning(f"В БД нет таблиц/индексов: {', '.join(missing)}. "
+                                f"Создайте их командой: python -m database migrate")
+
+    def _missing_schema(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()")
+            tables = {row[0].lower() for row in cursor.fetchall()}
+            cursor.execute(
+                "SELECT DISTINCT index_name FROM information_schema.statistics WHERE table_schema = DATABASE()"
+            )
+            indexes = {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+        return ([name for name in MYSQL_TABLES if name not in tables]
+                + [name for name in INDEXES if name not in indexes])
+
+    def migrate(self):
+        """Создать недостающие таблицы из MYSQL_TABLES и индексы из INDEXES; возвращает созданные имена"""
+        # Отдельное соединение: соединения пула без нужных таблиц не выдаются
+        conn = mysql.connector.connect(**self.params)
+        try:
+            return self._migrate(conn)
+        finally:
+            conn.close()
+
+    def _migrate(self, conn):
+        missing = self._missing_schema(conn)
+        cursor = conn.cursor()
+        try:
+            for name in missing:
+                if name in MYSQL_TABLES:
+                    self.logger.info(f"Создание таблицы {name}")
+                    cursor.execute(MYSQL_TABLES[name])
+            for name in missing:
+                if name in INDEXES:
+                    table, columns = INDEXES[name]
+                    self.logger.info(f"Создание индекса {name} на {table}")
+                    cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+            conn.commit()
+        finally:
+            cursor.close()
+        return missing
+
+
+class SQLiteBackend:
+    """Встроенная БД SQLite (файл или ':memory:') с той же схемой, что и в MySQL"""
+    name = 'sqlite'
+
+    def __init__(self, database=':memory:', timeout=30, **pool_params):
+        self.database = database
+        self.timeout = timeout
+        # Потоковое чтение - со своего соединения, чтобы не держать соединение потока между итерациями;
+        # у БД в памяти второго соединения нет (оно открыло бы другую, пустую БД)
+        self.streams_on_own_connection = database != ':memory:'
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+        if database == ':memory:':
+            # БД в памяти живет, пока открыто ее единственное соединение
+            self.pool_options = {'size': 1, 'timeout': pool_params.get('pool_timeout', 30), 'idle_timeout': 0}
+        else:
+            self.pool_options = {
+                'size': pool_params.get('pool_size', 5),
+                'timeout': pool_params.get('pool_timeout', 30),
+                'idle_timeout': pool_params.get('pool_idle_timeout', 300),
+            }
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,  # соединение переходит между потоками через пул
+            factory=_SQLiteConnection
+        )
+        conn.row_factory = _dict_row
+        conn.create_function('NOW', 0, lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        # DATEDIFF из MySQL для запросов отчетов (GREATEST/LEAST заменяет translate)
+        conn.create_function('DATEDIFF', 2, _sql_datediff, deterministic=True)
+        if self.database != ':memory:':
+            conn.execute("PRAGMA journal_mode=WAL")
+        self._init_schema(conn)
+        return conn
+
+    def cursor(self, conn, dictionary=False, buffered=None):
+        return conn.cursor()
+
+    def translate(self, query):
+        """Плейсхолдеры MySQL (%s) -> SQLite (?), GREATEST/LEAST -> многоаргументные MAX/MIN, без FOR UPDATE"""
+        query = _PLACEHOLDER_RE.sub(lambda m: '?' if m.group(0) == '%s' else '%', query)
+        # Блокировок строк в SQLite нет: пишущие транзакции и так выполняются по одной
+        query = _FOR_UPDATE_RE.sub('', query)
+        # Встроенные MAX/MIN от нескольких аргументов, как и в MySQL, дают NULL, если есть NULL
+        return _GREATEST_LEAST_RE.sub(lambda m: 'MAX(' if m.group(1).upper() == 'GREATEST' else 'MIN(', query)
+
+    def insert_many(self, conn, cursor, query, params_seq):
+        # executemany в sqlite3 не сообщает id вставленных строк; внутри одной транзакции
+        # построчная вставка не требует лишних обращений к диску
+        ids = []
+        for params in params_seq:
+            cursor.execute(query, params)
+            ids.append(cursor.lastrowid)
+        return ids
+
+    def _init_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready and self.database != ':memory:':
+                return
+            conn.executescript(SQLITE_SCHEMA)
+            for name, (table, columns) in INDEXES.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+            conn.commit()
+            self._schema_ready = True
+
+    def migrate(self):
+        # Схема SQLite создается при подключении
+        self.connect().close()
+        return []
+
+
+_PLACEHOLDER_RE = re.compile(r'%s|%%')
+_GREATEST_LEAST_RE = re.compile(r'\b(GREATEST|LEAST)\s*\(', re.IGNORECASE)
+_FOR_UPDATE_RE = re.compile(r'\s+FOR\s+UPDATE\s*$', re.IGNORECASE)
+# Таблица, которую изменяет запрос INSERT / UPDATE / DELETE / REPLACE
+_WRITE_TABLE_RE = re.compile(r'^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+`?(\w+)',
+                             re.IGNORECASE)
+
+
+class _SQLiteConnection(sqlite3.Connection):
+    def close(self):
+        # Обновить статистику планировщика для заметно изменившихся таблиц: без нее SQLite
+        # выбирает для запросов отчетов диапазон по дате заезда вместо покрывающего индекса
+        try:
+            self.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        super().close()
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+@lru_cache(maxsize=8192)
+def _day_ordinal(value):
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+def _sql_datediff(end, start):
+    """DATEDIFF(end, start) из MySQL: число дней между датами 'ГГГГ-ММ-ДД'"""
+    if end is None or start is None:
+        return None
+    # Различных дат в таблице немного, поэтому разбор строки кэшируется
+    return _day_ordinal(end) - _day_ordinal(start)
+
+
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+
+
+def create_backend(name=None):
+    """Бэкенд по имени из конфигурации ('mysql' или 'sqlite')"""
+    name = name or DB_BACKEND
+    if name == 'mysql':
+        return MySQLBackend(**DB_CONFIG)
+    if name == 'sqlite':
+        return SQLiteBackend(**SQLITE_CONFIG)
+    raise ValueError(f"Неизвестный тип БД: {name}")
+
 
 class Database:
     _instance = None
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(Database, cls).__new__(cls)
-            cls._instance.connection = None
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(Database, cls).__new__(cls)
+                    instance.backend = None
+                    instance.pool = None
+                    instance._local = threading.local()
+                    instance.query_stats = QueryStats()
+                    instance._versions = Counter()
+                    instance._versions_lock = threading.Lock()
+                    cls._instance = instance
         return cls._instance
 
+    def use_backend(self, backend):
+        """Переключить БД на другой бэкенд (None - бэкенд из конфигурации)"""
+        self.disconnect()
+        self.backend = backend
+        # Данные другой БД: все ранее выданные версии устарели
+        self._bump_version('*')
+
     def connect(self):
-        if self.connection is None:
-            self.connection = mysql.connector.connect(**DB_CONFIG)
-        return self.connection
+        """Создать пул соединений (если он еще не создан)"""
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    if self.backend is None:
+                        self.backend = create_backend()
+                    self.pool = ConnectionPool(self.backend.connect, **self.backend.pool_options)
+        return self.pool
 
     def disconnect(self):
-        if self.connection:
-            self.connection.close()
-            self.connection = None
+        if self.pool:
+            self.pool.close_all()
+            self.pool = None
+
+    @contextmanager
+    def connection(self):
+        """Соединение из пула, закрепленное за текущим потоком"""
+        with self.connect().checkout() as conn:
+            yield conn
+
+    def pool_stats(self):
+        return self.connect().stats()
+
+    @contextmanager
+    def transaction(self):
+        """Единица работы: изменения всех моделей внутри блока фиксируются одним commit.
+
+        Вложенные блоки присоединяются к внешней транзакции; при исключении
+        все изменения откатываются.
+        """
+        local = self._local
+        if getattr(local, 'tx_depth', 0):
+            local.tx_depth += 1
+            try:
+                yield self
+            finally:
+                local.tx_depth -= 1
+            return
+
+        with self.connection() as conn:
+            local.tx_depth = 1
+            local.on_commit = []
+            try:
+                yield self
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                local.tx_depth = 0
+                callbacks, local.on_commit = local.on_commit, []
+
+        # Сюда доходим только после успешного commit
+        for callback in callbacks:
+            callback()
+
+    def in_transaction(self):
+        return bool(getattr(self._local, 'tx_depth', 0))
+
+    def after_commit(self, callback):
+        """Выполнить callback после фиксации текущей транзакции (или сразу, если ее нет).
+
+        При откате транзакции callback не вызывается.
+        """
+        if self.in_transaction():
+            self._local.on_commit.append(callback)
+        else:
+            callback()
+
+    def data_version(self, *tables):
+        """Версии данных таблиц: растут после каждой зафиксированной записи в таблицу.
+
+        Учитываются только изменения, сделанные через этот объект (в этом процессе);
+        смена бэкенда меняет версии всех таблиц.
+        """
+        with self._versions_lock:
+            return (self._versions['*'],) + tuple(self._versions[table] for table in tables)
+
+    def _changed(self, query):
+        match = _WRITE_TABLE_RE.match(query)
+        if match:
+            table = match.group(1).lower()
+            self.after_commit(lambda: self._bump_version(table))
+
+    def _bump_version(self, table):
+        with self._versions_lock:
+            self._versions[table] += 1
+
+    def migrate(self):
+        """Создать недостающие таблицы и индексы приложения; возвращает их имена"""
+        self.connect()
+        return self.backend.migrate()
+
+    def check_schema(self):
+        """Подключиться к БД при запуске: без нужных таблиц - SchemaNotMigratedError"""
+        with self.connection():
+            pass
+
+    def dump_query_stats(self, limit=None):
+        """Сводка по запросам текущей сессии (пишется в журнал perf)"""
+        return self.query_stats.dump(limit)
+
+    def _record(self, query, started, rows):
+        self.query_stats.record(query, time.perf_counter() - started, rows, _find_caller())
 
     def execute_query(self, query, params=None):
-        conn = self.connect()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(query, params or ())
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            cursor.close()
+        """Выполнить запрос на изменение; для INSERT возвращает id новой записи.
+
+        Внутри transaction() фиксация откладывается до конца блока.
+        """
+        started = time.perf_counter()
+        with self.connection() as conn:
+            cursor = self.backend.cursor(conn)
+            try:
+                cursor.execute(self.backend.translate(query), params or ())
+                if not self.in_transaction():
+                    conn.commit()
+                self._record(query, started, cursor.rowcount)
+                self._changed(query)
+                return cursor.lastrowid
+            except Exception as e:
+                if not self.in_transaction():
+                    conn.rollback()
+                raise e
+            finally:
+                cursor.close()
+
+    def execute_many(self, query, params_seq, return_ids=False):
+        """Выполнить запрос для набора параметров в одной транзакции.
+
+        С return_ids=True (для INSERT) возвращает список id новых записей
+        в порядке параметров, иначе - число затронутых строк.
+        """
+        params_seq = [tuple(params) for params in params_seq]
+        if not params_seq:
+            return [] if return_ids else 0
+
+        started = time.perf_counter()
+        sql = self.backend.translate(query)
+        with self.connection() as conn:
+            cursor = self.backend.cursor(conn)
+            try:
+                if return_ids:
+                    result = self.backend.insert_many(conn, cursor, sql, params_seq)
+                else:
+                    result = 0
+                    for start in range(0, len(params_seq), BATCH_CHUNK_SIZE):
+                        cursor.executemany(sql, params_seq[start:start + BATCH_CHUNK_SIZE])
+                        result += cursor.rowcount
+                if not self.in_transaction():
+                    conn.commit()
+                self._record(query, started, len(params_seq))
+                self._changed(query)
+                return result
+            except Exception as e:
+                if not self.in_transaction():
+                    conn.rollback()
+                raise e
+            finally:
+                cursor.close()
 
     def fetch_all(self, query, params=None):
-        conn = self.connect()
-        cursor = conn.cursor(dictionary=True)  # чтобы получить результаты в виде словаря
-        try:
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
-        finally:
-            cursor.close()
+        started = time.perf_counter()
+        with self.connection() as conn:
+            cursor = self.backend.cursor(conn, dictionary=True)  # чтобы получить результаты в виде словаря
+            try:
+                cursor.execute(self.backend.translate(query), params or ())
+                rows = cursor.fetchall()
+                self._record(query, started, len(rows))
+                return rows
+            finally:
+                cursor.close()
 
     def fetch_one(self, query, params=None):
-        conn = self.connect()
-        cursor = conn.cursor(dictionary=True)
+        started = time.perf_counter()
+        with self.connection() as conn:
+            cursor = self.backend.cursor(conn, dictionary=True)
+            try:
+                cursor.execute(self.backend.translate(query), params or ())
+                row = cursor.fetchone()
+                self._record(query, started, 1 if row else 0)
+                return row
+            finally:
+                cursor.close()
+
+    def fetch_by_ids(self, table, ids):
+        """Строки таблицы по списку первичных ключей (словарь id -> строка), запросами IN (...) по частям"""
+        ids = list(dict.fromkeys(int(id) for id in ids))
+        rows = {}
+        for start in range(0, len(ids), ID_CHUNK_SIZE):
+            chunk = ids[start:start + ID_CHUNK_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            query = f"SELECT * FROM {table} WHERE id IN ({placeholders})"
+            for row in self.fetch_all(query, tuple(chunk)):
+                rows[row['id']] = row
+        return rows
+
+    def fetch_page(self, table, after_id=None, limit=100, order_column='id', descending=False):
+        """Страница строк таблицы в порядке (order_column, id), начиная после строки after_id.
+
+        Keyset-пагинация: следующая страница ищется по индексу от последней строки,
+        поэтому ее стоимость не растет с номером страницы, как у OFFSET.
+        order_column подставляется в запрос как есть - передавать только проверенные имена колонок.
+        """
+        op = "<" if descending else ">"
+        direction = " DESC" if descending else ""
+        query = f"SELECT * FROM {table}"
+        params = []
+        if after_id is not None:
+            if order_column == 'id':
+                query += f" WHERE id {op} %s"
+                params.append(after_id)
+            else:
+                anchor = f"(SELECT {order_column} FROM {table} WHERE id = %s)"
+                query += f" WHERE {order_column} {op} {anchor} OR ({order_column} = {anchor} AND id {op} %s)"
+                params.extend([after_id, after_id, after_id])
+        query += f" ORDER BY {order_column}{direction}, id{direction} LIMIT %s"
+        params.append(int(limit))
+        return self.fetch_all(query, tuple(params))
+
+    def fetch_iter(self, query, params=None, batch_size=500):
+        """Построчное чтение большой выборки пачками по batch_size строк без загрузки всей выборки в память"""
+        pool = self.connect()
+        if self.backend.streams_on_own_connection:
+            yield from self._stream_on_own_connection(pool, query, params, batch_size)
+            return
+
+        # Единственное соединение БД в памяти нельзя занимать между итерациями: другие потоки
+        # ждали бы его, а незавершенный генератор сбил бы счетчик вложенности соединения потока.
+        # Выборка читается за одну короткую выдачу - данные такой БД и так находятся в памяти
+        started = time.perf_counter()
+        with pool.checkout() as conn:
+            cursor = self.backend.cursor(conn, dictionary=True)
+            try:
+                cursor.execute(self.backend.translate(query), params or ())
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        self._record(query, started, len(rows))
+        yield from rows
+
+    def _stream_on_own_connection(self, pool, query, params, batch_size):
+        # Отдельное соединение, чтобы запросы текущего потока не ждали окончания чтения
+        started = time.perf_counter()
+        count = 0
+        conn = pool.acquire()
+        cursor = self.backend.cursor(conn, dictionary=True, buffered=False)
+        finished = False
         try:
-            cursor.execute(query, params or ())
-            return cursor.fetchone()
+            cursor.execute(self.backend.translate(query), params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                yield from rows
+            finished = True
+            self._record(query, started, count)
         finally:
-            cursor.close()
\ No newline at end of file
+            if finished:
+                cursor.close()
+                pool.release(conn)
+            else:
+                # Недочитанный результат оставляет соединение в неработоспособном состоянии
+                pool.discard(conn)
+
+
+if __name__ == "__main__":
+    from log_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Обслуживание схемы БД")
+    parser.add_argument('command', choices=['migrate'], help="migrate - создать недостающие таблицы и индексы")
+    args = parser.parse_args()
+
+    setup_logging()
+    created = Database().migrate()
+    print(f"Создано: {', '.join(created)}" if created else "Схема БД актуальна")
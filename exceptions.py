@@ -96,13 +96,42 @@ class InvalidBookingDataError(BookingError):
 
 class BookingConflictError(BookingError):
     """Конфликт бронирований"""
-    def __init__(self, room_number: str, check_in: str, check_out: str):
-        super().__init__(
-            f"Конфликт бронирований для комнаты {room_number} "
-            f"в период с {check_in} по {check_out}"
-        )
+    def __init__(self, room_number: str, check_in: str, check_out: str, free_from: Optional[str] = None):
+        message = f"Конфликт бронирований для комнаты {room_number} в период с {check_in} по {check_out}"
+        if free_from:
+            message += f". Ближайший свободный заезд на те же ночи: {free_from}"
+        super().__init__(message)
 
 class BookingDateError(BookingError):
     """Ошибка в датах бронирования"""
     def __init__(self, message: str):
         super().__init__(f"Ошибка дат бронирования: {message}")
+
+
+# Database Errors
+class DatabaseError(HotelManagementError):
+    """Базовый класс для ошибок работы с БД"""
+    pass
+
+class PoolTimeoutError(DatabaseError):
+    """Не удалось получить соединение из пула за отведенное время"""
+    def __init__(self, pool_size: int, timeout: float):
+        super().__init__(
+            f"Все соединения с БД заняты ({pool_size}), "
+            f"не удалось получить соединение за {timeout} с."
+        )
+
+class SchemaNotMigratedError(DatabaseError):
+    """В БД нет таблиц, без которых приложение не работает"""
+    def __init__(self, tables):
+        super().__init__(
+            f"В БД нет таблиц: {', '.join(tables)}. "
+            f"Создайте их командой: python -m database migrate"
+        )
+
+
+# Background Task Errors
+class TaskCancelledError(HotelManagementError):
+    """Фоновая задача отменена"""
+    def __init__(self, task_name: str):
+        super().__init__(f"Задача «{task_name}» отменена.")
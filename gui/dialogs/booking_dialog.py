@@ -1,6 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from models import Booking, Guest, HotelRoom
+from database import Database
+from services.guest_search import guest_search
+from gui.task_executor import TaskExecutor
 from datetime import datetime
 from exceptions import (
     InvalidBookingDataError,
@@ -11,6 +14,9 @@ from exceptions import (
     InvalidDataError
 )
 
+# Сколько подсказок показывать в списке гостей
+GUEST_SUGGESTIONS = 20
+
 
 class BookingDialog:
     def __init__(self, parent, title, booking=None):
@@ -25,6 +31,8 @@ class BookingDialog:
         self.dialog.resizable(False, False)
         self.dialog.transient(parent)
         self.dialog.grab_set()
+        # Задачи опрашиваются через окно-владельца: диалог может закрыться раньше, чем они завершатся
+        self.tasks = TaskExecutor(parent)
 
         self.rooms = HotelRoom.get_all()
         #self.rooms = HotelRoom.get_available_rooms()
@@ -34,6 +42,8 @@ class BookingDialog:
             self.refresh_guest_list()
         else:
             self.load_reservation_data()
+        # Календарь занятости для подсказок о свободных датах строится в фоне
+        self.tasks.submit(lambda task: self._calendar().load(), name="Календарь занятости")
         self.dialog.wait_window()
 
     def clear_guest_fields(self):
@@ -93,10 +103,11 @@ class BookingDialog:
 
         self.guest_combobox = ttk.Combobox(combo_frame, width=23)
         self.guest_combobox.grid(row=0, column=0, sticky='ew')
+        self.guest_combobox.bind('<KeyRelease>', self.on_guest_typed)
 
         # Кнопка обновления списка гостей
         refresh_btn = tk.Button(combo_frame, text="🔄", width=2,
-                                command=self.refresh_guest_list,
+                                command=self.reload_guest_list,
                                 font=("Arial", 8))
         refresh_btn.grid(row=0, column=1, padx=(5, 0))
 
@@ -171,16 +182,22 @@ class BookingDialog:
             row=row_offset + 4, column=0, columnspan=2, pady=5, padx=5, sticky='ew'
         )
 
+        # Подбор номеров, свободных на указанные даты
+        ttk.Button(self.scrollable_frame, text="Показать свободные номера на даты",
+                   command=self.show_free_rooms).grid(
+            row=row_offset + 5, column=0, columnspan=2, pady=5, padx=5, sticky='ew'
+        )
+
         # Статус
         if self.booking:
             tk.Label(self.scrollable_frame, text="Статус:").grid(
-                row=row_offset + 5, column=0, sticky='w', pady=5
+                row=row_offset + 6, column=0, sticky='w', pady=5
             )
             self.status_var = tk.BooleanVar()
             self.status_check = ttk.Checkbutton(
                 self.scrollable_frame, text="Активно", variable=self.status_var
             )
-            self.status_check.grid(row=row_offset + 5, column=1, pady=5, padx=5, sticky='w')
+            self.status_check.grid(row=row_offset + 6, column=1, pady=5, padx=5, sticky='w')
 
         self.scrollable_frame.columnconfigure(1, weight=1)
 
@@ -196,6 +213,69 @@ class BookingDialog:
         if not self.booking:
             self.name_entry.focus_set()
 
+    def show_free_rooms(self):
+        """Оставить в списке номеров только свободные на введенные даты"""
+        try:
+            checkin_date = datetime.strptime(self.checkin_entry.get().strip(), "%Y-%m-%d").date()
+            checkout_date = datetime.strptime(self.checkout_entry.get().strip(), "%Y-%m-%d").date()
+        except ValueError:
+            messagebox.showerror("Ошибка данных", "Даты должны быть в формате ГГГГ-ММ-ДД")
+            return
+
+        try:
+            free_rooms = HotelRoom.find_available(checkin_date, checkout_date)
+        except InvalidDataError as e:
+            messagebox.showerror("Ошибка данных", str(e))
+            return
+
+        # Номер редактируемого бронирования занят им самим - оставляем его в списке
+        if self.booking and all(room.id != self.booking.get_room_id() for room in free_rooms):
+            if Booking.is_room_available(self.booking.get_room_id(), checkin_date, checkout_date, self.booking.id):
+                room = HotelRoom.get_by_id(self.booking.get_room_id())
+                if room:
+                    free_rooms.insert(0, room)
+
+        self.room_combobox['values'] = [f"{room.get_number()} ({room.get_type()})" for room in free_rooms]
+        if not free_rooms:
+            message = "На выбранные даты свободных номеров нет"
+            nights = (checkout_date - checkin_date).days
+            # Подсказка по календарю занятости, если он уже построен (окно не ждет БД)
+            calendar = self._calendar()
+            found = calendar.loaded and calendar.earliest_free_gap(
+                nights, checkin_date, room_ids=[room.id for room in self.rooms],
+                exclude_booking_id=self.booking.id if self.booking else None)
+            if found:
+                free_from, room_id = found
+                number = next(room.get_number() for room in self.rooms if room.id == room_id)
+                message += f"\nБлижайший заезд на {nights} ноч.: {free_from}, номер {number}"
+            messagebox.showinfo("Информация", message)
+
+    def on_guest_typed(self, event=None):
+        """Подсказки гостей по введенному тексту (фамилия, имя, отчество или телефон)"""
+        if not guest_search.loaded:
+            # Индекс строится в фоне; подсказки появятся, когда он будет готов
+            self.load_guest_index()
+            return
+        matches = guest_search.search(self.guest_combobox.get(), limit=GUEST_SUGGESTIONS)
+        self.guest_combobox['values'] = [match['full_name'] for match in matches]
+
+    def load_guest_index(self, reload=False):
+        """Построить (reload=True - перестроить) индекс поиска гостей в фоне и затем обновить подсказки"""
+        def on_done(result):
+            if self.dialog.winfo_exists():
+                self.on_guest_typed()
+
+        build = guest_search.reload if reload else guest_search.load
+        self.tasks.submit(lambda task: build(), on_done=on_done,
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось загрузить список гостей: {str(e)}"),
+                          name="Индекс поиска гостей", key='guest_index')
+
+    def reload_guest_list(self):
+        """Перечитать гостей из БД (с учетом изменений с других рабочих мест)"""
+        # До конца перестроения подсказки идут по прежнему индексу
+        self.load_guest_index(reload=True)
+
     def toggle_guest_mode(self):
         """Переключение между режимами выбора гостя"""
         if self.guest_mode_var.get() == "existing":
@@ -209,29 +289,16 @@ class BookingDialog:
             self.name_entry.focus_set()
 
     def refresh_guest_list(self):
-        """Обновить список гостей в Combobox"""
+        """Обновить список гостей в Combobox по введенному тексту"""
         try:
-            self.guests = Guest.get_all()
-            guest_names = [guest.full_name() for guest in self.guests]
-            self.guest_combobox['values'] = guest_names
-
-            # Если это редактирование бронирования и есть текущий гость - выбираем его
-            if self.booking and self.guests:
-                guest_id = self.booking.get_guest_id()
-                current_guest = None
-                for guest in self.guests:
-                    if guest.id == guest_id:
-                        current_guest = guest
-                        break
-
+            # Если это редактирование бронирования - подставляем текущего гостя
+            if self.booking and not self.guest_combobox.get().strip():
+                current_guest = Guest.get_by_id(self.booking.get_guest_id())
                 if current_guest:
                     self.guest_combobox.set(current_guest.full_name())
-                elif guest_names:
-                    self.guest_combobox.set(guest_names[0])
-            elif guest_names:
-                self.guest_combobox.set(guest_names[0])
-            else:
-                self.guest_combobox.set('')
+
+            # Весь список гостей не загружается: подсказки подбираются по мере ввода
+            self.on_guest_typed()
 
         except Exception as e:
             error_msg = str(e)
@@ -386,11 +453,13 @@ class BookingDialog:
 
             exclude_id = self.booking.id if self.booking else None
 
-            if not Booking.is_room_available(room.id, checkin_date, checkout_date, exclude_id):
+            # Окончательная проверка - запросом к БД: индекс не видит брони с других рабочих мест
+            if not Booking.is_room_available(room.id, checkin_date, checkout_date, exclude_id, use_index=False):
                 raise BookingConflictError(
                     room_number,
                     str(checkin_date),
-                    str(checkout_date)
+                    str(checkout_date),
+                    self._free_gap_hint(room.id, checkin_date, checkout_date, exclude_id)
                 )
 
         except ValueError:
@@ -402,13 +471,8 @@ class BookingDialog:
             if not guest_name:
                 raise InvalidBookingDataError("Выберите гостя из списка")
 
-            self.guests = Guest.get_all()
-
-            guest = None
-            for g in self.guests:
-                if g.full_name() == guest_name:
-                    guest = g
-                    break
+            guests = Guest.find_by_name(guest_name)
+            guest = guests[0] if guests else None
 
             if not guest:
                 raise PersonNotFoundError(identifier=guest_name)
@@ -419,16 +483,9 @@ class BookingDialog:
             try:
                 guest_data = self._validate_guest_fields()
 
-                self.guests = Guest.get_all()
                 # Проверяем, существует ли уже такой гость (по паспорту или телефону)
-                existing_guest = None
-                for guest in self.guests:
-                    if guest.get_passport_data() == guest_data['passport_data']:
-                        existing_guest = guest
-                        break
-                    elif guest.get_phone_num() == guest_data['phone_num']:
-                        existing_guest = guest
-                        break
+                existing_guest = (Guest.find_by_passport(guest_data['passport_data'])
+                                  or Guest.find_by_phone(guest_data['phone_num']))
 
                 if existing_guest:
                     guest_id = existing_guest.id
@@ -460,9 +517,23 @@ class BookingDialog:
             'is_active': self.status_var.get() if hasattr(self, 'status_var') else True
         }
 
+    @staticmethod
+    def _calendar():
+        # NumPy загружается при первом открытии диалога, а не при запуске
+        from services.occupancy_calendar import occupancy_calendar
+        return occupancy_calendar
+
+    def _free_gap_hint(self, room_id, checkin_date, checkout_date, exclude_id):
+        """Ближайший заезд в номер на те же ночи по календарю занятости (если он уже построен)"""
+        calendar = self._calendar()
+        if not calendar.loaded:
+            return None
+        free_from = calendar.first_free_gap(room_id, (checkout_date - checkin_date).days, checkin_date,
+                                            exclude_booking_id=exclude_id)
+        return str(free_from) if free_from else None
+
     def save_booking(self):
         try:
-            self.guests = Guest.get_all()
             self.rooms = HotelRoom.get_all()
             #self.rooms = HotelRoom.get_available_rooms()
 
@@ -496,13 +567,16 @@ class BookingDialog:
             check_out_date=data['checkout'],
             is_active=data['is_active']
         )
-        booking.save()
 
-        # Пометить номер как занятый
-        room = HotelRoom.get_by_id(data['room_id'])
-        if room:
-            room.set_free(False)
-            room.update()
+        # Бронирование и статус номера сохраняются одной транзакцией
+        with Database().transaction():
+            booking.save()
+
+            # Пометить номер как занятый
+            room = HotelRoom.get_by_id(data['room_id'])
+            if room:
+                room.set_free(False)
+                room.update()
 
         messagebox.showinfo("Успех", "Бронирование создано!")
 
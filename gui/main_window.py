@@ -1,28 +1,91 @@
-from tkinter import ttk
+import time
+from tkinter import ttk, messagebox
+from config import STARTUP_BUDGET_MS
+from log_config import get_logger
 from gui.tabs.employees_tab import EmployeesTab
 from gui.tabs.rooms_tab import RoomsTab
 from gui.tabs.bookings_tab import BookingsTab
 from gui.tabs.reports_tab import ReportsTab
 
+
 class HotelApp:
-    def __init__(self, root):
+    # Вкладки создаются при первом выборе: (заголовок, класс, атрибут приложения)
+    TABS = [
+        ("Сотрудники", EmployeesTab, 'employees_tab'),
+        ("Номера", RoomsTab, 'rooms_tab'),
+        ("Бронирования", BookingsTab, 'bookings_tab'),
+        ("Отчеты", ReportsTab, 'reports_tab'),
+    ]
+
+    def __init__(self, root, started_at=None):
         self.root = root
         self.root.title("Hotel Management")
         self.root.geometry("1200x800")
         self.root.resizable(False, False)
 
+        self.logger = get_logger('perf')
+        # Время запуска процесса для замера времени до появления окна
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.startup_ms = None
 
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
 
-        # Инициализация вкладок
-        self.employees_tab = EmployeesTab(self.notebook)
-        self.rooms_tab = RoomsTab(self.notebook)
-        self.bookings_tab = BookingsTab(self.notebook)
-        self.reports_tab = ReportsTab(self.notebook)
-
-        # Добавление вкладок
-        self.notebook.add(self.employees_tab, text="Сотрудники")
-        self.notebook.add(self.rooms_tab, text="Номера")
-        self.notebook.add(self.bookings_tab, text="Бронирования")
-        self.notebook.add(self.reports_tab, text="Отчеты")
\ No newline at end of file
+        # Пустые вкладки-заглушки; содержимое создается в on_tab_changed
+        for title, tab_class, attr in self.TABS:
+            setattr(self, attr, None)
+            container = ttk.Frame(self.notebook)
+            ttk.Label(container, text="Загрузка...").pack(pady=20)
+            self.notebook.add(container, text=title)
+
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        # Первая вкладка создается сразу после появления окна
+        self.root.after_idle(self.on_tab_changed)
+        self.root.bind('<Map>', self._on_first_map)
+
+    def on_tab_changed(self, event=None):
+        """Создание вкладки при первом выборе; начальные данные читаются в фоновом потоке"""
+        title, tab_class, attr = self.TABS[self.notebook.index('current')]
+        if getattr(self, attr) is not None:
+            return
+
+        started = time.perf_counter()
+        container = self.notebook.nametowidget(self.notebook.select())
+        for widget in container.winfo_children():
+            widget.destroy()
+
+        if hasattr(tab_class, 'fetch_initial'):
+            tab = tab_class(container, load=False)
+            self._load_initial(title, tab)
+        else:
+            tab = tab_class(container)
+        tab.pack(fill='both', expand=True)
+        setattr(self, attr, tab)
+        self.logger.debug(f"Вкладка «{title}» создана за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    def _load_initial(self, title, tab):
+        """Начальные данные вкладки читаются в фоне через ее TaskExecutor"""
+        def fetch(task):
+            started = time.perf_counter()
+            return tab.fetch_initial(), (time.perf_counter() - started) * 1000
+
+        def on_done(result):
+            data, elapsed_ms = result
+            self.logger.info(f"Данные вкладки «{title}» загружены за {elapsed_ms:.1f} мс")
+            tab.show_initial(data)
+
+        def on_error(error):
+            messagebox.showerror("Ошибка", f"Не удалось загрузить данные вкладки «{title}»: {error}")
+
+        # Тот же key, что и у обновления списка: кнопка «Обновить» отменит начальную загрузку
+        tab.tasks.submit(fetch, on_done=on_done, on_error=on_error, name=f"Вкладка «{title}»", key='page')
+
+    def _on_first_map(self, event):
+        if event.widget is not self.root or self.startup_ms is not None:
+            return
+        self.startup_ms = (time.perf_counter() - self.started_at) * 1000
+        if self.startup_ms > STARTUP_BUDGET_MS:
+            self.logger.warning(f"Окно появилось через {self.startup_ms:.0f} мс - "
+                                f"больше бюджета {STARTUP_BUDGET_MS} мс")
+        else:
+            self.logger.info(f"Окно появилось через {self.startup_ms:.0f} мс (бюджет {STARTUP_BUDGET_MS} мс)")
@@ -1,24 +1,31 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from models import Booking, Guest, HotelRoom
+from models import Booking, HotelRoom
+from database import Database
+from models.availability import availability_index
 from gui.dialogs.booking_dialog import BookingDialog
+from gui.virtual_treeview import VirtualTreeview, QuerySource
+from gui.task_executor import TaskExecutor
 
 
 class BookingsTab(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, load=True):
         super().__init__(parent)
         self.parent = parent
+        # Запросы к БД выполняются в фоне, окно не блокируется
+        self.tasks = TaskExecutor(self, on_busy=self.set_busy)
         self.create_widgets()
-        self.refresh_bookings()
+        # load=False - данные загрузит вызывающий код через fetch_initial/show_initial
+        if load:
+            self.refresh_bookings()
 
     def create_widgets(self):
         # Создание Treeview для отображения бронирований
-        self.bookings_tree = ttk.Treeview(self,
-                                          columns=(
-                                          'ID', 'GuestID', 'GuestName', 'RoomID', 'RoomNumber', 'CheckIn', 'CheckOut',
-                                          'Status'),
-                                          show='headings'
-                                          )
+        # Виртуальный список: в Treeview существуют только видимые строки
+        self.bookings_tree = VirtualTreeview(self,
+                                             columns=('ID', 'GuestID', 'GuestName', 'RoomID', 'RoomNumber',
+                                                      'CheckIn', 'CheckOut', 'Status'),
+                                             formatter=self.format_booking_row, tasks=self.tasks)
 
         # Конфигурация колонок
         self.bookings_tree.column('ID', width=0, stretch=tk.NO)
@@ -45,53 +52,81 @@ class BookingsTab(ttk.Frame):
         btn_frame = ttk.Frame(self)
         btn_frame.pack(pady=5)
 
-        ttk.Button(btn_frame, text="Новое бронирование",
-                   command=self.new_booking).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Редактировать",
-                   command=self.edit_booking).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Зарегистрировать заезд",
-                   command=self.check_in).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Зарегистрировать выезд",
-                   command=self.check_out).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Отменить бронь",
-                   command=self.cancel_booking).pack(side='left', padx=5)
+        # Кнопки изменения данных блокируются, пока выполняется запрос
+        self.action_buttons = []
+        for text, command in (("Новое бронирование", self.new_booking),
+                              ("Редактировать", self.edit_booking),
+                              ("Зарегистрировать заезд", self.check_in),
+                              ("Зарегистрировать выезд", self.check_out),
+                              ("Отменить бронь", self.cancel_booking)):
+            button = ttk.Button(btn_frame, text=text, command=command)
+            button.pack(side='left', padx=5)
+            self.action_buttons.append(button)
         ttk.Button(btn_frame, text="Обновить список",
-                   command=self.refresh_bookings).pack(side='left', padx=5)
+                   command=self.reload_bookings).pack(side='left', padx=5)
+
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.pack(pady=(0, 5))
+
+    def set_busy(self, busy):
+        """Состояние «загрузка»: надпись и блокировка кнопок"""
+        self.status_label.config(text="Загрузка..." if busy else "")
+        for button in self.action_buttons:
+            button.config(state='disabled' if busy else 'normal')
+
+    def reload_bookings(self):
+        """Кнопка «Обновить список»: кроме списка перечитываются индекс доступности и календарь занятости"""
+        def reload_indexes(task):
+            from services.occupancy_calendar import occupancy_calendar
+            # Изменения с других рабочих мест индексы не видят; свои изменения они получают по подписке
+            availability_index.reload()
+            if occupancy_calendar.loaded:
+                occupancy_calendar.reload()
+
+        self.tasks.submit(reload_indexes, name="Индекс доступности",
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось обновить индекс доступности: {str(e)}"))
+        self.refresh_bookings()
 
     def refresh_bookings(self):
-        """Обновление списка бронирований"""
-        try:
-            # Очистка Treeview
-            for item in self.bookings_tree.get_children():
-                self.bookings_tree.delete(item)
-
-            bookings = Booking.get_all()
-            for booking in bookings:
-                try:
-                    # Получаем информацию о госте и номере
-                    guest = Guest.get_by_id(booking.get_guest_id())
-                    room = HotelRoom.get_by_id(booking.get_room_id())
-
-                    guest_name = guest.full_name() if guest else "Неизвестно"
-                    room_number = room.get_number() if room else "Неизвестно"
-                    status = "Активно" if booking.get_is_active() else "Отменено"
-
-                    self.bookings_tree.insert('', 'end', values=(
-                        booking.id,
-                        booking.get_guest_id(),
-                        guest_name,
-                        booking.get_room_id(),
-                        room_number,
-                        booking.get_check_in_date(),
-                        booking.get_check_out_date(),
-                        status
-                    ))
-                except Exception as e:
-                    # Если ошибка при обработке отдельного бронирования
-                    print(f"Ошибка при обработке бронирования {booking.id}: {e}")
-                    continue
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить бронирования: {str(e)}")
+        """Обновление списка бронирований: строки читаются страницами по мере прокрутки"""
+        # Количество строк и первая страница читаются в фоне
+        self.tasks.submit(lambda task: self.fetch_initial(), on_done=self.show_initial,
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось загрузить бронирования: {str(e)}"),
+                          name="Бронирования", key='page')
+
+    def fetch_initial(self):
+        """Источник строк с уже прочитанной первой страницей; можно вызывать из фонового потока"""
+        source = self._bookings_source()
+        source.rows(0, source.page_size)
+        return source
+
+    def show_initial(self, source):
+        """Вывод списка, подготовленного fetch_initial (в потоке Tk)"""
+        self.bookings_tree.set_source(source)
+
+    @staticmethod
+    def _bookings_source():
+        # Гость и номер подтягиваются в том же запросе через JOIN
+        return QuerySource(
+            lambda after_id, offset, limit: Booking.list_with_details(
+                {'after_id': after_id}, order='id', limit=limit, offset=offset),
+            count=Booking.count
+        )
+
+    @staticmethod
+    def format_booking_row(row):
+        return (
+            row['id'],
+            row['guest_id'],
+            row['guest_name'] or "Неизвестно",
+            row['room_id'],
+            row['room_number'] or "Неизвестно",
+            row['check_in_date'],
+            row['check_out_date'],
+            row['status']
+        )
 
     def new_booking(self):
         """Создание нового бронирования"""
@@ -109,18 +144,24 @@ class BookingsTab(ttk.Frame):
         item = selected[0]
         booking_id = self.bookings_tree.item(item, 'values')[0]
 
-        try:
-            booking = Booking.get_by_id(booking_id)
+        def on_done(booking):
             if not booking:
                 messagebox.showerror("Ошибка", "Бронирование не найдено")
                 return
 
-            dialog = BookingDialog(self, "Редактирование бронирования", booking)
-            if dialog.result:
-                self.refresh_bookings()
+            # Модальный диалог открывается вне обработчика задачи, чтобы не останавливать опрос результатов
+            self.after_idle(self.open_edit_dialog, booking)
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить данные бронирования: {str(e)}")
+        self.tasks.submit(lambda task: Booking.get_by_id(booking_id), on_done=on_done,
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось загрузить данные бронирования: {str(e)}"),
+                          name="Загрузка бронирования")
+
+    def open_edit_dialog(self, booking):
+        """Диалог редактирования; вызывается через after_idle из обработчика загрузки"""
+        dialog = BookingDialog(self, "Редактирование бронирования", booking)
+        if dialog.result:
+            self.refresh_bookings()
 
     def check_in(self):
         """Регистрация заезда"""
@@ -133,21 +174,27 @@ class BookingsTab(ttk.Frame):
         booking_id = self.bookings_tree.item(item, 'values')[0]
         guest_name = self.bookings_tree.item(item, 'values')[2]
 
-        try:
+        def register(task):
             booking = Booking.get_by_id(booking_id)
-            if booking and booking.get_is_active():
-                room = HotelRoom.get_by_id(booking.get_room_id())
-                if room and room.is_free():
-                    room.set_free(False)
-                    room.update()
-
+            if not (booking and booking.get_is_active()):
+                return False
+            room = HotelRoom.get_by_id(booking.get_room_id())
+            if room and room.is_free():
+                room.set_free(False)
+                room.update()
+            return True
+
+        def on_done(registered):
+            if registered:
                 messagebox.showinfo("Успех", f"Заезд гостя {guest_name} зарегистрирован")
                 self.refresh_bookings()
             else:
                 messagebox.showerror("Ошибка", "Бронирование неактивно или не найдено")
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось зарегистрировать заезд: {str(e)}")
+        self.tasks.submit(register, on_done=on_done,
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось зарегистрировать заезд: {str(e)}"),
+                          name="Заезд")
 
     def check_out(self):
         """Регистрация выезда"""
@@ -160,9 +207,12 @@ class BookingsTab(ttk.Frame):
         booking_id = self.bookings_tree.item(item, 'values')[0]
         guest_name = self.bookings_tree.item(item, 'values')[2]
 
-        try:
+        def register(task):
             booking = Booking.get_by_id(booking_id)
-            if booking and booking.get_is_active():
+            if not (booking and booking.get_is_active()):
+                return False
+            # Номер и бронирование изменяются одной транзакцией
+            with Database().transaction():
                 # Пометить номер как свободный
                 room = HotelRoom.get_by_id(booking.get_room_id())
                 if room:
@@ -172,14 +222,19 @@ class BookingsTab(ttk.Frame):
                 # Деактивировать бронирование
                 booking.set_is_active(False)
                 booking.update()
+            return True
 
+        def on_done(registered):
+            if registered:
                 messagebox.showinfo("Успех", f"Выезд гостя {guest_name} зарегистрирован")
                 self.refresh_bookings()
             else:
                 messagebox.showerror("Ошибка", "Бронирование неактивно или не найдено")
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось зарегистрировать выезд: {str(e)}")
+        self.tasks.submit(register, on_done=on_done,
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось зарегистрировать выезд: {str(e)}"),
+                          name="Выезд")
 
     def cancel_booking(self):
         """Отмена бронирования"""
@@ -195,9 +250,11 @@ class BookingsTab(ttk.Frame):
         result = messagebox.askyesno("Подтверждение",
                                      f"Вы уверены, что хотите отменить бронирование для {guest_name}?")
         if result:
-            try:
+            def cancel(task):
                 booking = Booking.get_by_id(booking_id)
-                if booking:
+                if not booking:
+                    return False
+                with Database().transaction():
                     booking.set_is_active(False)
                     booking.update()
 
@@ -206,10 +263,16 @@ class BookingsTab(ttk.Frame):
                     if room:
                         room.set_free(True)
                         room.update()
+                return True
 
+            def on_done(cancelled):
+                if cancelled:
                     messagebox.showinfo("Успех", "Бронирование отменено")
                     self.refresh_bookings()
                 else:
                     messagebox.showerror("Ошибка", "Бронирование не найдено")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось отменить бронирование: {str(e)}")
\ No newline at end of file
+
+            self.tasks.submit(cancel, on_done=on_done,
+                              on_error=lambda e: messagebox.showerror(
+                                  "Ошибка", f"Не удалось отменить бронирование: {str(e)}"),
+                              name="Отмена бронирования")
@@ -1,18 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from models import Employee
+from config import LIST_PAGE_SIZE
 from gui.dialogs.employee_dialog import EmployeeDialog
+from gui.task_executor import TaskExecutor
 
 
 class EmployeesTab(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, load=True):
         super().__init__(parent)
         self.parent = parent
+        self._last_id = None
+        self._has_more = False
+        self._loading = False
         self.create_widgets()
-        self.refresh_employees()
+        # Запросы к БД выполняются в фоне, окно не блокируется
+        self.tasks = TaskExecutor(self, on_busy=self.set_busy)
+        # load=False - данные загрузит вызывающий код через fetch_initial/show_initial
+        if load:
+            self.refresh_employees()
 
     def create_widgets(self):
-        self.employees_tree = ttk.Treeview(self,
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(fill='both', expand=True, padx=5, pady=5)
+
+        self.employees_tree = ttk.Treeview(tree_frame,
                                            columns=('ID', 'Name', 'Position', 'Phone', 'Mail', 'Date'),
                                            show='headings'
                                            )
@@ -30,38 +42,93 @@ class EmployeesTab(ttk.Frame):
         self.employees_tree.heading('Phone', text='Телефон')
         self.employees_tree.heading('Mail', text='Mail')
         self.employees_tree.heading('Date', text='Дата принятия')
-        self.employees_tree.pack(fill='both', expand=True, padx=5, pady=5)
+        self.employees_scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', command=self.employees_tree.yview)
+        self.employees_tree.configure(yscrollcommand=self.on_employees_scroll)
+        self.employees_scrollbar.pack(side='right', fill='y')
+        self.employees_tree.pack(side='left', fill='both', expand=True)
 
         btn_frame = ttk.Frame(self)
         btn_frame.pack(pady=5)
 
-        ttk.Button(btn_frame, text="Добавить сотрудника",
-                   command=self.add_employee).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Редактировать",
-                   command=self.edit_employee).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Удалить",
-                   command=self.delete_employee).pack(side='left', padx=5)
+        # Кнопки изменения данных блокируются, пока выполняется запрос
+        self.action_buttons = []
+        for text, command in (("Добавить сотрудника", self.add_employee),
+                              ("Редактировать", self.edit_employee),
+                              ("Удалить", self.delete_employee)):
+            button = ttk.Button(btn_frame, text=text, command=command)
+            button.pack(side='left', padx=5)
+            self.action_buttons.append(button)
         ttk.Button(btn_frame, text="Обновить список",
                    command=self.refresh_employees).pack(side='left', padx=5)
 
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.pack(pady=(0, 5))
+
+    def set_busy(self, busy):
+        """Состояние «загрузка»: надпись и блокировка кнопок"""
+        self.status_label.config(text="Загрузка..." if busy else "")
+        for button in self.action_buttons:
+            button.config(state='disabled' if busy else 'normal')
+
     def refresh_employees(self):
-        try:
-            for item in self.employees_tree.get_children():
-                self.employees_tree.delete(item)
-
-            employees = Employee.get_all()
-            for emp in employees:
-                self.employees_tree.insert('', 'end', values=(
-                    emp.id,
-                    emp.full_name(),
-                    emp.get_position(),
-                    emp.get_phone_num(),
-                    emp.get_mail(),
-                    emp.get_date_of_employment()
-                ))
-        except Exception as e:
+        """Список сотрудников с первой страницы; остальные подгружаются при прокрутке"""
+        for item in self.employees_tree.get_children():
+            self.employees_tree.delete(item)
+        self._last_id = None
+        self._has_more = True
+        self._loading = True
+        self.load_more_employees()
+
+    def load_more_employees(self):
+        """Загрузка следующей страницы сотрудников в фоне"""
+        after_id = self._last_id
+
+        def on_error(e):
+            self._has_more = False
+            self._loading = False
             messagebox.showerror("Ошибка", f"Не удалось загрузить сотрудников: {str(e)}")
 
+        # key: повторное обновление отменяет еще не пришедшую страницу
+        self.tasks.submit(lambda task: Employee.get_page(after_id=after_id, limit=LIST_PAGE_SIZE),
+                          on_done=self._on_page_loaded, on_error=on_error,
+                          name="Сотрудники", key='page')
+
+    def _on_page_loaded(self, employees):
+        self._loading = False
+        self._add_employees(employees)
+
+    def fetch_initial(self):
+        """Первая страница сотрудников; можно вызывать из фонового потока"""
+        return Employee.get_page(limit=LIST_PAGE_SIZE)
+
+    def show_initial(self, employees):
+        """Вывод первой страницы, загруженной fetch_initial (в потоке Tk)"""
+        for item in self.employees_tree.get_children():
+            self.employees_tree.delete(item)
+        self._last_id = None
+        self._add_employees(employees)
+
+    def _add_employees(self, employees):
+        self._has_more = len(employees) == LIST_PAGE_SIZE
+        if employees:
+            self._last_id = employees[-1].id
+        for emp in employees:
+            self.employees_tree.insert('', 'end', values=(
+                emp.id,
+                emp.full_name(),
+                emp.get_position(),
+                emp.get_phone_num(),
+                emp.get_mail(),
+                emp.get_date_of_employment()
+            ))
+
+    def on_employees_scroll(self, first, last):
+        """Прокрутка списка: у нижнего края подгружается следующая страница"""
+        self.employees_scrollbar.set(first, last)
+        if float(last) >= 1.0 and self._has_more and not self._loading:
+            self._loading = True
+            self.after_idle(self.load_more_employees)
+
     def add_employee(self):
         dialog = EmployeeDialog(self, "Добавление сотрудника")
         if dialog.result:
@@ -76,18 +143,24 @@ class EmployeesTab(ttk.Frame):
         item = selected[0]
         employee_id = self.employees_tree.item(item, 'values')[0]
 
-        try:
-            employee = Employee.get_by_id(employee_id)
+        def on_done(employee):
             if not employee:
                 messagebox.showerror("Ошибка", "Сотрудник не найден")
                 return
 
-            dialog = EmployeeDialog(self, "Редактирование сотрудника", employee)
-            if dialog.result:
-                self.refresh_employees()
+            # Модальный диалог открывается вне обработчика задачи, чтобы не останавливать опрос результатов
+            self.after_idle(self.open_edit_dialog, employee)
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить данные сотрудника: {str(e)}")
+        self.tasks.submit(lambda task: Employee.get_by_id(employee_id), on_done=on_done,
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось загрузить данные сотрудника: {str(e)}"),
+                          name="Загрузка сотрудника")
+
+    def open_edit_dialog(self, employee):
+        """Диалог редактирования; вызывается через after_idle из обработчика загрузки"""
+        dialog = EmployeeDialog(self, "Редактирование сотрудника", employee)
+        if dialog.result:
+            self.refresh_employees()
 
     def delete_employee(self):
         selected = self.employees_tree.selection()
@@ -102,13 +175,20 @@ class EmployeesTab(ttk.Frame):
         result = messagebox.askyesno("Подтверждение",
                                      f"Вы уверены, что хотите удалить сотрудника {employee_name}?")
         if result:
-            try:
+            def delete(task):
                 employee = Employee.get_by_id(employee_id)
                 if employee:
                     employee.delete()
+                return employee is not None
+
+            def on_done(deleted):
+                if deleted:
                     messagebox.showinfo("Успех", "Сотрудник удален")
                     self.refresh_employees()
                 else:
                     messagebox.showerror("Ошибка", "Сотрудник не найден")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось удалить сотрудника: {str(e)}")
\ No newline at end of file
+
+            self.tasks.submit(delete, on_done=on_done,
+                              on_error=lambda e: messagebox.showerror(
+                                  "Ошибка", f"Не удалось удалить сотрудника: {str(e)}"),
+                              name="Удаление сотрудника")
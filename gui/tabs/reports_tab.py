@@ -1,8 +1,11 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pandas as pd
-from models import Employee, Guest, HotelRoom, Booking
+from models import Employee
+from config import REPORT_MODE
 from services.export_service import ExportService
+from services.report_cache import report_cache
+from gui.virtual_treeview import VirtualTreeview, ListSource, DataFrameSource
+from gui.task_executor import TaskExecutor
 from datetime import datetime, timedelta
 import re
 
@@ -12,6 +15,8 @@ class ReportsTab(ttk.Frame):
         self.parent = parent
         self.current_report_type = None
         self.create_widgets()
+        # Отчеты строятся в фоне, окно не блокируется
+        self.tasks = TaskExecutor(self, on_busy=self.set_busy)
 
     def create_widgets(self):
         reports_btn_frame = ttk.Frame(self)
@@ -33,7 +38,8 @@ class ReportsTab(ttk.Frame):
         self.filters_frame.pack(pady=5, fill='x')
 
         # TreeView для отображения отчета
-        self.report_tree = ttk.Treeview(self, show='headings')
+        # Виртуальный список: в Treeview существуют только видимые строки отчета
+        self.report_tree = VirtualTreeview(self)
         self.report_tree.pack(fill='both', expand=True, padx=5, pady=5)
 
         # Нижняя панель с кнопками действий
@@ -47,6 +53,75 @@ class ReportsTab(ttk.Frame):
         ttk.Button(report_actions_frame, text="Очистить",
                    command=self.clear_report).pack(side='left', padx=5)
 
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.pack(pady=(0, 5))
+
+    def set_busy(self, busy):
+        """Состояние «загрузка» отчета"""
+        self.status_label.config(text="Формирование отчета..." if busy else "")
+
+    def show_progress(self, done, total=None, text=None):
+        if total:
+            self.status_label.config(text=f"Формирование отчета: {done * 100 // total}%")
+
+    def run_report(self, build, error_message, formatter=tuple):
+        """Построить отчет в фоне: build(task) -> источник строк для таблицы.
+        Новый отчет отменяет еще не готовый предыдущий."""
+        self.tasks.submit(build, on_done=lambda source: self.report_tree.set_source(source, formatter),
+                          on_error=lambda e: messagebox.showerror("Ошибка", f"{error_message}: {str(e)}"),
+                          on_progress=self.show_progress, name="Отчет", key='report')
+
+    @staticmethod
+    def report_backend(task, with_guests=False):
+        """Расчет отчетов по REPORT_MODE: в БД или в pandas (вызывается в фоновом потоке)"""
+        if REPORT_MODE == 'incremental':
+            from services.report_aggregates import report_aggregates
+            return report_aggregates
+        if REPORT_MODE == 'facts':
+            from services.report_queries import FactReports
+            return FactReports
+        if REPORT_MODE == 'sql':
+            from services.report_queries import ReportQueries
+            return ReportQueries
+
+        # pandas и NumPy загружаются только при первом построении отчета
+        from services.report_engine import ReportEngine
+        engine = ReportEngine.from_db(with_guests=with_guests)
+        task.progress(1, 2)
+        return engine
+
+    def cached_report(self, task, kind, start_date, end_date, with_guests=False, refresh=False):
+        """Отчет kind ('occupancy', 'financial', 'guest_stats') за период: из кэша или расчетом.
+
+        refresh=True - явное обновление: кэш и агрегаты в памяти не используются, поэтому
+        отчет учитывает и изменения с других рабочих мест.
+        """
+        def build():
+            return getattr(self.report_backend(task, with_guests=with_guests), kind)(start_date, end_date)
+        if REPORT_MODE == 'incremental':
+            # Агрегаты уже в памяти и обновляются вместе с бронированиями, отдельный кэш не нужен
+            if refresh:
+                from services.report_aggregates import report_aggregates
+                report_aggregates.reset()
+            return build()
+        return report_cache.get_or_build((REPORT_MODE, kind), start_date, end_date, build, refresh=refresh)
+
+    @staticmethod
+    def rows_source(report):
+        # ReportQueries возвращает список строк, ReportEngine - DataFrame с теми же колонками
+        return ListSource(report) if isinstance(report, list) else DataFrameSource(report)
+
+    @staticmethod
+    def format_occupancy_row(row):
+        number, room_type, total_days, occupied_days, occupancy_rate, revenue = row
+        return number, room_type, total_days, occupied_days, f"{occupancy_rate:.1f}%", f"{revenue:.2f}"
+
+    @staticmethod
+    def format_guest_row(row):
+        full_name, phone_num, total_bookings, total_nights, last_booking, total_spent = row
+        last_booking_str = last_booking.strftime("%d.%m.%Y") if last_booking else "Нет"
+        return full_name, phone_num, total_bookings, total_nights, last_booking_str, f"{total_spent:.2f}"
+
     def clear_filters(self):
         """Очистка фрейма фильтров"""
         for widget in self.filters_frame.winfo_children():
@@ -93,8 +168,9 @@ class ReportsTab(ttk.Frame):
         ttk.Label(tip_frame, text="Формат даты: ГГГГ-ММ-ДД", foreground="gray").pack()
 
         # Кнопка применения
+        # Кнопка - явное обновление отчета (с изменениями с других рабочих мест)
         ttk.Button(self.filters_frame, text="Применить фильтры",
-                   command=self.apply_filters).pack(pady=5)
+                   command=lambda: self.apply_filters(refresh=True)).pack(pady=5)
 
         self.period_var.trace('w', self.toggle_custom_dates)
         self.toggle_custom_dates()  # Инициализация видимости
@@ -107,8 +183,8 @@ class ReportsTab(ttk.Frame):
             else:
                 self.custom_dates_frame.pack_forget()
 
-    def apply_filters(self):
-        """Применение фильтров и обновление отчета"""
+    def apply_filters(self, refresh=False):
+        """Применение фильтров и обновление отчета (refresh=True - без кэша, см. cached_report)"""
         if not self.current_report_type:
             return
 
@@ -117,11 +193,11 @@ class ReportsTab(ttk.Frame):
             start_date, end_date = self.get_date_range()
 
             if self.current_report_type == "occupancy":
-                self.update_occupancy_report(start_date, end_date)
+                self.update_occupancy_report(start_date, end_date, refresh)
             elif self.current_report_type == "financial":
-                self.update_financial_report(start_date, end_date)
+                self.update_financial_report(start_date, end_date, refresh)
             elif self.current_report_type == "guests":
-                self.update_guests_report(start_date, end_date)
+                self.update_guests_report(start_date, end_date, refresh)
 
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка применения фильтров: {str(e)}")
@@ -187,25 +263,20 @@ class ReportsTab(ttk.Frame):
 
     def clear_report(self):
         """Очистка отчета"""
-        for item in self.report_tree.get_children():
-            self.report_tree.delete(item)
+        self.tasks.cancel_all()
+        self.report_tree.clear()
 
         # Очистка колонок
-        for col in self.report_tree['columns']:
+        for col in self.report_tree.columns():
             self.report_tree.heading(col, text='')
-        self.report_tree['columns'] = []
+        self.report_tree.set_columns([])
 
         self.clear_filters()
         self.current_report_type = None
 
     def setup_treeview_columns(self, columns_config):
         """Универсальная настройка колонок Treeview"""
-        columns = [col[0] for col in columns_config]
-        self.report_tree['columns'] = columns
-
-        for col_id, heading, width in columns_config:
-            self.report_tree.column(col_id, width=width, minwidth=width - 20)
-            self.report_tree.heading(col_id, text=heading)
+        self.report_tree.set_columns(columns_config)
 
     def occupancy_report(self):
         """Отчет по занятости номеров"""
@@ -226,53 +297,21 @@ class ReportsTab(ttk.Frame):
         self.setup_treeview_columns(columns_config)
         self.apply_filters()  # Автоматически применяем фильтры после настройки
 
-    def update_occupancy_report(self, start_date, end_date):
+    def update_occupancy_report(self, start_date, end_date, refresh=False):
         """Обновление отчета по занятости с фильтрами"""
         # Очищаем предыдущие данные
-        for item in self.report_tree.get_children():
-            self.report_tree.delete(item)
+        self.report_tree.clear()
 
-        try:
-            total_days = (end_date - start_date).days + 1
-            if total_days <= 0:
-                messagebox.showwarning("Предупреждение", "Некорректный период дат")
-                return
+        total_days = (end_date - start_date).days + 1
+        if total_days <= 0:
+            messagebox.showwarning("Предупреждение", "Некорректный период дат")
+            return
 
-            rooms = HotelRoom.get_all()
-            bookings = Booking.get_all()
-
-            for room in rooms:
-                # Подсчет занятых дней для комнаты
-                occupied_days = 0
-                room_revenue = 0
-
-                for booking in bookings:
-                    if (booking.get_room_id() == room.id and
-                            booking.get_is_active() and
-                            self.dates_overlap(start_date, end_date,
-                                               booking.get_check_in_date(),
-                                               booking.get_check_out_date())):
-                        overlap_days = self.calculate_overlap_days(
-                            start_date, end_date,
-                            booking.get_check_in_date(),
-                            booking.get_check_out_date()
-                        )
-                        occupied_days += overlap_days
-                        room_revenue += overlap_days * room.get_price()
-
-                occupancy_rate = (occupied_days / total_days * 100) if total_days > 0 else 0
-
-                self.report_tree.insert('', 'end', values=(
-                    room.get_number(),
-                    room.get_type(),
-                    total_days,
-                    occupied_days,
-                    f"{occupancy_rate:.1f}%",
-                    f"{room_revenue:.2f}"
-                ))
+        def build(task):
+            report = self.cached_report(task, 'occupancy', start_date, end_date, refresh=refresh)
+            return self.rows_source(report)
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось обновить отчет по занятости: {str(e)}")
+        self.run_report(build, "Не удалось обновить отчет по занятости", self.format_occupancy_row)
 
     def financial_report(self):
         """Финансовый отчет"""
@@ -291,57 +330,25 @@ class ReportsTab(ttk.Frame):
         self.setup_treeview_columns(columns_config)
         self.apply_filters()
 
-    def update_financial_report(self, start_date, end_date):
+    def update_financial_report(self, start_date, end_date, refresh=False):
         """Обновление финансового отчета с фильтрами"""
-        for item in self.report_tree.get_children():
-            self.report_tree.delete(item)
-
-        try:
-            total_days = (end_date - start_date).days + 1
-            if total_days <= 0:
-                messagebox.showwarning("Предупреждение", "Некорректный период дат")
-                return
-
-            rooms = HotelRoom.get_all()
-            bookings = Booking.get_all()
-
-            # Общая статистика
-            room_revenue = 0
-            total_occupied_days = 0
-            total_possible_days = len(rooms) * total_days
-            completed_bookings = 0
-
-            for booking in bookings:
-                booking_start = booking.get_check_in_date()
-                booking_end = booking.get_check_out_date()
-
-                if (booking.get_is_active() and
-                        self.dates_overlap(start_date, end_date, booking_start, booking_end)):
+        self.report_tree.clear()
 
-                    overlap_days = self.calculate_overlap_days(
-                        start_date, end_date, booking_start, booking_end
-                    )
-
-                    room = HotelRoom.get_by_id(booking.get_room_id())
-                    if room:
-                        booking_revenue = overlap_days * room.get_price()
-                        room_revenue += booking_revenue
-                        total_occupied_days += overlap_days
-                        completed_bookings += 1
-
-            avg_occupancy = (total_occupied_days / total_possible_days * 100) if total_possible_days > 0 else 0
-
-            period_label = f"{start_date} - {end_date}"
+        total_days = (end_date - start_date).days + 1
+        if total_days <= 0:
+            messagebox.showwarning("Предупреждение", "Некорректный период дат")
+            return
 
-            self.report_tree.insert('', 'end', values=(
-                period_label,
-                f"{room_revenue:.2f}",
-                f"{avg_occupancy:.1f}%",
-                completed_bookings
-            ))
+        def build(task):
+            totals = self.cached_report(task, 'financial', start_date, end_date, refresh=refresh)
+            return ListSource([(
+                f"{start_date} - {end_date}",
+                f"{totals['room_revenue']:.2f}",
+                f"{totals['avg_occupancy']:.1f}%",
+                totals['total_bookings']
+            )])
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось обновить финансовый отчет: {str(e)}")
+        self.run_report(build, "Не удалось обновить финансовый отчет")
 
     def guests_report(self):
         """Отчет по гостям"""
@@ -361,64 +368,22 @@ class ReportsTab(ttk.Frame):
         self.setup_treeview_columns(columns_config)
         self.apply_filters()
 
-    def update_guests_report(self, start_date, end_date):
+    def update_guests_report(self, start_date, end_date, refresh=False):
         """Обновление отчета по гостям с фильтрами"""
-        for item in self.report_tree.get_children():
-            self.report_tree.delete(item)
+        self.report_tree.clear()
 
         try:
             self.validate_date_range(start_date, end_date)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"Не удалось обновить отчет по гостям: {str(e)}")
+            return
 
-            guests = Guest.get_all()
-            bookings = Booking.get_all()
-
-            for guest in guests:
-                guest_bookings = [b for b in bookings if b.get_guest_id() == guest.id]
-
-                if not guest_bookings:
-                    continue
-
-                # Статистика по бронированиям гостя
-                total_bookings = len(guest_bookings)
-                total_nights = 0
-                total_spent = 0
-                last_booking_date = None
-
-                for booking in guest_bookings:
-                    # Для last_booking_date смотрим все бронирования
-                    booking_date = booking.get_check_in_date()
-                    if not last_booking_date or booking_date > last_booking_date:
-                        last_booking_date = booking_date
-
-                    # Для ночей и денег - только те, что в периоде
-                    if (self.dates_overlap(start_date, end_date,
-                                           booking.get_check_in_date(),
-                                           booking.get_check_out_date())):
-
-                        nights = self.calculate_overlap_days(
-                            start_date, end_date,
-                            booking.get_check_in_date(),
-                            booking.get_check_out_date()
-                        )
-                        total_nights += nights
-
-                        room = HotelRoom.get_by_id(booking.get_room_id())
-                        if room:
-                            total_spent += nights * room.get_price()
-
-                last_booking_str = last_booking_date.strftime("%d.%m.%Y") if last_booking_date else "Нет"
-
-                self.report_tree.insert('', 'end', values=(
-                    guest.full_name(),
-                    guest.get_phone_num(),
-                    total_bookings,
-                    total_nights,
-                    last_booking_str,
-                    f"{total_spent:.2f}"
-                ))
+        def build(task):
+            report = self.cached_report(task, 'guest_stats', start_date, end_date, with_guests=True,
+                                        refresh=refresh)
+            return self.rows_source(report)
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось обновить отчет по гостям: {str(e)}")
+        self.run_report(build, "Не удалось обновить отчет по гостям", self.format_guest_row)
 
     def staff_report(self):
         """Отчет по сотрудникам"""
@@ -437,10 +402,11 @@ class ReportsTab(ttk.Frame):
 
         self.setup_treeview_columns(columns_config)
 
-        try:
+        def build(task):
             employees = Employee.get_all()
             current_date = datetime.now().date()
 
+            rows = []
             for emp in employees:
                 hire_date = emp.get_date_of_employment()
                 if isinstance(hire_date, str):
@@ -448,7 +414,7 @@ class ReportsTab(ttk.Frame):
 
                 experience_months = (current_date.year - hire_date.year) * 12 + (current_date.month - hire_date.month)
 
-                self.report_tree.insert('', 'end', values=(
+                rows.append((
                     emp.full_name(),
                     emp.get_position(),
                     emp.get_phone_num(),
@@ -456,9 +422,9 @@ class ReportsTab(ttk.Frame):
                     hire_date.strftime("%d.%m.%Y"),
                     experience_months
                 ))
+            return ListSource(rows)
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось сформировать отчет по сотрудникам: {str(e)}")
+        self.run_report(build, "Не удалось сформировать отчет по сотрудникам")
 
     @staticmethod
     def recovery_report():
@@ -469,16 +435,6 @@ class ReportsTab(ttk.Frame):
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось выполнить резервное копирование: {str(e)}")
 
-    def dates_overlap(self, start1, end1, start2, end2):
-        """Проверка пересечения дат"""
-        return start1 <= end2 and start2 <= end1
-
-    def calculate_overlap_days(self, start1, end1, start2, end2):
-        """Вычисление количества дней пересечения"""
-        overlap_start = max(start1, start2)
-        overlap_end = min(end1, end2)
-        return max(0, (overlap_end - overlap_start).days + 1)
-
     def excel_report(self):
         """Экспорт в Excel"""
         try:
@@ -487,7 +443,7 @@ class ReportsTab(ttk.Frame):
                 return
 
             # Сбор данных из TreeView
-            columns = self.report_tree['columns']
+            columns = self.report_tree.columns()
             if not columns:
                 messagebox.showwarning("Предупреждение", "Нет данных для экспорта")
                 return
@@ -496,15 +452,13 @@ class ReportsTab(ttk.Frame):
             headers = [self.report_tree.heading(col)['text'] for col in columns]
 
             # Получение данных
-            data = []
-            for item in self.report_tree.get_children():
-                values = self.report_tree.item(item)['values']
-                data.append(values)
+            data = self.report_tree.all_rows()
 
             if not data:
                 messagebox.showwarning("Предупреждение", "Нет данных для экспорта")
                 return
 
+            import pandas as pd
             df = pd.DataFrame(data, columns=headers)
 
             # Определение имени листа на основе типа отчета
@@ -532,22 +486,20 @@ class ReportsTab(ttk.Frame):
                 messagebox.showwarning("Предупреждение", "Сначала сгенерируйте отчет")
                 return
 
-            columns = self.report_tree['columns']
+            columns = self.report_tree.columns()
             if not columns:
                 messagebox.showwarning("Предупреждение", "Нет данных для экспорта")
                 return
 
             headers = [self.report_tree.heading(col)['text'] for col in columns]
 
-            data = []
-            for item in self.report_tree.get_children():
-                values = self.report_tree.item(item)['values']
-                data.append(values)
+            data = self.report_tree.all_rows()
 
             if not data:
                 messagebox.showwarning("Предупреждение", "Нет данных для экспорта")
                 return
 
+            import pandas as pd
             df = pd.DataFrame(data, columns=headers)
 
             report_titles = {
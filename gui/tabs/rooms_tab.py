@@ -1,17 +1,52 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+from datetime import date, datetime, timedelta
 from models import HotelRoom
+from config import LIST_PAGE_SIZE
 from gui.dialogs.rooms_dialog import RoomDialog
+from gui.task_executor import TaskExecutor
 
 class RoomsTab(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, load=True):
         super().__init__(parent)
         self.parent = parent
+        self._last_id = None
+        self._has_more = False
+        self._loading = False
         self.create_widgets()
-        self.refresh_rooms()
+        # Запросы к БД выполняются в фоне, окно не блокируется
+        self.tasks = TaskExecutor(self, on_busy=self.set_busy)
+        # load=False - данные загрузит вызывающий код через fetch_initial/show_initial
+        if load:
+            self.refresh_rooms()
 
     def create_widgets(self):
-        self.rooms_tree = ttk.Treeview(self,
+        # Период и фильтры для поиска свободных номеров
+        filter_frame = ttk.Frame(self)
+        filter_frame.pack(fill='x', padx=5, pady=5)
+
+        ttk.Label(filter_frame, text="Заезд:").pack(side='left', padx=5)
+        self.checkin_entry = ttk.Entry(filter_frame, width=12)
+        self.checkin_entry.insert(0, date.today().strftime("%Y-%m-%d"))
+        self.checkin_entry.pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="Выезд:").pack(side='left', padx=5)
+        self.checkout_entry = ttk.Entry(filter_frame, width=12)
+        self.checkout_entry.insert(0, (date.today() + timedelta(days=1)).strftime("%Y-%m-%d"))
+        self.checkout_entry.pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="Мест от:").pack(side='left', padx=5)
+        self.capacity_entry = ttk.Entry(filter_frame, width=5)
+        self.capacity_entry.pack(side='left', padx=5)
+
+        ttk.Label(filter_frame, text="Тип:").pack(side='left', padx=5)
+        self.type_entry = ttk.Entry(filter_frame, width=12)
+        self.type_entry.pack(side='left', padx=5)
+
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(fill='both', expand=True, padx=5, pady=5)
+
+        self.rooms_tree = ttk.Treeview(tree_frame,
                                        columns=('ID', 'Number', 'Type', 'Price', 'Capacity', 'Status'),
                                        show='headings'
                                        )
@@ -30,48 +65,117 @@ class RoomsTab(ttk.Frame):
         self.rooms_tree.heading('Capacity', text='Вместимость')
         self.rooms_tree.heading('Status', text='Статус')
 
-        self.rooms_tree.pack(fill='both', expand=True, padx=5, pady=5)
+        self.rooms_scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', command=self.rooms_tree.yview)
+        self.rooms_tree.configure(yscrollcommand=self.on_rooms_scroll)
+        self.rooms_scrollbar.pack(side='right', fill='y')
+        self.rooms_tree.pack(side='left', fill='both', expand=True)
 
         # Фрейм для кнопок
         btn_frame = ttk.Frame(self)
         btn_frame.pack(pady=5)
 
-        ttk.Button(btn_frame, text="Добавить номер",
-                   command=self.add_room).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Редактировать",
-                   command=self.edit_room).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Удалить",
-                   command=self.delete_room).pack(side='left', padx=5)
+        # Кнопки изменения данных блокируются, пока выполняется запрос
+        self.action_buttons = []
+        for text, command in (("Добавить номер", self.add_room),
+                              ("Редактировать", self.edit_room),
+                              ("Удалить", self.delete_room)):
+            button = ttk.Button(btn_frame, text=text, command=command)
+            button.pack(side='left', padx=5)
+            self.action_buttons.append(button)
         ttk.Button(btn_frame, text="Обновить список",
                    command=self.refresh_rooms).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Показать свободные",
                    command=self.show_available).pack(side='left', padx=5)
 
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.pack(pady=(0, 5))
+
+    def set_busy(self, busy):
+        """Состояние «загрузка»: надпись и блокировка кнопок"""
+        self.status_label.config(text="Загрузка..." if busy else "")
+        for button in self.action_buttons:
+            button.config(state='disabled' if busy else 'normal')
+
     def refresh_rooms(self):
-        try:
-            for item in self.rooms_tree.get_children():
-                self.rooms_tree.delete(item)
+        """Список номеров с первой страницы; остальные подгружаются при прокрутке"""
+        for item in self.rooms_tree.get_children():
+            self.rooms_tree.delete(item)
+        self._last_id = None
+        self._has_more = True
+        self._loading = True
+        self.load_more_rooms()
 
-            rooms = HotelRoom.get_all()
-            for room in rooms:
-                status = "Свободен" if room.is_free() else "Занят"
-                self.rooms_tree.insert('', 'end', values=(
-                    room.id,
-                    room.get_number(),
-                    room.get_type(),
-                    f"{room.get_price():.2f}",
-                    room.get_capacity(),
-                    status
-                ))
-        except Exception as e:
+    def load_more_rooms(self):
+        """Загрузка следующей страницы номеров в фоне"""
+        after_id = self._last_id
+
+        def on_error(e):
+            self._has_more = False
+            self._loading = False
             messagebox.showerror("Ошибка", f"Не удалось загрузить номера: {str(e)}")
 
+        # key: повторное обновление или поиск свободных отменяет еще не пришедшую страницу
+        self.tasks.submit(lambda task: HotelRoom.get_page(after_id=after_id, limit=LIST_PAGE_SIZE),
+                          on_done=self._on_page_loaded, on_error=on_error,
+                          name="Номера", key='page')
+
+    def _on_page_loaded(self, rooms):
+        self._loading = False
+        self._add_rooms(rooms)
+
+    def fetch_initial(self):
+        """Первая страница номеров; можно вызывать из фонового потока"""
+        return HotelRoom.get_page(limit=LIST_PAGE_SIZE)
+
+    def show_initial(self, rooms):
+        """Вывод первой страницы, загруженной fetch_initial (в потоке Tk)"""
+        for item in self.rooms_tree.get_children():
+            self.rooms_tree.delete(item)
+        self._last_id = None
+        self._add_rooms(rooms)
+
+    def _add_rooms(self, rooms):
+        self._has_more = len(rooms) == LIST_PAGE_SIZE
+        if rooms:
+            self._last_id = rooms[-1].id
+        for room in rooms:
+            status = "Свободен" if room.is_free() else "Занят"
+            self.rooms_tree.insert('', 'end', values=(
+                room.id,
+                room.get_number(),
+                room.get_type(),
+                f"{room.get_price():.2f}",
+                room.get_capacity(),
+                status
+            ))
+
+    def on_rooms_scroll(self, first, last):
+        """Прокрутка списка: у нижнего края подгружается следующая страница"""
+        self.rooms_scrollbar.set(first, last)
+        if float(last) >= 1.0 and self._has_more and not self._loading:
+            self._loading = True
+            self.after_idle(self.load_more_rooms)
+
     def show_available(self):
+        """Номера, свободные на выбранный период, по возрастанию цены"""
         try:
+            checkin_date = datetime.strptime(self.checkin_entry.get().strip(), "%Y-%m-%d").date()
+            checkout_date = datetime.strptime(self.checkout_entry.get().strip(), "%Y-%m-%d").date()
+            capacity = self.capacity_entry.get().strip()
+            min_capacity = int(capacity) if capacity else None
+        except ValueError:
+            messagebox.showerror("Ошибка", "Даты должны быть в формате ГГГГ-ММ-ДД, вместимость - числом")
+            return
+
+        room_type = self.type_entry.get().strip() or None
+
+        def on_done(rooms):
             for item in self.rooms_tree.get_children():
                 self.rooms_tree.delete(item)
+            # Результат поиска выводится целиком, постраничная подгрузка не нужна
+            self._has_more = False
+            self._loading = False
 
-            rooms = HotelRoom.get_available_rooms()
             for room in rooms:
                 self.rooms_tree.insert('', 'end', values=(
                     room.id,
@@ -81,8 +185,13 @@ class RoomsTab(ttk.Frame):
                     room.get_capacity(),
                     "Свободен"
                 ))
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить свободные номера: {str(e)}")
+
+        self.tasks.submit(lambda task: HotelRoom.find_available(checkin_date, checkout_date,
+                                                                min_capacity=min_capacity, room_type=room_type),
+                          on_done=on_done,
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось загрузить свободные номера: {str(e)}"),
+                          name="Свободные номера", key='page')
 
     def add_room(self):
         """Добавление нового номера"""
@@ -100,18 +209,24 @@ class RoomsTab(ttk.Frame):
         item = selected[0]
         room_id = self.rooms_tree.item(item, 'values')[0]
 
-        try:
-            room = HotelRoom.get_by_id(room_id)
+        def on_done(room):
             if not room:
                 messagebox.showerror("Ошибка", "Номер не найден")
                 return
 
-            dialog = RoomDialog(self, "Редактирование номера", room)
-            if dialog.result:
-                self.refresh_rooms()
+            # Модальный диалог открывается вне обработчика задачи, чтобы не останавливать опрос результатов
+            self.after_idle(self.open_edit_dialog, room)
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось загрузить данные номера: {str(e)}")
+        self.tasks.submit(lambda task: HotelRoom.get_by_id(room_id), on_done=on_done,
+                          on_error=lambda e: messagebox.showerror(
+                              "Ошибка", f"Не удалось загрузить данные номера: {str(e)}"),
+                          name="Загрузка номера")
+
+    def open_edit_dialog(self, room):
+        """Диалог редактирования; вызывается через after_idle из обработчика загрузки"""
+        dialog = RoomDialog(self, "Редактирование номера", room)
+        if dialog.result:
+            self.refresh_rooms()
 
     def delete_room(self):
         """Удаление выбранного номера"""
@@ -127,17 +242,27 @@ class RoomsTab(ttk.Frame):
         result = messagebox.askyesno("Подтверждение",
                                      f"Вы уверены, что хотите удалить номер {room_number}?")
         if result:
-            try:
+            def delete(task):
                 room = HotelRoom.get_by_id(room_id)
-                if room and room.is_free():
-                    room.delete()
+                if room is None:
+                    return 'not_found'
+                if not room.is_free():
+                    return 'busy'
+                room.delete()
+                return 'deleted'
+
+            def on_done(outcome):
+                if outcome == 'deleted':
                     messagebox.showinfo("Успех", "Номер удален")
                     self.refresh_rooms()
 
-                elif not room.is_free():
+                elif outcome == 'busy':
                     messagebox.showerror("Ошибка", "Нельзя удалить номер во время бронирования")
 
                 else:
                     messagebox.showerror("Ошибка", "Номер не найден")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось удалить номер: {str(e)}")
\ No newline at end of file
+
+            self.tasks.submit(delete, on_done=on_done,
+                              on_error=lambda e: messagebox.showerror(
+                                  "Ошибка", f"Не удалось удалить номер: {str(e)}"),
+                              name="Удаление номера")
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from exceptions import TaskCancelledError
+from log_config import get_logger
+
+# Рабочих потоков меньше размера пула соединений БД, чтобы окну всегда оставалось соединение
+MAX_WORKERS = 3
+# Как часто (мс) забирать результаты задач в потоке Tk
+POLL_INTERVAL_MS = 50
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ui-task")
+        return _pool
+
+
+class Task:
+    """Задача, выполняемая в фоновом потоке; передается в функцию задачи первым аргументом"""
+
+    def __init__(self, name, executor):
+        self.name = name
+        self._executor = executor
+        self._cancelled = threading.Event()
+        self.done = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Отменить задачу: ее результат не будет передан в on_done"""
+        self._cancelled.set()
+
+    def check_cancelled(self):
+        """Прервать выполнение отмененной задачи (вызывается из функции задачи)"""
+        if self.cancelled:
+            raise TaskCancelledError(self.name)
+
+    def progress(self, done, total=None, text=None):
+        """Сообщить о ходе выполнения; on_progress вызывается в потоке Tk"""
+        self.check_cancelled()
+        self._executor._results.put(('progress', self, (done, total, text)))
+
+
+class TaskExecutor:
+    """Выполнение запросов к БД вне потока Tk.
+
+    Функция задачи выполняется в общем пуле потоков, а on_done / on_error /
+    on_progress вызываются в потоке Tk: результаты складываются в очередь,
+    которую виджет опрашивает через after(). Задача с тем же key, что и уже
+    выполняющаяся, отменяет предыдущую. on_busy(True/False) сообщает, идет ли
+    сейчас хотя бы одна задача, - для индикатора загрузки и блокировки кнопок.
+    """
+
+    def __init__(self, widget, on_busy=None, poll_interval_ms=POLL_INTERVAL_MS):
+        self.widget = widget
+        self.on_busy = on_busy
+        self.poll_interval_ms = poll_interval_ms
+        self.logger = get_logger('perf')
+        self._results = queue.Queue()
+        self._callbacks = {}
+        self._keys = {}
+        self._polling = False
+
+    def submit(self, fn, on_done=None, on_error=None, on_progress=None, name="задача", key=None):
+        """Выполнить fn(task) в фоновом потоке; возвращает Task"""
+        if key is not None and key in self._keys:
+            self._keys[key].cancel()
+
+        task = Task(name, self)
+        self._callbacks[task] = (on_done, on_error, on_progress, key)
+        if key is not None:
+            self._keys[key] = task
+        if len(self._callbacks) == 1 and self.on_busy:
+            self.on_busy(True)
+
+        _get_pool().submit(self._run, task, fn)
+        self._schedule_poll()
+        return task
+
+    def cancel_all(self):
+        for task in list(self._callbacks):
+            task.cancel()
+
+    @property
+    def busy(self):
+        return bool(self._callbacks)
+
+    def _run(self, task, fn):
+        started = time.perf_counter()
+        try:
+            task.check_cancelled()
+            result, error = fn(task), None
+        except Exception as e:
+            result, error = None, e
+        self._results.put(('done', task, (result, error, (time.perf_counter() - started) * 1000)))
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_interval_ms, self.poll)
+
+    def poll(self):
+        """Обработать готовые результаты (в потоке Tk)"""
+        self._polling = False
+        try:
+            while True:
+                try:
+                    kind, task, payload = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if task not in self._callbacks:
+                    continue
+                on_done, on_error, on_progress, key = self._callbacks[task]
+
+                if kind == 'progress':
+                    if on_progress and not task.cancelled:
+                        self._call(task, on_progress, *payload)
+                    continue
+
+                del self._callbacks[task]
+                if key is not None and self._keys.get(key) is task:
+                    del self._keys[key]
+                task.done = True
+                result, error, elapsed_ms = payload
+                try:
+                    if task.cancelled or isinstance(error, TaskCancelledError):
+                        self.logger.debug(f"Задача «{task.name}» отменена")
+                    elif error is not None:
+                        self.logger.error(f"Задача «{task.name}» завершилась с ошибкой: {error}")
+                        if on_error:
+                            self._call(task, on_error, error)
+                    else:
+                        self.logger.debug(f"Задача «{task.name}» выполнена за {elapsed_ms:.1f} мс")
+                        if on_done:
+                            self._call(task, on_done, result)
+                finally:
+                    if not self._callbacks and self.on_busy:
+                        self._call(task, self.on_busy, False)
+        finally:
+            # Ошибка в обработчике не должна оставлять результаты других задач в очереди
+            if self._callbacks:
+                self._schedule_poll()
+
+    def _call(self, task, callback, *args):
+        """Вызвать обработчик задачи; его ошибка записывается в журнал и не прерывает опрос"""
+        try:
+            callback(*args)
+        except Exception:
+            self.logger.exception(f"Ошибка в обработчике задачи «{task.name}»")
@@ -0,0 +1,267 @@
+import threading
+from collections import OrderedDict
+from tkinter import ttk
+
+from config import LIST_PAGE_SIZE
+
+
+class ListSource:
+    """Строки из списка"""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def rows(self, start, stop):
+        return self._rows[start:stop]
+
+    def loaded(self, start, stop):
+        return True
+
+
+class DataFrameSource:
+    """Строки из pandas.DataFrame (в виде кортежей значений колонок)"""
+
+    def __init__(self, df):
+        self._df = df
+
+    def __len__(self):
+        return len(self._df)
+
+    def rows(self, start, stop):
+        return list(self._df.iloc[start:stop].itertuples(index=False, name=None))
+
+    def loaded(self, start, stop):
+        return True
+
+
+class QuerySource:
+    """Строки постраничного запроса: fetch_page(after_id, offset, limit) -> список строк.
+
+    Следующая страница читается по ключу последней строки предыдущей (keyset),
+    а при прыжке полосой прокрутки - через OFFSET. В памяти держится
+    не больше cache_pages страниц. rows() читает недостающие страницы из БД,
+    поэтому в потоке Tk сначала проверяется loaded(), а чтение идет в фоне.
+    """
+
+    def __init__(self, fetch_page, count, key=lambda row: row['id'], page_size=LIST_PAGE_SIZE, cache_pages=8):
+        self._fetch_page = fetch_page
+        self._key = key
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self._count = count()
+        self._pages = OrderedDict()
+        # Номер страницы -> ключ последней строки предыдущей страницы
+        self._anchors = {0: None}
+        # Страницы читаются в фоновых потоках, а проверяются в потоке Tk
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def rows(self, start, stop):
+        result = []
+        for page in self._page_range(start, stop):
+            first = page * self.page_size
+            result.extend(self._page(page)[max(start - first, 0):stop - first])
+        return result
+
+    def loaded(self, start, stop):
+        """Прочитаны ли уже все страницы строк с start по stop (без запроса к БД)"""
+        with self._lock:
+            return all(page in self._pages for page in self._page_range(start, stop))
+
+    def _page_range(self, start, stop):
+        if stop <= start:
+            return range(0)
+        return range(start // self.page_size, (stop - 1) // self.page_size + 1)
+
+    def _page(self, page):
+        with self._lock:
+            rows = self._pages.get(page)
+            if rows is not None:
+                self._pages.move_to_end(page)
+                return rows
+            anchor = self._anchors.get(page, False)
+
+        # Запрос выполняется без блокировки, чтобы loaded() не ждал БД
+        if anchor is not False:
+            rows = self._fetch_page(anchor, None, self.page_size)
+        else:
+            rows = self._fetch_page(None, page * self.page_size, self.page_size)
+
+        with self._lock:
+            if len(rows) == self.page_size:
+                self._anchors[page + 1] = self._key(rows[-1])
+            self._pages[page] = rows
+            self._pages.move_to_end(page)
+            while len(self._pages) > self.cache_pages:
+                self._pages.popitem(last=False)
+        return rows
+
+
+class VirtualTreeview(ttk.Frame):
+    """Таблица, в которой реальными элементами Treeview являются только видимые строки.
+
+    Остальные строки берутся из источника (ListSource, DataFrameSource, QuerySource)
+    при прокрутке, поэтому память и время перерисовки не зависят от размера списка.
+    iid видимого элемента - номер строки в источнике. Если передан tasks (TaskExecutor),
+    непрочитанные страницы источника загружаются в фоне, а до их прихода
+    показываются строки-заглушки.
+    """
+
+    def __init__(self, parent, columns=(), formatter=None, height=20, tasks=None, **tree_options):
+        super().__init__(parent)
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=height, **tree_options)
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=True)
+
+        self.source = ListSource([])
+        self.formatter = formatter or tuple
+        self.tasks = tasks
+        self.offset = 0
+        self.visible = height
+        self._selected = None
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', self._on_mousewheel)
+        self.tree.bind('<Button-5>', self._on_mousewheel)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<Up>', lambda event: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda event: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda event: self._move_selection(-self.visible))
+        self.tree.bind('<Next>', lambda event: self._move_selection(self.visible))
+
+    # --- данные ---
+
+    def set_source(self, source, formatter=None):
+        """Показать строки нового источника с начала списка"""
+        self.source = source
+        if formatter is not None:
+            self.formatter = formatter
+        self.offset = 0
+        self._selected = None
+        self.redraw()
+
+    def set_rows(self, rows):
+        self.set_source(ListSource(rows))
+
+    def clear(self):
+        self.set_rows([])
+
+    def all_rows(self):
+        """Все строки источника в виде значений колонок (для экспорта)"""
+        return [tuple(self.formatter(row)) for row in self.source.rows(0, len(self.source))]
+
+    def set_columns(self, columns_config):
+        """Колонки таблицы: список (id, заголовок, ширина)"""
+        self.tree['columns'] = [col[0] for col in columns_config]
+        for col_id, heading, width in columns_config:
+            self.tree.column(col_id, width=width, minwidth=max(width - 20, 0))
+            self.tree.heading(col_id, text=heading)
+
+    # --- доступ как к Treeview ---
+
+    def columns(self):
+        return self.tree['columns']
+
+    def selection(self):
+        return self.tree.selection()
+
+    def item(self, iid, option=None, **kw):
+        return self.tree.item(iid, option, **kw)
+
+    def column(self, column, option=None, **kw):
+        return self.tree.column(column, option, **kw)
+
+    def heading(self, column, option=None, **kw):
+        return self.tree.heading(column, option, **kw)
+
+    # --- прокрутка ---
+
+    def scroll_to(self, offset):
+        total = len(self.source)
+        offset = max(0, min(int(offset), max(total - self.visible, 0)))
+        if offset != self.offset:
+            self.offset = offset
+            self.redraw()
+
+    def redraw(self):
+        total = len(self.source)
+        self.offset = max(0, min(self.offset, max(total - self.visible, 0)))
+        stop = min(self.offset + self.visible, total)
+        if self.tasks is not None and not self.source.loaded(self.offset, stop):
+            values = [self._placeholder()] * (stop - self.offset)
+            self._load_rows(self.source, self.offset, stop)
+        else:
+            values = [tuple(self.formatter(row)) for row in self.source.rows(self.offset, stop)]
+
+        self.tree.delete(*self.tree.get_children())
+        for index, row_values in enumerate(values, start=self.offset):
+            self.tree.insert('', 'end', iid=str(index), values=row_values)
+
+        if self._selected is not None and self.tree.exists(str(self._selected)):
+            self.tree.selection_set(str(self._selected))
+            self.tree.focus(str(self._selected))
+
+        if total:
+            self.scrollbar.set(self.offset / total, stop / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _placeholder(self):
+        # Часть колонок может быть скрыта (ширина 0), поэтому заглушка - во всех
+        return ("...",) * len(self.tree['columns'])
+
+    def _load_rows(self, source, start, stop):
+        # Прокрутка во время загрузки отменяет предыдущую задачу (тот же key)
+        def on_done(rows):
+            if self.source is source:
+                self.redraw()
+
+        self.tasks.submit(lambda task: source.rows(start, stop), on_done=on_done,
+                          name="Строки списка", key=('rows', id(self)))
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.scroll_to(float(args[0]) * len(self.source))
+        elif action == 'scroll':
+            step = self.visible if args[1] == 'pages' else 1
+            self.scroll_to(self.offset + int(args[0]) * step)
+
+    def _on_mousewheel(self, event):
+        direction = -1 if event.num == 4 or event.delta > 0 else 1
+        self.scroll_to(self.offset + direction * 3)
+        return 'break'
+
+    def _on_configure(self, event):
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        # Одна строка высоты уходит на заголовки колонок
+        visible = max(event.height // row_height - 1, 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.redraw()
+
+    def _on_select(self, event):
+        # Элементы пересоздаются при прокрутке, поэтому выбор запоминается номером строки
+        selected = self.tree.selection()
+        if selected:
+            self._selected = int(selected[0])
+
+    def _move_selection(self, step):
+        total = len(self.source)
+        if not total:
+            return 'break'
+        current = self._selected if self._selected is not None else self.offset - 1
+        self._selected = max(0, min(current + step, total - 1))
+        if self._selected < self.offset:
+            self.offset = self._selected
+        elif self._selected >= self.offset + self.visible:
+            self.offset = self._selected - self.visible + 1
+        self.redraw()
+        self.tree.event_generate('<<TreeviewSelect>>')
+        return 'break'
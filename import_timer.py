@@ -0,0 +1,54 @@
+import builtins
+import sys
+import time
+
+from log_config import get_logger
+
+
+class ImportTimer:
+    """Замер времени импорта модулей при запуске приложения.
+
+    Пока таймер запущен, подменяет builtins.__import__ и для каждого модуля,
+    загружаемого впервые, запоминает полное время импорта (вместе с вложенными
+    модулями) и собственное время.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._stack = []
+        self._original_import = None
+
+    def start(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        started = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.timings.setdefault(name, (elapsed * 1000, (elapsed - nested) * 1000))
+
+    def report(self, limit=15):
+        """Записать в журнал perf самые долгие импорты; возвращает список (модуль, полное мс, собственное мс)"""
+        logger = get_logger('perf')
+        slowest = sorted(((name, total, own) for name, (total, own) in self.timings.items()),
+                         key=lambda item: item[1], reverse=True)
+        total_ms = sum(own for total, own in self.timings.values())
+        lines = [f"Импорт модулей при запуске: {len(self.timings)} модулей, {total_ms:.0f} мс"]
+        lines += [f"  {name}: {total:.1f} мс (собственное {own:.1f} мс)" for name, total, own in slowest[:limit]]
+        logger.info("\n".join(lines))
+        return slowest
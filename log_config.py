@@ -42,6 +42,16 @@ def setup_logging():
                 'formatter': 'detailed',
                 'encoding': 'utf-8'
             },
+            # Файл для медленных SQL-запросов
+            'file_slow_queries': {
+                'level': 'WARNING',
+                'class': 'logging.handlers.RotatingFileHandler',
+                'filename': f'{log_dir}/slow_queries.log',
+                'maxBytes': 10485760,
+                'backupCount': 5,
+                'formatter': 'standard',
+                'encoding': 'utf-8'
+            },
             'console': {
                    'level': 'INFO',
                     'class': 'logging.StreamHandler',
@@ -73,6 +83,17 @@ def setup_logging():
                 'handlers': ['file_warn_info', 'file_debug'],
                 'level': 'DEBUG',
                 'propagate': False
+            },
+            # Производительность: сводки по запросам
+            'perf': {
+                'handlers': ['file_warn_info', 'file_debug'],
+                'level': 'DEBUG',
+                'propagate': False
+            },
+            'perf.slow_queries': {
+                'handlers': ['file_slow_queries'],
+                'level': 'WARNING',
+                'propagate': False
             }
         }
     }
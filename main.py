@@ -1,11 +1,40 @@
-from log_config import setup_logging
+import time
+
+# Отсчет времени до появления окна - до импорта остальных модулей
+started_at = time.perf_counter()
+
+from import_timer import ImportTimer
+
+# Замер времени импорта модулей, загружаемых при запуске
+import_timer = ImportTimer()
+import_timer.start()
+
+import sys
+from log_config import setup_logging, get_logger
 from gui.main_window import HotelApp
+from database import Database
+from exceptions import SchemaNotMigratedError
 import tkinter as tk
 
+import_timer.stop()
+
 def start_window():
     window = tk.Tk()
-    app = HotelApp(window)
+    app = HotelApp(window, started_at=started_at)
     window.mainloop()
+    # Сводка по SQL-запросам за сессию в журнал perf
+    Database().dump_query_stats()
+
+def check_database():
+    """Без нужных таблиц приложение не запускается; недоступная БД - ошибки во вкладках, как и раньше"""
+    try:
+        Database().check_schema()
+    except SchemaNotMigratedError as e:
+        sys.exit(str(e))
+    except Exception as e:
+        get_logger('database').error(f"Не удалось подключиться к БД при запуске: {e}")
 
 setup_logging()
-start_window()
\ No newline at end of file
+import_timer.report()
+check_database()
+start_window()
@@ -0,0 +1,142 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+from database import Database
+from log_config import get_logger
+
+
+class RoomIntervals:
+    """Периоды [заезд, выезд) активных бронирований одной комнаты, отсортированные по заезду"""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        # max_end[i] - самый поздний выезд среди первых i + 1 периодов
+        self.max_end = []
+
+    def add(self, booking_id, start, end):
+        pos = bisect_right(self.starts, start)
+        self.starts.insert(pos, start)
+        self.ends.insert(pos, end)
+        self.ids.insert(pos, booking_id)
+        self.max_end.insert(pos, end)
+        self._update_max_end(pos)
+
+    def remove(self, booking_id):
+        pos = self.ids.index(booking_id)
+        del self.starts[pos], self.ends[pos], self.ids[pos], self.max_end[pos]
+        self._update_max_end(pos)
+
+    def overlaps(self, start, end):
+        """Есть ли период, пересекающийся с [start, end)"""
+        # Кандидаты - периоды с заездом раньше end; среди них нужен выезд позже start
+        pos = bisect_left(self.starts, end)
+        return pos > 0 and self.max_end[pos - 1] > start
+
+    def overlapping(self, start, end):
+        """ID бронирований, пересекающихся с [start, end)"""
+        result = []
+        pos = bisect_left(self.starts, end) - 1
+        while pos >= 0 and self.max_end[pos] > start:
+            if self.ends[pos] > start:
+                result.append(self.ids[pos])
+            pos -= 1
+        return result[::-1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _update_max_end(self, pos):
+        current = self.max_end[pos - 1] if pos > 0 else None
+        for i in range(pos, len(self.ends)):
+            current = self.ends[i] if current is None or self.ends[i] > current else current
+            self.max_end[i] = current
+
+
+class AvailabilityIndex:
+    """Индекс активных бронирований по комнатам для проверки свободных периодов без запросов к БД.
+
+    Загружается из БД при первом обращении и поддерживается в актуальном
+    состоянии через подписку на изменения Booking.
+    """
+
+    def __init__(self):
+        self.logger = get_logger('booking.availability')
+        self._lock = threading.RLock()
+        self._rooms = {}
+        self._booking_rooms = {}
+        self._loaded = False
+
+    def is_free(self, room_id, start, end, exclude_booking_id=None):
+        return not self.conflicts(room_id, start, end, exclude_booking_id)
+
+    def conflicts(self, room_id, start, end, exclude_booking_id=None):
+        """ID активных бронирований комнаты, пересекающихся с [start, end)"""
+        with self._lock:
+            self._ensure_loaded()
+            intervals = self._rooms.get(int(room_id))
+            if not intervals or not intervals.overlaps(start, end):
+                return []
+            ids = intervals.overlapping(start, end)
+        if exclude_booking_id:
+            ids = [booking_id for booking_id in ids if booking_id != int(exclude_booking_id)]
+        return ids
+
+    def free_rooms(self, room_ids, start, end):
+        """Комнаты из room_ids, свободные на весь период [start, end)"""
+        with self._lock:
+            self._ensure_loaded()
+            result = []
+            for room_id in room_ids:
+                intervals = self._rooms.get(int(room_id))
+                if not intervals or not intervals.overlaps(start, end):
+                    result.append(room_id)
+            return result
+
+    def apply(self, booking_id, row):
+        """Учесть изменение бронирования: row - новое состояние строки или None при удалении"""
+        with self._lock:
+            if not self._loaded:
+                # Актуальное состояние будет прочитано из БД при загрузке
+                return
+            self._remove(booking_id)
+            if row is not None and row['is_active']:
+                self._add(booking_id, row['room_id'], row['check_in_date'], row['check_out_date'])
+
+    def reset(self):
+        """Сбросить индекс; он будет перечитан из БД при следующем обращении"""
+        with self._lock:
+            self._rooms = {}
+            self._booking_rooms = {}
+            self._loaded = False
+
+    def reload(self):
+        """Перечитать индекс из БД сразу (изменения с других рабочих мест); вызывается в фоновом потоке"""
+        with self._lock:
+            self.reset()
+            self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        db = Database()
+        query = "SELECT id, room_id, check_in_date, check_out_date FROM bookings WHERE is_active = TRUE"
+        for row in db.fetch_iter(query):
+            self._add(row['id'], row['room_id'], row['check_in_date'], row['check_out_date'])
+        self._loaded = True
+        self.logger.info(f"Индекс доступности загружен: {len(self._booking_rooms)} бронирований, "
+                         f"{len(self._rooms)} комнат")
+
+    def _add(self, booking_id, room_id, start, end):
+        room_id = int(room_id)
+        self._rooms.setdefault(room_id, RoomIntervals()).add(booking_id, start, end)
+        self._booking_rooms[booking_id] = room_id
+
+    def _remove(self, booking_id):
+        room_id = self._booking_rooms.pop(booking_id, None)
+        if room_id is not None:
+            self._rooms[room_id].remove(booking_id)
+
+
+availability_index = AvailabilityIndex()
@@ -1,10 +1,18 @@
-from exceptions import InvalidDataError, InvalidPersonDataError, InvalidRoomDataError
+from exceptions import InvalidDataError, InvalidPersonDataError, InvalidRoomDataError, BookingConflictError
 from datetime import date, datetime
+from config import AVAILABILITY_INDEX
 from database import Database
+from models.availability import availability_index
+from models.room_day_stats import room_day_stats
+from models.cache import ModelCache
+from models.listeners import ChangeNotifier
 from log_config import get_logger
 
 
-class Booking:
+class Booking(ChangeNotifier):
+    # LRU-кэш строк для get_by_id, сбрасывается при изменениях
+    _cache = ModelCache('booking')
+
     def __init__(self, guest_id, room_id, check_in_date, check_out_date, id=None, is_active=True):
 
         if not guest_id:
@@ -84,16 +92,39 @@ class Booking:
         self.logger.info(f"Бронирование {self.id} теперь {status}")
         self.__is_active = value
 
+    _insert_query = """INSERT INTO bookings 
+                      (guest_id, room_id, check_in_date, check_out_date, is_active) 
+                      VALUES (%s, %s, %s, %s, %s)"""
+    _update_query = """UPDATE bookings SET 
+                      guest_id=%s, room_id=%s, check_in_date=%s, 
+                      check_out_date=%s, is_active=%s 
+                      WHERE id=%s"""
+
+    def _params(self):
+        return (self.__guest_id, self.__room_id, self.__check_in_date,
+                self.__check_out_date, self.__is_active)
+
+    def _row(self):
+        return {
+            'id': self.id,
+            'guest_id': self.__guest_id,
+            'room_id': self.__room_id,
+            'check_in_date': self.__check_in_date,
+            'check_out_date': self.__check_out_date,
+            'is_active': self.__is_active,
+        }
+
     def save(self):
         self.logger.info(f"Сохранение бронирования {self.id} в БД")
         db = Database()
-        query = """INSERT INTO bookings 
-                      (guest_id, room_id, check_in_date, check_out_date, is_active) 
-                      VALUES (%s, %s, %s, %s, %s)"""
-        params = (self.__guest_id, self.__room_id, self.__check_in_date,
-                 self.__check_out_date, self.__is_active)
-        db.execute_query(query, params)
-        self.logger.debug("Бронирование успешно сохранено")
+        # Дни бронирования в room_day_stats (в режиме отчетов 'facts') записываются той же транзакцией
+        with db.transaction():
+            self._check_no_conflicts()
+            self.id = db.execute_query(self._insert_query, self._params())
+            room_day_stats.write([(self.id, self._row())], new=True)
+        self._cache.invalidate(self.id)
+        self._notify([(self.id, self._row())])
+        self.logger.debug(f"Бронирование успешно сохранено, ID {self.id}")
 
     def update(self):
         if self.id is None:
@@ -102,15 +133,49 @@ class Booking:
 
         self.logger.info(f"Обновление бронирования ID {self.id} в БД")
         db = Database()
-        query = """UPDATE bookings SET 
-                      guest_id=%s, room_id=%s, check_in_date=%s, 
-                      check_out_date=%s, is_active=%s 
-                      WHERE id=%s"""
-        params = (self.__guest_id, self.__room_id, self.__check_in_date,
-                 self.__check_out_date, self.__is_active, self.id)
-        db.execute_query(query, params)
+        with db.transaction():
+            self._check_no_conflicts()
+            db.execute_query(self._update_query, self._params() + (self.id,))
+            room_day_stats.write([(self.id, self._row())])
+        self._cache.invalidate(self.id)
+        self._notify([(self.id, self._row())])
         self.logger.debug("Бронирование успешно обновлено")
 
+    @classmethod
+    def save_many(cls, bookings):
+        """Сохранение списка бронирований одной транзакцией с присвоением ID"""
+        logger = get_logger('booking')
+        bookings = list(bookings)
+        logger.info(f"Пакетное сохранение {len(bookings)} бронирований в БД")
+        db = Database()
+        with db.transaction():
+            ids = db.execute_many(cls._insert_query, [booking._params() for booking in bookings], return_ids=True)
+            for booking, new_id in zip(bookings, ids):
+                booking.id = new_id
+            room_day_stats.write([(booking.id, booking._row()) for booking in bookings], new=True)
+        cls._cache.invalidate(*ids)
+        cls._notify([(booking.id, booking._row()) for booking in bookings])
+        logger.debug("Бронирования успешно сохранены")
+        return bookings
+
+    @classmethod
+    def update_many(cls, bookings):
+        """Обновление списка бронирований одной транзакцией"""
+        logger = get_logger('booking')
+        bookings = list(bookings)
+        if any(booking.id is None for booking in bookings):
+            logger.error("Попытка пакетно обновить бронирование без ID")
+            raise ValueError("Нельзя обновить запись без ID")
+
+        logger.info(f"Пакетное обновление {len(bookings)} бронирований в БД")
+        db = Database()
+        with db.transaction():
+            db.execute_many(cls._update_query, [booking._params() + (booking.id,) for booking in bookings])
+            room_day_stats.write([(booking.id, booking._row()) for booking in bookings])
+        cls._cache.invalidate(*(booking.id for booking in bookings))
+        cls._notify([(booking.id, booking._row()) for booking in bookings])
+        logger.debug("Бронирования успешно обновлены")
+
     def delete(self):
         if self.id is None:
             self.logger.error("Попытка удалить бронирование без ID")
@@ -119,30 +184,40 @@ class Booking:
         self.logger.warning(f"Удаление бронирования ID {self.id} из БД")
         db = Database()
         query = "DELETE FROM bookings WHERE id=%s"
-        db.execute_query(query, (self.id,))
+        with db.transaction():
+            db.execute_query(query, (self.id,))
+            room_day_stats.write([(self.id, None)])
+        self._cache.invalidate(self.id)
+        self._notify([(self.id, None)])
         self.logger.info("Бронирование удалено")
 
     @classmethod
     def get_by_id(cls, id):
         logger = get_logger('booking')
         logger.debug(f"Поиск бронирования по ID: {id}")
-        db = Database()
-        query = "SELECT * FROM bookings WHERE id=%s"
-        result = db.fetch_one(query, (id,))
+        result = cls._cache.get(id)
+        if result is None:
+            db = Database()
+            query = "SELECT * FROM bookings WHERE id=%s"
+            result = db.fetch_one(query, (id,))
+            if result:
+                cls._cache.put(id, result)
 
         if result:
             logger.debug(f"Бронирование с ID {id} найдено")
-            return cls(
-                guest_id=result['guest_id'],
-                room_id=result['room_id'],
-                check_in_date=result['check_in_date'],
-                check_out_date=result['check_out_date'],
-                id=result['id'],
-                is_active=result['is_active']
-            )
+            return cls._from_row(result)
         logger.warning(f"Бронирование с ID {id} не найдено")
         return None
 
+    @classmethod
+    def get_by_ids(cls, ids):
+        """Поиск бронирований по списку ID: словарь id -> объект, ненайденные ID пропускаются"""
+        logger = get_logger('booking')
+        ids = list(ids)
+        logger.debug(f"Пакетный поиск бронирований по {len(ids)} ID")
+        rows = cls._cache.fetch_many('bookings', ids)
+        return {id: cls._from_row(row) for id, row in rows.items()}
+
     @classmethod
     def get_all(cls):
         logger = get_logger('booking')
@@ -151,19 +226,41 @@ class Booking:
         query = "SELECT * FROM bookings"
         results = db.fetch_all(query)
 
-        bookings = []
-        for result in results:
-            bookings.append(cls(
-                guest_id=result['guest_id'],
-                room_id=result['room_id'],
-                check_in_date=result['check_in_date'],
-                check_out_date=result['check_out_date'],
-                id=result['id'],
-                is_active=result['is_active']
-            ))
+        bookings = [cls._from_row(result) for result in results]
         logger.info(f"Получено {len(bookings)} бронирований")
         return bookings
 
+    @classmethod
+    def count(cls):
+        """Число бронирований в БД"""
+        db = Database()
+        return db.fetch_one("SELECT COUNT(*) AS total FROM bookings")['total']
+
+    @classmethod
+    def iter_all(cls, batch_size=500):
+        """Генератор всех бронирований без загрузки всей таблицы в память"""
+        logger = get_logger('booking')
+        logger.debug("Потоковый запрос всех бронирований из БД")
+        db = Database()
+        for result in db.fetch_iter("SELECT * FROM bookings", batch_size=batch_size):
+            yield cls._from_row(result)
+
+    # Допустимые варианты сортировки для get_page ('-' в начале - по убыванию)
+    _page_order = {'id': 'id', 'check_in': 'check_in_date'}
+
+    @classmethod
+    def get_page(cls, after_id=None, limit=100, order_by='id'):
+        """Страница бронирований после записи after_id (None - первая страница)"""
+        logger = get_logger('booking')
+        descending = order_by.startswith('-')
+        column = cls._page_order.get(order_by.lstrip('-'))
+        if column is None:
+            raise ValueError(f"Недопустимая сортировка: {order_by}")
+        logger.debug(f"Запрос страницы бронирований после ID {after_id}, сортировка {order_by}")
+        db = Database()
+        results = db.fetch_page('bookings', after_id, limit, column, descending)
+        return [cls._from_row(result) for result in results]
+
     @classmethod
     def get_active_bookings(cls):
         logger = get_logger('booking')
@@ -172,50 +269,182 @@ class Booking:
         query = "SELECT * FROM bookings WHERE is_active = TRUE"
         results = db.fetch_all(query)
 
-        bookings = []
-        for result in results:
-            bookings.append(cls(
-                guest_id=result['guest_id'],
-                room_id=result['room_id'],
-                check_in_date=result['check_in_date'],
-                check_out_date=result['check_out_date'],
-                id=result['id'],
-                is_active=result['is_active']
-            ))
+        bookings = [cls._from_row(result) for result in results]
         logger.info(f"Найдено {len(bookings)} активных бронирований")
         return bookings
 
+    # Допустимые варианты сортировки для list_with_details ('-' в начале - по убыванию)
+    _detail_order = {
+        'id': 'b.id',
+        'check_in': 'b.check_in_date',
+        'check_out': 'b.check_out_date',
+        'guest': 'g.surname, g.name',
+        'room': 'r.room_id',
+        'status': 'b.is_active',
+    }
+
     @classmethod
-    def is_room_available(cls, room_id, check_in_date, check_out_date, exclude_booking_id=None):
-        try:
-            bookings = cls.get_all()
+    def list_with_details(cls, filters=None, order='id', limit=None, offset=None):
+        """Бронирования вместе с ФИО гостя и номером комнаты одним запросом с JOIN.
+
+        filters: словарь с ключами is_active, guest_id, room_id,
+        date_from (выезд не раньше), date_to (заезд не позже) и
+        after_id (следующая страница после бронирования, только при сортировке по id).
+        Возвращает список словарей, готовых для вывода в таблицу.
+        """
+        logger = get_logger('booking')
+        logger.debug(f"Запрос списка бронирований с фильтрами {filters}")
+        filters = filters or {}
+
+        conditions = []
+        params = []
+        if filters.get('is_active') is not None:
+            conditions.append("b.is_active = %s")
+            params.append(bool(filters['is_active']))
+        if filters.get('guest_id') is not None:
+            conditions.append("b.guest_id = %s")
+            params.append(filters['guest_id'])
+        if filters.get('room_id') is not None:
+            conditions.append("b.room_id = %s")
+            params.append(filters['room_id'])
+        if filters.get('date_from') is not None:
+            conditions.append("b.check_out_date >= %s")
+            params.append(filters['date_from'])
+        if filters.get('date_to') is not None:
+            conditions.append("b.check_in_date <= %s")
+            params.append(filters['date_to'])
+
+        descending = order.startswith('-')
+        order_key = order.lstrip('-')
+        if order_key not in cls._detail_order:
+            raise ValueError(f"Недопустимая сортировка: {order}")
+        if filters.get('after_id') is not None:
+            if order_key != 'id':
+                raise ValueError("Постраничная выборка после ID возможна только при сортировке по id")
+            conditions.append("b.id < %s" if descending else "b.id > %s")
+            params.append(filters['after_id'])
+        direction = " DESC" if descending else ""
+        order_by = ", ".join(f"{column}{direction}" for column in cls._detail_order[order_key].split(", "))
+
+        query = """SELECT b.id, b.guest_id, b.room_id, b.check_in_date, b.check_out_date, b.is_active,
+                          g.surname AS guest_surname, g.name AS guest_name, g.patronymic AS guest_patronymic,
+                          r.room_id AS room_number
+                   FROM bookings b
+                   LEFT JOIN guests g ON g.id = b.guest_id
+                   LEFT JOIN rooms r ON r.id = b.room_id"""
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order_by}, b.id{direction}"
+        if limit is not None or offset:
+            # MySQL не допускает OFFSET без LIMIT
+            query += " LIMIT %s OFFSET %s"
+            params.extend([limit if limit is not None else 2 ** 62, offset or 0])
 
-            if isinstance(check_in_date, str):
-                check_in_date = datetime.strptime(check_in_date, "%Y-%m-%d").date()
-            if isinstance(check_out_date, str):
-                check_out_date = datetime.strptime(check_out_date, "%Y-%m-%d").date()
+        db = Database()
+        results = db.fetch_all(query, tuple(params))
 
-            for booking in bookings:
-                # Пропускаем исключаемое бронирование (при редактировании)
-                if exclude_booking_id and booking.id == exclude_booking_id:
-                    continue
+        rows = []
+        for result in results:
+            if result['guest_surname'] is not None:
+                guest_name = " ".join(part for part in (result['guest_surname'], result['guest_name'],
+                                                        result['guest_patronymic']) if part)
+            else:
+                guest_name = None
+            rows.append({
+                'id': result['id'],
+                'guest_id': result['guest_id'],
+                'guest_name': guest_name,
+                'room_id': result['room_id'],
+                'room_number': result['room_number'],
+                'check_in_date': result['check_in_date'],
+                'check_out_date': result['check_out_date'],
+                'is_active': bool(result['is_active']),
+                'status': "Активно" if result['is_active'] else "Отменено",
+            })
+        logger.info(f"Получено {len(rows)} бронирований с деталями")
+        return rows
 
-                if booking.__room_id == room_id and booking.__is_active:
+    @classmethod
+    def _from_row(cls, result):
+        return cls(
+            guest_id=result['guest_id'],
+            room_id=result['room_id'],
+            check_in_date=result['check_in_date'],
+            check_out_date=result['check_out_date'],
+            id=result['id'],
+            is_active=result['is_active']
+        )
+
+    def _check_no_conflicts(self):
+        """Окончательная проверка перед записью активной брони - запросом к БД, а не по индексу.
+
+        Индекс доступности не видит бронирований с других рабочих мест; в MySQL строки
+        найденных пересечений блокируются до конца транзакции (FOR UPDATE).
+        """
+        if not self.__is_active:
+            return
+        conflicts = self.find_conflicts(self.__room_id, self.__check_in_date, self.__check_out_date,
+                                        self.id, use_index=False, lock=True)
+        if conflicts:
+            self.logger.warning(f"Бронирование комнаты {self.__room_id} пересекается с {conflicts}")
+            raise BookingConflictError(str(self.__room_id), str(self.__check_in_date), str(self.__check_out_date))
 
-                    existing_check_in = booking.__check_in_date
-                    existing_check_out = booking.__check_out_date
+    @classmethod
+    def find_conflicts(cls, room_id, check_in_date, check_out_date, exclude_booking_id=None,
+                       use_index=None, lock=False):
+        """ID активных бронирований комнаты, пересекающихся с периодом [заезд, выезд).
 
-                    if isinstance(existing_check_in, str):
-                        existing_check_in = datetime.strptime(existing_check_in, "%Y-%m-%d").date()
-                    if isinstance(existing_check_out, str):
-                        existing_check_out = datetime.strptime(existing_check_out, "%Y-%m-%d").date()
+        use_index=None - как задано в AVAILABILITY_INDEX, False - запросом к БД (видит изменения
+        с других рабочих мест), lock=True - с блокировкой найденных строк до конца транзакции.
+        """
+        logger = get_logger('booking')
+        check_in_date, check_out_date = cls._parse_dates(check_in_date, check_out_date)
+        if (AVAILABILITY_INDEX if use_index is None else use_index):
+            conflicts = availability_index.conflicts(room_id, check_in_date, check_out_date, exclude_booking_id)
+        else:
+            query, params = cls._overlap_condition(room_id, check_in_date, check_out_date, exclude_booking_id)
+            query = f"SELECT id FROM bookings WHERE {query}" + (" FOR UPDATE" if lock else "")
+            db = Database()
+            conflicts = [row['id'] for row in db.fetch_all(query, params)]
+        logger.debug(f"Пересечения для комнаты {room_id} ({check_in_date} - {check_out_date}): {conflicts}")
+        return conflicts
 
-                    if not (check_out_date <= existing_check_in or check_in_date >= existing_check_out):
-                        # Найдено пересечение
-                        return False
+    @classmethod
+    def is_room_available(cls, room_id, check_in_date, check_out_date, exclude_booking_id=None, use_index=None):
+        """Свободна ли комната; use_index=False - проверка запросом к БД (для окончательной проверки)"""
+        try:
+            check_in_date, check_out_date = cls._parse_dates(check_in_date, check_out_date)
+            if (AVAILABILITY_INDEX if use_index is None else use_index):
+                return availability_index.is_free(room_id, check_in_date, check_out_date, exclude_booking_id)
 
-            return True
+            query, params = cls._overlap_condition(room_id, check_in_date, check_out_date, exclude_booking_id)
+            # EXISTS останавливается на первом пересечении, поиск идет по индексу idx_bookings_room_dates
+            db = Database()
+            result = db.fetch_one(f"SELECT EXISTS(SELECT 1 FROM bookings WHERE {query}) AS has_conflict", params)
+            return not result['has_conflict']
 
         except Exception as e:
             print(f"Ошибка при проверке доступности номера: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def _overlap_condition(room_id, check_in_date, check_out_date, exclude_booking_id):
+        # Периоды пересекаются, если существующий заезд раньше нового выезда, а выезд позже нового заезда
+        query = ("room_id = %s AND is_active = TRUE "
+                 "AND check_out_date > %s AND check_in_date < %s")
+        params = [room_id, check_in_date, check_out_date]
+        if exclude_booking_id:
+            query += " AND id <> %s"
+            params.append(exclude_booking_id)
+        return query, tuple(params)
+
+    @staticmethod
+    def _parse_dates(check_in_date, check_out_date):
+        if isinstance(check_in_date, str):
+            check_in_date = datetime.strptime(check_in_date, "%Y-%m-%d").date()
+        if isinstance(check_out_date, str):
+            check_out_date = datetime.strptime(check_out_date, "%Y-%m-%d").date()
+        return check_in_date, check_out_date
+
+
+Booking.subscribe(availability_index.apply)
@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+
+from config import MODEL_CACHE_SIZE
+from database import Database
+from log_config import get_logger
+
+_caches = []
+
+
+class ModelCache:
+    """Ограниченный LRU-кэш строк таблицы по первичному ключу.
+
+    key приводит ключ к виду, под которым он хранится (по умолчанию - id как int).
+    """
+
+    def __init__(self, name, maxsize=MODEL_CACHE_SIZE, key=int):
+        self.logger = get_logger(f'cache.{name}')
+        self.name = name
+        self.maxsize = maxsize
+        self._key = key
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def get(self, id):
+        key = self._key(id)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self._rows.move_to_end(key)
+            self.hits += 1
+            return row
+
+    def put(self, id, row):
+        # Незафиксированные данные транзакции могут быть откачены, их не кэшируем
+        if self.maxsize <= 0 or Database().in_transaction():
+            return
+        key = self._key(id)
+        with self._lock:
+            self._rows[key] = row
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def fetch_many(self, table, ids):
+        """Строки по списку id: из кэша, а недостающие - одним пакетом запросов к БД"""
+        rows = {}
+        missing = []
+        for id in ids:
+            row = self.get(id)
+            if row is None:
+                missing.append(id)
+            else:
+                rows[int(id)] = row
+
+        if missing:
+            loaded = Database().fetch_by_ids(table, missing)
+            for id, row in loaded.items():
+                self.put(id, row)
+            rows.update(loaded)
+        return rows
+
+    def invalidate(self, *ids):
+        """Удалить записи из кэша; без аргументов - очистить кэш целиком.
+
+        Внутри транзакции записи удаляются еще раз после commit: до фиксации другой
+        поток может прочитать из БД прежнюю строку и положить ее в кэш.
+        """
+        db = Database()
+        if db.in_transaction():
+            db.after_commit(lambda: self._drop(ids))
+        self._drop(ids)
+
+    def _drop(self, ids):
+        with self._lock:
+            if not ids:
+                self._rows.clear()
+                return
+            for id in ids:
+                if id is not None:
+                    self._rows.pop(self._key(id), None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._rows),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+def cache_stats():
+    """Статистика попаданий по кэшам всех моделей"""
+    return {cache.name: cache.stats() for cache in _caches}
+
+
+def clear_caches():
+    for cache in _caches:
+        cache.invalidate()
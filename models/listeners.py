@@ -0,0 +1,30 @@
+from database import Database
+
+
+class ChangeNotifier:
+    """Подписка на изменения строк модели.
+
+    Подписчики вызываются как callback(id, row), row=None при удалении,
+    после фиксации транзакции в БД. У каждого класса-наследника свой список подписчиков.
+    """
+
+    _listeners = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._listeners = []
+
+    @classmethod
+    def subscribe(cls, callback):
+        """Подписка на изменения; уведомления приходят после фиксации в БД"""
+        cls._listeners.append(callback)
+
+    @classmethod
+    def _notify(cls, changes):
+        def deliver():
+            for id, row in changes:
+                for callback in cls._listeners:
+                    callback(id, row)
+
+        if cls._listeners and changes:
+            Database().after_commit(deliver)
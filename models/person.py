@@ -1,4 +1,6 @@
 from database import Database
+from models.cache import ModelCache
+from models.listeners import ChangeNotifier
 from exceptions import InvalidDataError
 from log_config import get_logger
 
@@ -76,6 +78,9 @@ class Person:
 
 
 class Employee(Person):
+    # LRU-кэш строк для get_by_id, сбрасывается при изменениях
+    _cache = ModelCache('employee')
+
     def __init__(self, name, surname, position, phone_num, mail, date_of_employment, patronymic="", id=None):
         super().__init__(name, surname, phone_num, patronymic, id)
 
@@ -116,16 +121,24 @@ class Employee(Person):
         return self.__position
 
     # Методы для работы с БД
+    _insert_query = """INSERT INTO employees 
+                   (name, surname, patronymic, phone_num, position, mail, date_of_employment) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)"""
+    _update_query = """UPDATE employees SET 
+                   name=%s, surname=%s, patronymic=%s, phone_num=%s, 
+                   position=%s, mail=%s, date_of_employment=%s 
+                   WHERE id=%s"""
+
+    def _params(self):
+        return (self._name, self._surname, self._patronymic, self._phone_num,
+                self.__position, self.__mail, self.__date_of_employment)
+
     def save(self):
         self.logger.info(f"Сохранение сотрудника {self.full_name()} в БД")
         db = Database()
-        query = """INSERT INTO employees 
-                   (name, surname, patronymic, phone_num, position, mail, date_of_employment) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-        params = (self._name, self._surname, self._patronymic, self._phone_num,
-                  self.__position, self.__mail, self.__date_of_employment)
-        db.execute_query(query, params)
-        self.logger.debug("Сотрудник успешно сохранен")
+        self.id = db.execute_query(self._insert_query, self._params())
+        self._cache.invalidate(self.id)
+        self.logger.debug(f"Сотрудник успешно сохранен, ID {self.id}")
 
     def update(self):
         if self.id is None:
@@ -134,15 +147,39 @@ class Employee(Person):
 
         self.logger.info(f"Обновление сотрудника ID {self.id} в БД")
         db = Database()
-        query = """UPDATE employees SET 
-                   name=%s, surname=%s, patronymic=%s, phone_num=%s, 
-                   position=%s, mail=%s, date_of_employment=%s 
-                   WHERE id=%s"""
-        params = (self._name, self._surname, self._patronymic, self._phone_num,
-                  self.__position, self.__mail, self.__date_of_employment, self.id)
-        db.execute_query(query, params)
+        db.execute_query(self._update_query, self._params() + (self.id,))
+        self._cache.invalidate(self.id)
         self.logger.debug("Сотрудник успешно обновлен")
 
+    @classmethod
+    def save_many(cls, employees):
+        """Сохранение списка сотрудников одной транзакцией с присвоением ID"""
+        logger = get_logger('person.employee')
+        employees = list(employees)
+        logger.info(f"Пакетное сохранение {len(employees)} сотрудников в БД")
+        db = Database()
+        ids = db.execute_many(cls._insert_query, [emp._params() for emp in employees], return_ids=True)
+        for emp, new_id in zip(employees, ids):
+            emp.id = new_id
+        cls._cache.invalidate(*ids)
+        logger.debug("Сотрудники успешно сохранены")
+        return employees
+
+    @classmethod
+    def update_many(cls, employees):
+        """Обновление списка сотрудников одной транзакцией"""
+        logger = get_logger('person.employee')
+        employees = list(employees)
+        if any(emp.id is None for emp in employees):
+            logger.error("Попытка пакетно обновить сотрудника без ID")
+            raise ValueError("Нельзя обновить запись без ID")
+
+        logger.info(f"Пакетное обновление {len(employees)} сотрудников в БД")
+        db = Database()
+        db.execute_many(cls._update_query, [emp._params() + (emp.id,) for emp in employees])
+        cls._cache.invalidate(*(emp.id for emp in employees))
+        logger.debug("Сотрудники успешно обновлены")
+
     def delete(self):
         if self.id is None:
             self.logger.error("Попытка удалить сотрудника без ID")
@@ -152,31 +189,36 @@ class Employee(Person):
         db = Database()
         query = "DELETE FROM employees WHERE id=%s"
         db.execute_query(query, (self.id,))
+        self._cache.invalidate(self.id)
         self.logger.info("Сотрудник удален")
 
     @classmethod
     def get_by_id(cls, id):
         logger = get_logger('person.employee')
         logger.debug(f"Поиск сотрудника по ID: {id}")
-        db = Database()
-        query = "SELECT * FROM employees WHERE id=%s"
-        result = db.fetch_one(query, (id,))
+        result = cls._cache.get(id)
+        if result is None:
+            db = Database()
+            query = "SELECT * FROM employees WHERE id=%s"
+            result = db.fetch_one(query, (id,))
+            if result:
+                cls._cache.put(id, result)
 
         if result:
             logger.debug(f"Сотрудник с ID {id} найден")
-            return cls(
-                name=result['name'],
-                surname=result['surname'],
-                position=result['position'],
-                phone_num=result['phone_num'],
-                mail=result['mail'],
-                date_of_employment=result['date_of_employment'],  # исправлено
-                patronymic=result['patronymic'],
-                id=result['id']
-            )
+            return cls._from_row(result)
         logger.warning(f"Сотрудник с ID {id} не найден")
         return None
 
+    @classmethod
+    def get_by_ids(cls, ids):
+        """Поиск сотрудников по списку ID: словарь id -> объект, ненайденные ID пропускаются"""
+        logger = get_logger('person.employee')
+        ids = list(ids)
+        logger.debug(f"Пакетный поиск сотрудников по {len(ids)} ID")
+        rows = cls._cache.fetch_many('employees', ids)
+        return {id: cls._from_row(row) for id, row in rows.items()}
+
     @classmethod
     def get_all(cls):
         logger = get_logger('person.employee')
@@ -185,23 +227,57 @@ class Employee(Person):
         query = "SELECT * FROM employees"
         results = db.fetch_all(query)
 
-        employees = []
-        for result in results:
-            employees.append(cls(
-                name=result['name'],
-                surname=result['surname'],
-                position=result['position'],
-                phone_num=result['phone_num'],
-                mail=result['mail'],
-                date_of_employment=result['date_of_employment'],
-                patronymic=result['patronymic'],
-                id=result['id']
-            ))
+        employees = [cls._from_row(result) for result in results]
         logger.info(f"Получено {len(employees)} сотрудников")
         return employees
 
+    @classmethod
+    def iter_all(cls, batch_size=500):
+        """Генератор всех сотрудников без загрузки всей таблицы в память"""
+        logger = get_logger('person.employee')
+        logger.debug("Потоковый запрос всех сотрудников из БД")
+        db = Database()
+        for result in db.fetch_iter("SELECT * FROM employees", batch_size=batch_size):
+            yield cls._from_row(result)
+
+    # Допустимые варианты сортировки для get_page ('-' в начале - по убыванию)
+    _page_order = {'id': 'id', 'surname': 'surname', 'position': 'position',
+                   'date_of_employment': 'date_of_employment'}
+
+    @classmethod
+    def get_page(cls, after_id=None, limit=100, order_by='id'):
+        """Страница сотрудников после записи after_id (None - первая страница)"""
+        logger = get_logger('person.employee')
+        descending = order_by.startswith('-')
+        column = cls._page_order.get(order_by.lstrip('-'))
+        if column is None:
+            raise ValueError(f"Недопустимая сортировка: {order_by}")
+        logger.debug(f"Запрос страницы сотрудников после ID {after_id}, сортировка {order_by}")
+        db = Database()
+        results = db.fetch_page('employees', after_id, limit, column, descending)
+        return [cls._from_row(result) for result in results]
+
+    @classmethod
+    def _from_row(cls, result):
+        return cls(
+            name=result['name'],
+            surname=result['surname'],
+            position=result['position'],
+            phone_num=result['phone_num'],
+            mail=result['mail'],
+            date_of_employment=result['date_of_employment'],
+            patronymic=result['patronymic'],
+            id=result['id']
+        )
+
+
+class Guest(Person, ChangeNotifier):
+    # LRU-кэш строк для get_by_id, сбрасывается при изменениях
+    _cache = ModelCache('guest')
+    # Индекс (колонка, значение) -> id для поиска по паспорту и телефону, ограниченный MODEL_CACHE_SIZE;
+    # найденный id сверяется со строкой из get_by_id, устаревшие записи перечитываются из БД
+    _key_index = ModelCache('guest.keys', key=tuple)
 
-class Guest(Person):
     def __init__(self, name, surname, phone_num, passport_data, patronymic="", id=None):
         super().__init__(name, surname, phone_num, patronymic, id)
         self.logger = get_logger('person.guest')
@@ -219,16 +295,35 @@ class Guest(Person):
         self.logger.debug(f"Изменение паспортных данных на {value}")
         self.__passport_data = value
 
+    _insert_query = """INSERT INTO guests 
+                   (name, surname, patronymic, phone_num, passport_data) 
+                   VALUES (%s, %s, %s, %s, %s)"""
+    _update_query = """UPDATE guests SET 
+                   name=%s, surname=%s, patronymic=%s, phone_num=%s, passport_data=%s 
+                   WHERE id=%s"""
+
+    def _params(self):
+        return (self._name, self._surname, self._patronymic,
+                self._phone_num, self.__passport_data)
+
+    def _row(self):
+        return {
+            'id': self.id,
+            'name': self._name,
+            'surname': self._surname,
+            'patronymic': self._patronymic,
+            'phone_num': self._phone_num,
+            'passport_data': self.__passport_data,
+        }
+
     def save(self):
         self.logger.info(f"Сохранение гостя {self.full_name()} в БД")
         db = Database()
-        query = """INSERT INTO guests 
-                   (name, surname, patronymic, phone_num, passport_data) 
-                   VALUES (%s, %s, %s, %s, %s)"""
-        params = (self._name, self._surname, self._patronymic,
-                  self._phone_num, self.__passport_data)
-        db.execute_query(query, params)
-        self.logger.debug("Гость успешно сохранен")
+        self.id = db.execute_query(self._insert_query, self._params())
+        self._cache.invalidate(self.id)
+        self._index_keys()
+        self._notify([(self.id, self._row())])
+        self.logger.debug(f"Гость успешно сохранен, ID {self.id}")
 
     def update(self):
         if self.id is None:
@@ -237,12 +332,44 @@ class Guest(Person):
 
         self.logger.info(f"Обновление гостя ID {self.id} в БД")
         db = Database()
-        query = """UPDATE guests SET 
-                   name=%s, surname=%s, patronymic=%s, phone_num=%s, passport_data=%s 
-                   WHERE id=%s"""
-        params = (self._name, self._surname, self._patronymic,
-                  self._phone_num, self.__passport_data, self.id)
-        db.execute_query(query, params)
+        db.execute_query(self._update_query, self._params() + (self.id,))
+        self._cache.invalidate(self.id)
+        self._index_keys()
+        self._notify([(self.id, self._row())])
+
+    @classmethod
+    def save_many(cls, guests):
+        """Сохранение списка гостей одной транзакцией с присвоением ID"""
+        logger = get_logger('person.guest')
+        guests = list(guests)
+        logger.info(f"Пакетное сохранение {len(guests)} гостей в БД")
+        db = Database()
+        ids = db.execute_many(cls._insert_query, [guest._params() for guest in guests], return_ids=True)
+        for guest, new_id in zip(guests, ids):
+            guest.id = new_id
+        cls._cache.invalidate(*ids)
+        for guest in guests:
+            guest._index_keys()
+        cls._notify([(guest.id, guest._row()) for guest in guests])
+        logger.debug("Гости успешно сохранены")
+        return guests
+
+    @classmethod
+    def update_many(cls, guests):
+        """Обновление списка гостей одной транзакцией"""
+        logger = get_logger('person.guest')
+        guests = list(guests)
+        if any(guest.id is None for guest in guests):
+            logger.error("Попытка пакетно обновить гостя без ID")
+            raise ValueError("Нельзя обновить запись без ID")
+
+        logger.info(f"Пакетное обновление {len(guests)} гостей в БД")
+        db = Database()
+        db.execute_many(cls._update_query, [guest._params() + (guest.id,) for guest in guests])
+        cls._cache.invalidate(*(guest.id for guest in guests))
+        for guest in guests:
+            guest._index_keys()
+        cls._notify([(guest.id, guest._row()) for guest in guests])
 
     def delete(self):
         if self.id is None:
@@ -253,29 +380,96 @@ class Guest(Person):
         db = Database()
         query = "DELETE FROM guests WHERE id=%s"
         db.execute_query(query, (self.id,))
+        self._cache.invalidate(self.id)
+        self._key_index.invalidate(*self._key_values().items())
+        self._notify([(self.id, None)])
         self.logger.info("Гость удален")
 
     @classmethod
     def get_by_id(cls, id):
         logger = get_logger('person.guest')
         logger.debug(f"Поиск гостя по ID: {id}")
-        db = Database()
-        query = "SELECT * FROM guests WHERE id=%s"
-        result = db.fetch_one(query, (id,))
+        result = cls._cache.get(id)
+        if result is None:
+            db = Database()
+            query = "SELECT * FROM guests WHERE id=%s"
+            result = db.fetch_one(query, (id,))
+            if result:
+                cls._cache.put(id, result)
 
         if result:
             logger.debug(f"Гость с ID {id} найден")
-            return cls(
-                name=result['name'],
-                surname=result['surname'],
-                phone_num=result['phone_num'],
-                passport_data=result['passport_data'],
-                patronymic=result['patronymic'],
-                id=result['id']
-            )
+            return cls._from_row(result)
         logger.warning(f"Гость с ID {id} не найден")
         return None
 
+    @classmethod
+    def get_by_ids(cls, ids):
+        """Поиск гостей по списку ID: словарь id -> объект, ненайденные ID пропускаются"""
+        logger = get_logger('person.guest')
+        ids = list(ids)
+        logger.debug(f"Пакетный поиск гостей по {len(ids)} ID")
+        rows = cls._cache.fetch_many('guests', ids)
+        return {id: cls._from_row(row) for id, row in rows.items()}
+
+    @classmethod
+    def find_by_passport(cls, passport_data):
+        """Поиск гостя по паспортным данным"""
+        return cls._find_by_key('passport_data', passport_data)
+
+    @classmethod
+    def find_by_phone(cls, phone_num):
+        """Поиск гостя по номеру телефона"""
+        return cls._find_by_key('phone_num', phone_num)
+
+    @classmethod
+    def find_by_name(cls, full_name):
+        """Гости с указанным ФИО ("Фамилия Имя [Отчество]"); полные тезки возвращаются все"""
+        logger = get_logger('person.guest')
+        full_name = " ".join(full_name.split())
+        if not full_name:
+            return []
+        logger.debug(f"Поиск гостей по ФИО: {full_name}")
+        # Поиск по индексу фамилии, точное сравнение ФИО - уже среди однофамильцев
+        surname = full_name.split(" ")[0]
+        db = Database()
+        results = db.fetch_all("SELECT * FROM guests WHERE surname=%s ORDER BY id", (surname,))
+        guests = [guest for guest in map(cls._from_row, results) if guest.full_name() == full_name]
+        logger.debug(f"Найдено {len(guests)} гостей с ФИО {full_name}")
+        return guests
+
+    @classmethod
+    def _find_by_key(cls, column, value):
+        logger = get_logger('person.guest')
+        value = value.strip() if isinstance(value, str) else value
+        if not value:
+            return None
+        logger.debug(f"Поиск гостя по {column}: {value}")
+
+        id = cls._key_index.get((column, value))
+        if id is not None:
+            guest = cls.get_by_id(id)
+            if guest is not None and guest._key_values()[column] == value:
+                return guest
+            cls._key_index.invalidate((column, value))
+
+        db = Database()
+        result = db.fetch_one(f"SELECT * FROM guests WHERE {column}=%s ORDER BY id LIMIT 1", (value,))
+        if not result:
+            logger.debug(f"Гость с {column} {value} не найден")
+            return None
+        cls._cache.put(result['id'], result)
+        guest = cls._from_row(result)
+        guest._index_keys()
+        return guest
+
+    def _key_values(self):
+        return {'passport_data': self.__passport_data, 'phone_num': self._phone_num}
+
+    def _index_keys(self):
+        for column, value in self._key_values().items():
+            self._key_index.put((column, value), self.id)
+
     @classmethod
     def get_all(cls):
         logger = get_logger('person.guest')
@@ -284,15 +478,42 @@ class Guest(Person):
         query = "SELECT * FROM guests"
         results = db.fetch_all(query)
 
-        guests = []
-        for result in results:
-            guests.append(cls(
-                name=result['name'],
-                surname=result['surname'],
-                phone_num=result['phone_num'],
-                passport_data=result['passport_data'],
-                patronymic=result['patronymic'],
-                id=result['id']
-            ))
+        guests = [cls._from_row(result) for result in results]
         logger.info(f"Получено {len(guests)} гостей")
-        return guests
\ No newline at end of file
+        return guests
+
+    @classmethod
+    def iter_all(cls, batch_size=500):
+        """Генератор всех гостей без загрузки всей таблицы в память"""
+        logger = get_logger('person.guest')
+        logger.debug("Потоковый запрос всех гостей из БД")
+        db = Database()
+        for result in db.fetch_iter("SELECT * FROM guests", batch_size=batch_size):
+            yield cls._from_row(result)
+
+    # Допустимые варианты сортировки для get_page ('-' в начале - по убыванию)
+    _page_order = {'id': 'id', 'surname': 'surname', 'phone_num': 'phone_num'}
+
+    @classmethod
+    def get_page(cls, after_id=None, limit=100, order_by='id'):
+        """Страница гостей после записи after_id (None - первая страница)"""
+        logger = get_logger('person.guest')
+        descending = order_by.startswith('-')
+        column = cls._page_order.get(order_by.lstrip('-'))
+        if column is None:
+            raise ValueError(f"Недопустимая сортировка: {order_by}")
+        logger.debug(f"Запрос страницы гостей после ID {after_id}, сортировка {order_by}")
+        db = Database()
+        results = db.fetch_page('guests', after_id, limit, column, descending)
+        return [cls._from_row(result) for result in results]
+
+    @classmethod
+    def _from_row(cls, result):
+        return cls(
+            name=result['name'],
+            surname=result['surname'],
+            phone_num=result['phone_num'],
+            passport_data=result['passport_data'],
+            patronymic=result['patronymic'],
+            id=result['id']
+        )
@@ -1,9 +1,15 @@
+from datetime import datetime
 from database import Database
+from models.cache import ModelCache
+from models.listeners import ChangeNotifier
 from log_config import get_logger
 from exceptions import InvalidDataError
 
 
-class HotelRoom:
+class HotelRoom(ChangeNotifier):
+    # LRU-кэш строк для get_by_id, сбрасывается при изменениях
+    _cache = ModelCache('room')
+
     def __init__(self, room_id, price, type, capacity, id=None, is_free=True):
 
         if not room_id or not isinstance(room_id, (str, int)):
@@ -69,16 +75,35 @@ class HotelRoom:
         self.__is_free = bool(value)
 
     # Методы для работы с БД
+    _insert_query = """INSERT INTO rooms 
+                   (room_id, type, price, capacity, is_free) 
+                   VALUES (%s, %s, %s, %s, %s)"""
+    _update_query = """UPDATE rooms SET 
+                   room_id=%s, type=%s, price=%s, 
+                   capacity=%s, is_free=%s 
+                   WHERE id=%s"""
+
+    def _params(self):
+        return (self.__room_id, self.__type, self.__price,
+                self.__capacity, self.__is_free)
+
+    def _row(self):
+        return {
+            'id': self.id,
+            'room_id': self.__room_id,
+            'type': self.__type,
+            'price': self.__price,
+            'capacity': self.__capacity,
+            'is_free': self.__is_free,
+        }
+
     def save(self):
         self.logger.info(f"Сохранение комнаты {self.__room_id} в БД")
         db = Database()
-        query = """INSERT INTO rooms 
-                   (room_id, type, price, capacity, is_free) 
-                   VALUES (%s, %s, %s, %s, %s)"""
-        params = (self.__room_id, self.__type, self.__price,
-                 self.__capacity, self.__is_free)
-        db.execute_query(query, params)
-        self.logger.debug("Комната успешно сохранена")
+        self.id = db.execute_query(self._insert_query, self._params())
+        self._cache.invalidate(self.id)
+        self._notify([(self.id, self._row())])
+        self.logger.debug(f"Комната успешно сохранена, ID {self.id}")
 
     def update(self):
         if self.id is None:
@@ -87,15 +112,42 @@ class HotelRoom:
 
         self.logger.info(f"Обновление комнаты ID {self.id} в БД")
         db = Database()
-        query = """UPDATE rooms SET 
-                   room_id=%s, type=%s, price=%s, 
-                   capacity=%s, is_free=%s 
-                   WHERE id=%s"""
-        params = (self.__room_id, self.__type, self.__price,
-                 self.__capacity, self.__is_free, self.id)
-        db.execute_query(query, params)
+        db.execute_query(self._update_query, self._params() + (self.id,))
+        self._cache.invalidate(self.id)
+        self._notify([(self.id, self._row())])
         self.logger.debug("Комната успешно обновлена")
 
+    @classmethod
+    def save_many(cls, rooms):
+        """Сохранение списка комнат одной транзакцией с присвоением ID"""
+        logger = get_logger('room')
+        rooms = list(rooms)
+        logger.info(f"Пакетное сохранение {len(rooms)} комнат в БД")
+        db = Database()
+        ids = db.execute_many(cls._insert_query, [room._params() for room in rooms], return_ids=True)
+        for room, new_id in zip(rooms, ids):
+            room.id = new_id
+        cls._cache.invalidate(*ids)
+        cls._notify([(room.id, room._row()) for room in rooms])
+        logger.debug("Комнаты успешно сохранены")
+        return rooms
+
+    @classmethod
+    def update_many(cls, rooms):
+        """Обновление списка комнат одной транзакцией"""
+        logger = get_logger('room')
+        rooms = list(rooms)
+        if any(room.id is None for room in rooms):
+            logger.error("Попытка пакетно обновить комнату без ID")
+            raise ValueError("Нельзя обновить запись без ID")
+
+        logger.info(f"Пакетное обновление {len(rooms)} комнат в БД")
+        db = Database()
+        db.execute_many(cls._update_query, [room._params() + (room.id,) for room in rooms])
+        cls._cache.invalidate(*(room.id for room in rooms))
+        cls._notify([(room.id, room._row()) for room in rooms])
+        logger.debug("Комнаты успешно обновлены")
+
     def delete(self):
         if self.id is None:
             self.logger.error("Попытка удалить комнату без ID")
@@ -105,26 +157,25 @@ class HotelRoom:
         db = Database()
         query = "DELETE FROM rooms WHERE id=%s"
         db.execute_query(query, (self.id,))
+        self._cache.invalidate(self.id)
+        self._notify([(self.id, None)])
         self.logger.info("Комната удалена")
 
     @classmethod
     def get_by_id(cls, id):
         logger = get_logger('room')
         logger.debug(f"Поиск комнаты по ID: {id}")
-        db = Database()
-        query = "SELECT * FROM rooms WHERE id=%s"
-        result = db.fetch_one(query, (int(id),))
+        result = cls._cache.get(id)
+        if result is None:
+            db = Database()
+            query = "SELECT * FROM rooms WHERE id=%s"
+            result = db.fetch_one(query, (int(id),))
+            if result:
+                cls._cache.put(id, result)
 
         if result:
             logger.debug(f"Комната с ID {id} найдена")
-            return cls(
-                room_id=result['room_id'],
-                type=result['type'],
-                price=result['price'],
-                capacity=result['capacity'],
-                id=result['id'],
-                is_free=bool(result['is_free'])
-            )
+            return cls._from_row(result)
         logger.warning(f"Комната с ID {id} не найдена")
         return None
 
@@ -138,17 +189,19 @@ class HotelRoom:
 
         if result:
             logger.debug(f"Комната с номером {room_id} найдена")
-            return cls(
-                room_id=result['room_id'],
-                type=result['type'],
-                price=result['price'],
-                capacity=result['capacity'],
-                id=result['id'],
-                is_free=bool(result['is_free'])
-            )
+            return cls._from_row(result)
         logger.warning(f"Комната с номером {room_id} не найдена")
         return None
 
+    @classmethod
+    def get_by_ids(cls, ids):
+        """Поиск комнат по списку ID: словарь id -> объект, ненайденные ID пропускаются"""
+        logger = get_logger('room')
+        ids = list(ids)
+        logger.debug(f"Пакетный поиск комнат по {len(ids)} ID")
+        rows = cls._cache.fetch_many('rooms', ids)
+        return {id: cls._from_row(row) for id, row in rows.items()}
+
     @classmethod
     def get_all(cls):
         logger = get_logger('room')
@@ -157,19 +210,35 @@ class HotelRoom:
         query = "SELECT * FROM rooms"
         results = db.fetch_all(query)
 
-        rooms = []
-        for result in results:
-            rooms.append(cls(
-                room_id=result['room_id'],
-                type=result['type'],
-                price=result['price'],
-                capacity=result['capacity'],
-                id=result['id'],
-                is_free=bool(result['is_free'])
-            ))
+        rooms = [cls._from_row(result) for result in results]
         logger.info(f"Получено {len(rooms)} комнат")
         return rooms
 
+    @classmethod
+    def iter_all(cls, batch_size=500):
+        """Генератор всех комнат без загрузки всей таблицы в память"""
+        logger = get_logger('room')
+        logger.debug("Потоковый запрос всех комнат из БД")
+        db = Database()
+        for result in db.fetch_iter("SELECT * FROM rooms", batch_size=batch_size):
+            yield cls._from_row(result)
+
+    # Допустимые варианты сортировки для get_page ('-' в начале - по убыванию)
+    _page_order = {'id': 'id', 'number': 'room_id', 'price': 'price'}
+
+    @classmethod
+    def get_page(cls, after_id=None, limit=100, order_by='id'):
+        """Страница комнат после записи after_id (None - первая страница)"""
+        logger = get_logger('room')
+        descending = order_by.startswith('-')
+        column = cls._page_order.get(order_by.lstrip('-'))
+        if column is None:
+            raise ValueError(f"Недопустимая сортировка: {order_by}")
+        logger.debug(f"Запрос страницы комнат после ID {after_id}, сортировка {order_by}")
+        db = Database()
+        results = db.fetch_page('rooms', after_id, limit, column, descending)
+        return [cls._from_row(result) for result in results]
+
     @classmethod
     def get_available_rooms(cls):
         logger = get_logger('room')
@@ -178,15 +247,53 @@ class HotelRoom:
         query = "SELECT * FROM rooms WHERE is_free = TRUE"
         results = db.fetch_all(query)
 
-        rooms = []
-        for result in results:
-            rooms.append(cls(
-                room_id=result['room_id'],
-                type=result['type'],
-                price=result['price'],
-                capacity=result['capacity'],
-                id=result['id'],
-                is_free=bool(result['is_free'])
-            ))
+        rooms = [cls._from_row(result) for result in results]
         logger.info(f"Найдено {len(rooms)} доступных комнат")
-        return rooms
\ No newline at end of file
+        return rooms
+
+    @classmethod
+    def find_available(cls, check_in, check_out, min_capacity=None, room_type=None, max_price=None):
+        """Комнаты, свободные на период [заезд, выезд), с фильтрами, по возрастанию цены"""
+        logger = get_logger('room')
+        if isinstance(check_in, str):
+            check_in = datetime.strptime(check_in, "%Y-%m-%d").date()
+        if isinstance(check_out, str):
+            check_out = datetime.strptime(check_out, "%Y-%m-%d").date()
+        if check_in >= check_out:
+            raise InvalidDataError("Дата выезда должна быть позже даты заезда")
+        logger.debug(f"Поиск свободных комнат на период {check_in} - {check_out}")
+
+        conditions = []
+        params = []
+        if min_capacity is not None:
+            conditions.append("r.capacity >= %s")
+            params.append(int(min_capacity))
+        if room_type:
+            conditions.append("r.type = %s")
+            params.append(room_type)
+        if max_price is not None:
+            conditions.append("r.price <= %s")
+            params.append(float(max_price))
+
+        # Анти-join: для каждой комнаты EXISTS проверяет пересечения по индексу idx_bookings_room_dates
+        conditions.append("""NOT EXISTS (SELECT 1 FROM bookings b
+                                          WHERE b.room_id = r.id AND b.is_active = TRUE
+                                            AND b.check_out_date > %s AND b.check_in_date < %s)""")
+        params.extend([check_in, check_out])
+
+        query = f"SELECT r.* FROM rooms r WHERE {' AND '.join(conditions)} ORDER BY r.price, r.id"
+        db = Database()
+        rooms = [cls._from_row(result) for result in db.fetch_all(query, tuple(params))]
+        logger.info(f"Найдено {len(rooms)} свободных комнат на период {check_in} - {check_out}")
+        return rooms
+
+    @classmethod
+    def _from_row(cls, result):
+        return cls(
+            room_id=result['room_id'],
+            type=result['type'],
+            price=result['price'],
+            capacity=result['capacity'],
+            id=result['id'],
+            is_free=bool(result['is_free'])
+        )
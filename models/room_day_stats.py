@@ -0,0 +1,99 @@
+import argparse
+from datetime import datetime, timedelta
+
+from config import REPORT_MODE
+from database import Database, ID_CHUNK_SIZE
+from log_config import get_logger
+
+
+class RoomDayStats:
+    """Таблица фактов room_day_stats: по строке на каждый день бронирования.
+
+    Строка (day, room_id, booking_id, guest_id, is_active) - день с заезда по выезд
+    включительно, как дни считают отчеты; бронирование остается в таблице и после
+    выезда или отмены (is_active = FALSE), потому что отчет по гостям учитывает все
+    бронирования. Выручка считается при чтении по текущей цене номера.
+    Строки бронирования заменяются в той же транзакции, что и само бронирование
+    (Booking.save/update/delete), поэтому отчеты по периодам читают из таблицы
+    только диапазон дней по первичному ключу (day, room_id, booking_id).
+    Таблица ведется только в режиме отчетов REPORT_MODE = 'facts' (enabled);
+    при переходе на этот режим ее заполняет backfill.
+    """
+
+    _insert_query = """INSERT INTO room_day_stats (day, room_id, booking_id, guest_id, is_active)
+                       VALUES (%s, %s, %s, %s, %s)"""
+
+    def __init__(self, enabled=REPORT_MODE == 'facts'):
+        self.logger = get_logger('reports.stats')
+        self.enabled = enabled
+
+    def write(self, changes, new=False):
+        """Заменить строки бронирований: changes - пары (booking_id, row), row=None при удалении.
+
+        new=True - бронирования только что созданы, удалять нечего.
+        """
+        if not self.enabled:
+            return
+        db = Database()
+        with db.transaction():
+            if not new:
+                booking_ids = [booking_id for booking_id, row in changes]
+                for start in range(0, len(booking_ids), ID_CHUNK_SIZE):
+                    chunk = booking_ids[start:start + ID_CHUNK_SIZE]
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    db.execute_query(f"DELETE FROM room_day_stats WHERE booking_id IN ({placeholders})", tuple(chunk))
+            db.execute_many(self._insert_query, self._days([row for booking_id, row in changes if row]))
+
+    def backfill(self, batch_size=1000):
+        """Перестроить таблицу по всем бронированиям; возвращает число записанных дней.
+
+        Удаление и заполнение идут одной транзакцией: пока таблица перестраивается,
+        отчеты читают прежние строки, а при ошибке она остается как была.
+        Бронирования читаются и записываются страницами по id.
+        """
+        db = Database()
+        total = 0
+        after_id = None
+        with db.transaction():
+            db.execute_query("DELETE FROM room_day_stats")
+            while True:
+                bookings = db.fetch_page('bookings', after_id=after_id, limit=batch_size)
+                if not bookings:
+                    break
+                after_id = bookings[-1]['id']
+                days = self._days(bookings)
+                db.execute_many(self._insert_query, days)
+                total += len(days)
+        self.logger.info(f"Таблица room_day_stats перестроена: {total} дней")
+        return total
+
+    def _days(self, rows):
+        days = []
+        for row in rows:
+            check_in, check_out = self._parse_date(row['check_in_date']), self._parse_date(row['check_out_date'])
+            is_active = bool(row['is_active'])
+            for offset in range((check_out - check_in).days + 1):
+                days.append((check_in + timedelta(days=offset), row['room_id'], row['id'], row['guest_id'], is_active))
+        return days
+
+    @staticmethod
+    def _parse_date(value):
+        if isinstance(value, str):
+            return datetime.strptime(value[:10], "%Y-%m-%d").date()
+        return value
+
+
+room_day_stats = RoomDayStats()
+
+
+if __name__ == "__main__":
+    from log_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Обслуживание таблицы фактов room_day_stats")
+    parser.add_argument('command', choices=['backfill'], help="backfill - перестроить таблицу по истории бронирований")
+    parser.add_argument('--batch-size', type=int, default=1000, help="сколько бронирований читать и записывать за раз")
+    args = parser.parse_args()
+
+    setup_logging()
+    count = room_day_stats.backfill(batch_size=args.batch_size)
+    print(f"Записано дней: {count}")
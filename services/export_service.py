@@ -1,18 +1,17 @@
 from models import Employee, Guest, HotelRoom, Booking
 from tkinter import filedialog, messagebox
-import pandas as pd
 import os
 import sys
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from datetime import datetime
+# pandas и reportlab импортируются в методах экспорта: они долго загружаются,
+# а экспорт нужен не в каждом сеансе (openpyxl - по той же причине)
 # для многопоточной обработки экспорта
 import threading
 import queue
+from itertools import chain, islice
+
+# Сколько первых строк листа резервной копии учитывать при подборе ширины колонок
+BACKUP_WIDTH_SAMPLE = 500
 
 
 class ExportService:
@@ -23,6 +22,7 @@ class ExportService:
 
     @staticmethod
     def extract_excel_all_threaded():
+        from openpyxl import Workbook
         try:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".xlsx",
@@ -33,91 +33,22 @@ class ExportService:
             if not file_path:
                 return False, "Операция отменена пользователем"
 
-            data_sheets = {}
-
-            # 1. Данные сотрудников
-            try:
-                employees = Employee.get_all()
-                if employees:
-                    emp_data = []
-                    for emp in employees:
-                        emp_data.append({
-                            'ID': emp.id,
-                            'Фамилия': emp.get_surname(),
-                            'Имя': emp.get_name(),
-                            'Отчество': emp.get_patronymic(),
-                            'Должность': emp.get_position(),
-                            'Телефон': emp.get_phone_num(),
-                            'Email': emp.get_mail(),
-                            'Дата принятия': emp.get_date_of_employment()
-                        })
-                    data_sheets['Сотрудники'] = pd.DataFrame(emp_data)
-            except Exception as e:
-                return False, f"Ошибка получения данных сотрудников: {str(e)}"
-
-            # 2. Данные номеров
-            try:
-                rooms = HotelRoom.get_all()
-                if rooms:
-                    room_data = []
-                    for room in rooms:
-                        room_data.append({
-                            'ID': room.id,
-                            'Номер': room.get_number(),
-                            'Тип': room.get_type(),
-                            'Цена': room.get_price(),
-                            'Статус': room.is_free(),
-                            'Вместимость': room.get_capacity()
-                        })
-                    data_sheets['Номера'] = pd.DataFrame(room_data)
-            except Exception as e:
-                return False, f"Ошибка получения данных номеров: {str(e)}"
-
-            # 3. Данные бронирований
-            try:
-                bookings = Booking.get_all()
-                if bookings:
-                    booking_data = []
-                    for booking in bookings:
-                        booking_data.append({
-                            'ID': booking.id,
-                            'ID_Гостя': booking.get_guest_id(),
-                            'ID_Номера': booking.get_room_id(),
-                            'Дата_заезда': booking.get_check_in_date(),
-                            'Дата_выезда': booking.get_check_out_date(),
-                            'Статус': 'Активно' if booking.get_is_active() else 'Неактивно'
-                        })
-                    data_sheets['Бронирования'] = pd.DataFrame(booking_data)
-            except Exception as e:
-                return False, f"Ошибка получения данных бронирований: {str(e)}"
-
-            # 4. Данные гостей
-            try:
-                guests = Guest.get_all()
-                if guests:
-                    guest_data = []
-                    for guest in guests:
-                        guest_data.append({
-                            'ID': guest.id,
-                            'Фамилия': guest.get_surname(),
-                            'Имя': guest.get_name(),
-                            'Отчество': guest.get_patronymic(),
-                            'Телефон': guest.get_phone_num(),
-                        })
-                    data_sheets['Гости'] = pd.DataFrame(guest_data)
-            except Exception as e:
-                return False, f"Ошибка получения данных гостей: {str(e)}"
-
-            if not data_sheets:
+            # Книга в режиме только записи: строки уходят во временные файлы по мере чтения из БД,
+            # поэтому ни таблицы целиком, ни DataFrame в памяти не собираются
+            workbook = Workbook(write_only=True)
+            written = 0
+            for sheet_name, what, headers, records, to_row in ExportService._backup_sheets():
+                try:
+                    written += ExportService._append_sheet(workbook, sheet_name, headers, map(to_row, records()))
+                except Exception as e:
+                    return False, f"Ошибка получения данных {what}: {str(e)}"
+
+            if not written:
                 return False, "Нет данных для экспорта"
 
             # Запись в файл
             try:
-                with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                    for sheet_name, df in data_sheets.items():
-                        df.to_excel(writer, sheet_name=sheet_name, index=False)
-                        worksheet = writer.sheets[sheet_name]
-                        ExportService._auto_adjust_columns(worksheet)
+                workbook.save(file_path)
             except Exception as e:
                 return False, f"Ошибка записи в файл: {str(e)}"
 
@@ -126,8 +57,61 @@ class ExportService:
         except Exception as e:
             return False, f"Неожиданная ошибка при экспорте: {str(e)}"
 
+    @staticmethod
+    def _backup_sheets():
+        """Листы резервной копии: название, чьи данные, заголовки, генератор объектов и строка листа"""
+        return [
+            ('Сотрудники', 'сотрудников',
+             ['ID', 'Фамилия', 'Имя', 'Отчество', 'Должность', 'Телефон', 'Email', 'Дата принятия'],
+             Employee.iter_all,
+             lambda emp: (emp.id, emp.get_surname(), emp.get_name(), emp.get_patronymic(), emp.get_position(),
+                          emp.get_phone_num(), emp.get_mail(), emp.get_date_of_employment())),
+            ('Номера', 'номеров',
+             ['ID', 'Номер', 'Тип', 'Цена', 'Статус', 'Вместимость'],
+             HotelRoom.iter_all,
+             lambda room: (room.id, room.get_number(), room.get_type(), room.get_price(), room.is_free(),
+                           room.get_capacity())),
+            ('Бронирования', 'бронирований',
+             ['ID', 'ID_Гостя', 'ID_Номера', 'Дата_заезда', 'Дата_выезда', 'Статус'],
+             Booking.iter_all,
+             lambda booking: (booking.id, booking.get_guest_id(), booking.get_room_id(),
+                              booking.get_check_in_date(), booking.get_check_out_date(),
+                              'Активно' if booking.get_is_active() else 'Неактивно')),
+            ('Гости', 'гостей',
+             ['ID', 'Фамилия', 'Имя', 'Отчество', 'Телефон'],
+             Guest.iter_all,
+             lambda guest: (guest.id, guest.get_surname(), guest.get_name(), guest.get_patronymic(),
+                            guest.get_phone_num())),
+        ]
+
+    @staticmethod
+    def _append_sheet(workbook, sheet_name, headers, rows):
+        """Дописать строки на новый лист книги write_only; пустой лист не создается. Возвращает число строк.
+
+        Ширина колонок подбирается по заголовку и первым BACKUP_WIDTH_SAMPLE строкам:
+        в режиме только записи ее нужно задать до первой строки.
+        """
+        from openpyxl.utils import get_column_letter
+        sample = list(islice(rows, BACKUP_WIDTH_SAMPLE))
+        if not sample:
+            return 0
+
+        worksheet = workbook.create_sheet(sheet_name)
+        for index, header in enumerate(headers):
+            max_length = max(len(str(value)) if value is not None else 0
+                             for value in [header] + [row[index] for row in sample])
+            worksheet.column_dimensions[get_column_letter(index + 1)].width = min(max_length + 2, 50)
+
+        worksheet.append(headers)
+        count = 0
+        for row in chain(sample, rows):
+            worksheet.append(row)
+            count += 1
+        return count
+
     @staticmethod
     def export_single_sheet_threaded(dataframe, sheet_name="Отчет"):
+        import pandas as pd
         try:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".xlsx",
@@ -155,6 +139,10 @@ class ExportService:
 
     @staticmethod
     def export_single_sheet_to_pdf_threaded(dataframe, title="Отчет"):
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib import colors
         try:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".pdf",
@@ -373,6 +361,8 @@ class ExportService:
     @staticmethod
     def _register_fonts():
         """Регистрация шрифтов для PDF"""
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
         try:
             current_dir = os.path.dirname(os.path.abspath(__file__))
             project_dir = os.path.dirname(current_dir)
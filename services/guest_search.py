@@ -0,0 +1,211 @@
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import islice
+
+from database import Database
+from log_config import get_logger
+from models import Guest
+
+# Сколько гостей максимум проверять при нечетком поиске
+FUZZY_CANDIDATES = 2000
+
+
+def _normalize(text):
+    return (text or "").strip().lower().replace("ё", "е")
+
+
+def _trigrams(word):
+    # Как в pg_trgm: пробелы по краям дают вес началу и концу слова
+    word = f"  {word} "
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class GuestSearchIndex:
+    """Индекс для автодополнения гостей по фамилии, имени, отчеству и телефону.
+
+    Префиксный поиск - бинарный поиск по отсортированному списку ключей (key, id);
+    если совпадений по префиксу нет, подбираются похожие варианты по триграммам
+    (опечатки, часть слова из середины).
+    """
+
+    def __init__(self):
+        self.logger = get_logger('person.guest.search')
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._data = _IndexData()
+        # Изменения, пришедшие во время фонового перестроения: их догоняет новая копия индекса
+        self._rebuilds = []
+
+    def search(self, text, limit=20):
+        """До limit гостей, подходящих под введенный текст: список словарей id, full_name, phone_num"""
+        tokens = [self._token_key(token) for token in _normalize(text).split()]
+        tokens = [token for token in tokens if token]
+        if not tokens:
+            return []
+
+        with self._lock:
+            self._ensure_loaded()
+            data = self._data
+            ids = data.prefix_matches(tokens, limit) or data.fuzzy_matches(tokens, limit)
+            return [dict(data.guests[id][0], id=id) for id in ids]
+
+    def apply(self, guest_id, row):
+        """Учесть изменение гостя: row - новое состояние строки или None при удалении"""
+        with self._lock:
+            for pending in self._rebuilds:
+                pending.append((guest_id, row))
+            if self._loaded:
+                self._data.apply(guest_id, row)
+
+    def reset(self):
+        """Сбросить индекс; он будет перестроен из БД при следующем обращении"""
+        with self._lock:
+            self._loaded = False
+            self._data = _IndexData()
+
+    def load(self):
+        """Построить индекс заранее (из фонового потока), чтобы первый поиск не ждал БД"""
+        with self._lock:
+            self._ensure_loaded()
+
+    def reload(self):
+        """Перестроить индекс из БД сразу (с учетом изменений с других рабочих мест).
+
+        Новая копия строится без блокировки, поиск до замены идет по прежнему индексу.
+        """
+        pending = []
+        with self._lock:
+            self._rebuilds.append(pending)
+        try:
+            data = self._build()
+        finally:
+            with self._lock:
+                self._rebuilds.remove(pending)
+        with self._lock:
+            for guest_id, row in pending:
+                data.apply(guest_id, row)
+            self._data = data
+            self._loaded = True
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def __len__(self):
+        return len(self._data.guests)
+
+    @staticmethod
+    def _token_key(token):
+        # Номер телефона ищется по цифрам без "+", скобок и дефисов
+        if any(ch.isdigit() for ch in token) and all(ch.isdigit() or ch in "+()-" for ch in token):
+            return "".join(ch for ch in token if ch.isdigit())
+        return token
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._data = self._build()
+            self._loaded = True
+
+    def _build(self):
+        data = _IndexData()
+        query = "SELECT id, surname, name, patronymic, phone_num FROM guests"
+        for row in Database().fetch_iter(query, batch_size=2000):
+            data.add(row['id'], row, bulk=True)
+        data.keys.sort()
+        self.logger.info(f"Индекс поиска гостей построен: {len(data.guests)} гостей, {len(data.keys)} ключей")
+        return data
+
+
+class _IndexData:
+    """Структуры индекса: отсортированные ключи (key, id), гости и триграммы.
+
+    При перестроении собирается новый экземпляр и подменяется целиком.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.guests = {}
+        self.trigram_ids = {}
+
+    def prefix_matches(self, tokens, limit):
+        # Перебираем самый узкий диапазон ключей, остальные слова проверяем по ключам гостя
+        ranges = []
+        for token in tokens:
+            lo = bisect_left(self.keys, (token,))
+            hi = bisect_left(self.keys, (token + "\uffff",))
+            ranges.append((hi - lo, lo, hi, token))
+        _, lo, hi, first = min(ranges)
+        others = [token for token in tokens if token != first]
+
+        ids = []
+        seen = set()
+        for _, id in self.keys[lo:hi]:
+            if id in seen:
+                continue
+            seen.add(id)
+            keys = self.guests[id][1]
+            if all(any(key.startswith(token) for key in keys) for token in others):
+                ids.append(id)
+                if len(ids) >= limit:
+                    break
+        return ids
+
+    def fuzzy_matches(self, tokens, limit):
+        # Номера телефонов ищутся только по префиксу
+        grams = set().union(*(_trigrams(token) for token in tokens if not token.isdigit()))
+        if not grams:
+            return []
+        postings = sorted((self.trigram_ids.get(gram, set()) for gram in grams), key=len)
+        # Нужно совпадение не меньше половины триграмм запроса; такой гость обязательно
+        # встречается хотя бы в одной из (всего - нужно + 1) самых редких триграмм
+        needed = (len(postings) + 1) // 2
+        candidates = set()
+        for posting in postings[:len(postings) - needed + 1]:
+            # Ограничиваем перебор, чтобы частые триграммы не замедляли подсказки
+            candidates.update(islice(posting, FUZZY_CANDIDATES - len(candidates)))
+            if len(candidates) >= FUZZY_CANDIDATES:
+                break
+        scores = Counter({id: sum(id in posting for posting in postings) for id in candidates})
+        return [id for id, score in scores.most_common(limit) if score >= needed]
+
+    def apply(self, guest_id, row):
+        self.remove(guest_id)
+        if row is not None:
+            self.add(guest_id, row)
+
+    def add(self, guest_id, row, bulk=False):
+        # ФИО в том же виде, что и Person.full_name()
+        parts = [row['surname'], row['name'], row['patronymic']]
+        full_name = " ".join(part for part in parts if part)
+        keys = {_normalize(part) for part in parts if part}
+        phone = "".join(ch for ch in row['phone_num'] or "" if ch.isdigit())
+        if phone:
+            keys.add(phone)
+        keys.discard("")
+
+        self.guests[guest_id] = ({'full_name': full_name, 'phone_num': row['phone_num']}, keys)
+        for key in keys:
+            if bulk:
+                self.keys.append((key, guest_id))
+            else:
+                insort(self.keys, (key, guest_id))
+            if not key.isdigit():
+                for gram in _trigrams(key):
+                    self.trigram_ids.setdefault(gram, set()).add(guest_id)
+
+    def remove(self, guest_id):
+        guest = self.guests.pop(guest_id, None)
+        if guest is None:
+            return
+        for key in guest[1]:
+            pos = bisect_left(self.keys, (key, guest_id))
+            if pos < len(self.keys) and self.keys[pos] == (key, guest_id):
+                del self.keys[pos]
+            if not key.isdigit():
+                for gram in _trigrams(key):
+                    self.trigram_ids[gram].discard(guest_id)
+
+
+guest_search = GuestSearchIndex()
+Guest.subscribe(guest_search.apply)
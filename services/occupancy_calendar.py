@@ -0,0 +1,218 @@
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from database import Database
+from log_config import get_logger
+from models import Booking
+
+
+class OccupancyCalendar:
+    """Матрица занятости "комнаты x дни" для всей гостиницы.
+
+    Ячейка [комната, день] - число активных бронирований, занимающих ночь
+    с этого дня на следующий (uint8, обычно 0 или 1). Счетчик вместо флага
+    позволяет корректно снимать бронирование, даже если периоды пересекаются.
+    Дни за пределами матрицы считаются свободными.
+
+    Календарь, как и индекс доступности, видит только изменения из этого процесса,
+    поэтому служит для подсказок в интерфейсе; окончательная проверка брони - запросом к БД.
+    """
+
+    def __init__(self):
+        self.logger = get_logger('reports.calendar')
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._clear()
+
+    def _clear(self):
+        self.origin = date.today()
+        self._counts = np.zeros((0, 0), dtype=np.uint8)
+        self._room_ids = []
+        self._room_rows = {}
+        self._bookings = {}
+
+    # --- запросы ---
+
+    def free_rooms_per_day(self, start, end, room_ids=None):
+        """Число свободных комнат на каждую ночь периода [start, end)"""
+        with self._lock:
+            rows = self._rows(room_ids)
+            occupied = self._window(start, end, rows) > 0
+            return len(rows) - occupied.sum(axis=0)
+
+    def rooms_free_for(self, start, end, room_ids=None, exclude_booking_id=None):
+        """ID комнат, свободных на весь период [start, end); exclude_booking_id - не учитывать эту бронь"""
+        with self._lock:
+            rows = self._rows(room_ids)
+            busy = self._window(start, end, rows, exclude_booking_id).any(axis=1)
+            return [self._room_ids[row] for row in rows[~busy]]
+
+    def occupied_nights(self, start, end, room_ids=None):
+        """Словарь id комнаты -> число занятых ночей в периоде [start, end)"""
+        with self._lock:
+            rows = self._rows(room_ids)
+            nights = (self._window(start, end, rows) > 0).sum(axis=1)
+            return {self._room_ids[row]: int(count) for row, count in zip(rows, nights)}
+
+    def first_free_gap(self, room_id, nights, start, end=None, exclude_booking_id=None):
+        """Первая дата заезда не раньше start, с которой комната свободна nights ночей подряд.
+
+        Если задан end, выезд должен быть не позже end; None - подходящего окна нет.
+        """
+        found = self.earliest_free_gap(nights, start, end, [room_id], exclude_booking_id)
+        return found[0] if found else None
+
+    def earliest_free_gap(self, nights, start, end=None, room_ids=None, exclude_booking_id=None):
+        """Самый ранний заезд не раньше start на nights ночей среди комнат: (дата, id комнаты) или None"""
+        if nights <= 0:
+            raise ValueError("Число ночей должно быть положительным")
+        with self._lock:
+            rows = self._rows(room_ids)
+            if end is None:
+                # Дальше последнего бронирования комнаты заведомо свободны
+                end = max(start, self.origin + timedelta(days=self._counts.shape[1])) + timedelta(days=nights)
+            occupied = (self._window(start, end, rows, exclude_booking_id) > 0).astype(np.int32)
+            room_ids = [self._room_ids[row] for row in rows]
+
+        if not room_ids or occupied.shape[1] < nights:
+            return None
+        # Скользящая сумма занятых ночей по окну длиной nights - сразу для всех комнат
+        cumulative = np.concatenate((np.zeros((len(room_ids), 1), dtype=np.int32), np.cumsum(occupied, axis=1)),
+                                    axis=1)
+        free = cumulative[:, nights:] - cumulative[:, :-nights] == 0
+        has_gap = free.any(axis=1)
+        if not has_gap.any():
+            return None
+        # Первое свободное окно каждой комнаты; у комнат без окна - за концом периода
+        first = np.where(has_gap, free.argmax(axis=1), free.shape[1])
+        best = int(first.argmin())
+        return start + timedelta(days=int(first[best])), room_ids[best]
+
+    # --- изменения ---
+
+    def apply(self, booking_id, row):
+        """Учесть изменение бронирования: row - новое состояние строки или None при удалении"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(booking_id)
+            if row is not None and row['is_active']:
+                self._add(booking_id, row['room_id'], row['check_in_date'], row['check_out_date'])
+
+    def reset(self):
+        """Сбросить календарь; он будет перестроен из БД при следующем обращении"""
+        with self._lock:
+            self._loaded = False
+            self._clear()
+
+    def load(self):
+        """Построить календарь заранее (из фонового потока), чтобы подсказки не ждали БД"""
+        with self._lock:
+            self._ensure_loaded()
+
+    def reload(self):
+        """Перестроить календарь из БД сразу (с учетом изменений с других рабочих мест)"""
+        with self._lock:
+            self._loaded = False
+            self._ensure_loaded()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def nbytes(self):
+        return self._counts.nbytes
+
+    # --- внутреннее ---
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        db = Database()
+        room_ids = [row['id'] for row in db.fetch_all("SELECT id FROM rooms ORDER BY id")]
+        bounds = db.fetch_one("SELECT MIN(check_in_date) AS first_day, MAX(check_out_date) AS last_day "
+                              "FROM bookings WHERE is_active = TRUE")
+        first_day, last_day = Booking._parse_dates(bounds['first_day'], bounds['last_day'])
+
+        self._clear()
+        if first_day is not None:
+            self.origin = first_day
+        days = (last_day - first_day).days if first_day is not None else 0
+        self._counts = np.zeros((len(room_ids), days), dtype=np.uint8)
+        self._room_ids = list(room_ids)
+        self._room_rows = {room_id: row for row, room_id in enumerate(room_ids)}
+
+        query = "SELECT id, room_id, check_in_date, check_out_date FROM bookings WHERE is_active = TRUE"
+        for row in db.fetch_iter(query):
+            self._add(row['id'], row['room_id'], row['check_in_date'], row['check_out_date'])
+        self._loaded = True
+        self.logger.info(f"Календарь занятости построен: {self._counts.shape[0]} комнат x "
+                         f"{self._counts.shape[1]} дней, {self._counts.nbytes} байт")
+
+    def _rows(self, room_ids):
+        self._ensure_loaded()
+        if room_ids is None:
+            return np.arange(len(self._room_ids))
+        return np.array([self._row_for(room_id) for room_id in room_ids], dtype=np.intp)
+
+    def _row_for(self, room_id):
+        room_id = int(room_id)
+        row = self._room_rows.get(room_id)
+        if row is None:
+            row = len(self._room_ids)
+            self._room_ids.append(room_id)
+            self._room_rows[room_id] = row
+            self._counts = np.vstack([self._counts, np.zeros((1, self._counts.shape[1]), dtype=np.uint8)])
+        return row
+
+    def _window(self, start, end, rows, exclude_booking_id=None):
+        """Строки rows матрицы для ночей [start, end); дни вне матрицы дополняются нулями"""
+        days = (end - start).days
+        if days <= 0:
+            raise ValueError("Конец периода должен быть позже начала")
+        offset = (start - self.origin).days
+        window = np.zeros((len(rows), days), dtype=np.uint8)
+        lo, hi = max(offset, 0), min(offset + days, self._counts.shape[1])
+        if lo < hi:
+            window[:, lo - offset:hi - offset] = self._counts[rows, lo:hi]
+
+        excluded = self._bookings.get(exclude_booking_id)
+        if excluded is not None:
+            # Ночи редактируемой брони не мешают ее переносу
+            row, booking_start, booking_end = excluded
+            lo = max((booking_start - start).days, 0)
+            hi = min((booking_end - start).days, days)
+            for index in np.flatnonzero(rows == row):
+                if lo < hi:
+                    window[index, lo:hi] -= 1
+        return window
+
+    def _add(self, booking_id, room_id, start, end):
+        start, end = Booking._parse_dates(start, end)
+        row = self._row_for(room_id)
+        self._extend(start, end)
+        offset = (start - self.origin).days
+        self._counts[row, offset:offset + (end - start).days] += 1
+        self._bookings[booking_id] = (row, start, end)
+
+    def _remove(self, booking_id):
+        booking = self._bookings.pop(booking_id, None)
+        if booking is not None:
+            row, start, end = booking
+            offset = (start - self.origin).days
+            self._counts[row, offset:offset + (end - start).days] -= 1
+
+    def _extend(self, start, end):
+        """Расширить матрицу, чтобы она покрывала ночи [start, end)"""
+        rooms, days = self._counts.shape
+        before = max((self.origin - start).days, 0)
+        after = max((end - self.origin).days - days, 0)
+        if before or after:
+            self._counts = np.pad(self._counts, ((0, 0), (before, after)))
+            self.origin -= timedelta(days=before)
+
+
+occupancy_calendar = OccupancyCalendar()
+Booking.subscribe(occupancy_calendar.apply)
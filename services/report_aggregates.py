@@ -0,0 +1,286 @@
+import threading
+from collections import Counter, OrderedDict, deque
+from datetime import date
+
+import numpy as np
+
+from database import Database
+from log_config import get_logger
+from models import Booking, Guest, HotelRoom
+
+# Для скольких периодов отчетов хранить частичные агрегаты (остальные вытесняются, LRU)
+MAX_PERIODS = 8
+
+
+def _full_name(row):
+    # В том же виде, что и Person.full_name()
+    if row['patronymic']:
+        return f"{row['surname']} {row['name']} {row['patronymic']}"
+    return f"{row['surname']} {row['name']}"
+
+
+def _add(counter, key, value):
+    counter[key] += value
+    if not counter[key]:
+        del counter[key]
+
+
+class _Period:
+    """Частичные агрегаты одного периода [start, end]: дни пересечения бронирований с периодом (включительно).
+
+    По номерам - дни и число активных бронирований, по гостям - дни всех бронирований
+    с разбивкой по номерам (расходы считаются при чтении по текущим ценам).
+    """
+
+    def __init__(self, start, end):
+        self.lo = start.toordinal()
+        self.hi = end.toordinal()
+        self.room_days = Counter()
+        self.room_bookings = Counter()
+        self.guest_days = {}
+
+    def fill(self, states):
+        """Начальные агрегаты по всем бронированиям сразу (states - массив строк состояний)"""
+        guest_ids, room_ids, active = states[:, 0], states[:, 1], states[:, 4].astype(bool)
+        days = np.clip(np.minimum(states[:, 3], self.hi) - np.maximum(states[:, 2], self.lo) + 1, 0, None)
+        counted = days > 0
+
+        rooms, inverse = np.unique(room_ids[counted & active], return_inverse=True)
+        self.room_days = Counter(dict(zip(rooms.tolist(),
+                                          np.bincount(inverse, weights=days[counted & active]).astype(int).tolist())))
+        self.room_bookings = Counter(dict(zip(rooms.tolist(), np.bincount(inverse).tolist())))
+
+        pairs, inverse = np.unique(np.stack([guest_ids[counted], room_ids[counted]], axis=1),
+                                   axis=0, return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=days[counted]).astype(int).tolist()
+        for (guest_id, room_id), total in zip(pairs.tolist(), totals):
+            self.guest_days.setdefault(guest_id, Counter())[room_id] = total
+
+    def account(self, state, sign):
+        """Добавить (sign=1) или убрать (sign=-1) дни одного бронирования"""
+        guest_id, room_id, check_in, check_out, active = state
+        days = min(check_out, self.hi) - max(check_in, self.lo) + 1
+        if days <= 0:
+            return
+        if active:
+            _add(self.room_days, room_id, sign * days)
+            _add(self.room_bookings, room_id, sign)
+        per_room = self.guest_days.setdefault(guest_id, Counter())
+        _add(per_room, room_id, sign * days)
+        if not per_room:
+            del self.guest_days[guest_id]
+
+
+class ReportAggregates:
+    """Отчеты по занятости, финансам и гостям из частичных агрегатов в памяти.
+
+    Состояние каждого бронирования хранится по id; при изменении бронирования
+    его прежний вклад вычитается из агрегатов всех отслеживаемых периодов,
+    а новый - добавляется, поэтому отчет после правки одного бронирования
+    не требует пересчета истории. Дни и выручка - как в остальных режимах
+    REPORT_MODE; цены номеров применяются при чтении отчета, поэтому изменения
+    номеров (в том числе is_free) агрегаты не перестраивают.
+
+    Уведомления об изменениях только ставятся в очередь и не ждут построения
+    агрегатов в другом потоке; очередь разбирается перед каждым отчетом.
+    """
+
+    def __init__(self, max_periods=MAX_PERIODS):
+        self.logger = get_logger('reports.aggregates')
+        self.max_periods = max_periods
+        self._lock = threading.RLock()
+        self._loaded = False
+        # Изменения принимаются с начала загрузки из БД: (метод, id, row)
+        self._tracking = False
+        self._pending = deque()
+        self._clear()
+
+    def _clear(self):
+        self._rooms = {}
+        self._guests = {}
+        self._bookings = {}
+        self._guest_check_ins = {}
+        self._periods = OrderedDict()
+
+    # --- отчеты ---
+
+    def occupancy(self, start, end):
+        """Занятость номеров за период с start по end включительно: список строк
+        (number, type, total_days, occupied_days, occupancy_rate, revenue)"""
+        total_days = (end - start).days + 1
+        with self._lock:
+            period = self._period(start, end)
+            report = []
+            for room_id, (number, room_type, price) in sorted(self._rooms.items()):
+                occupied = period.room_days.get(room_id, 0)
+                report.append((number, room_type, total_days, occupied,
+                               occupied / total_days * 100 if total_days > 0 else 0.0, occupied * price))
+            return report
+
+    def financial(self, start, end):
+        """Итоги за период: выручка, средняя загрузка %, число бронирований
+        (активные бронирования существующих номеров с днями в периоде)"""
+        total_days = (end - start).days + 1
+        with self._lock:
+            period = self._period(start, end)
+            occupied_days = revenue = bookings = 0
+            for room_id, days in period.room_days.items():
+                room = self._rooms.get(room_id)
+                if room is not None:
+                    occupied_days += days
+                    revenue += days * room[2]
+                    bookings += period.room_bookings[room_id]
+            possible_days = len(self._rooms) * total_days
+            return {
+                'room_revenue': float(revenue),
+                'avg_occupancy': occupied_days / possible_days * 100 if possible_days > 0 else 0.0,
+                'total_bookings': bookings,
+            }
+
+    def guest_stats(self, start, end):
+        """Статистика гостей, у которых есть бронирования (в порядке id гостя): список строк
+        (full_name, phone_num, total_bookings, total_nights, last_booking, total_spent)"""
+        with self._lock:
+            period = self._period(start, end)
+            report = []
+            for guest_id in sorted(self._guest_check_ins):
+                guest = self._guests.get(guest_id)
+                if guest is None:
+                    continue
+                check_ins = self._guest_check_ins[guest_id]
+                per_room = period.guest_days.get(guest_id, {})
+                spent = sum(days * self._rooms[room_id][2] for room_id, days in per_room.items()
+                            if room_id in self._rooms)
+                report.append((guest[0], guest[1], sum(check_ins.values()), sum(per_room.values()),
+                               date.fromordinal(max(check_ins)), float(spent)))
+            return report
+
+    # --- изменения ---
+
+    def apply(self, booking_id, row):
+        """Учесть изменение бронирования: row - новое состояние строки или None при удалении"""
+        self._enqueue(self._apply_booking, booking_id, row)
+
+    def apply_guest(self, guest_id, row):
+        """Учесть изменение гостя: row - новое состояние строки или None при удалении"""
+        self._enqueue(self._apply_guest, guest_id, row)
+
+    def apply_room(self, room_id, row):
+        """Учесть изменение номера: row - новое состояние строки или None при удалении"""
+        self._enqueue(self._apply_room, room_id, row)
+
+    def reset(self):
+        """Сбросить агрегаты; они будут построены из БД при следующем отчете"""
+        with self._lock:
+            self._loaded = False
+            self._tracking = False
+            self._pending.clear()
+            self._clear()
+
+    # --- внутреннее ---
+
+    def _enqueue(self, method, id, row):
+        if not self._tracking:
+            # Агрегаты еще не строились: состояние будет прочитано из БД
+            return
+        self._pending.append((method, id, row))
+        # Если агрегаты сейчас строит другой поток, изменения применит он
+        if self._lock.acquire(blocking=False):
+            try:
+                self._drain()
+            finally:
+                self._lock.release()
+
+    def _drain(self):
+        while self._pending:
+            method, id, row = self._pending.popleft()
+            if self._loaded:
+                method(id, row)
+
+    def _apply_booking(self, booking_id, row):
+        old = self._bookings.pop(booking_id, None)
+        if old is not None:
+            self._account(old, -1)
+        if row is not None:
+            state = self._state(row)
+            self._bookings[booking_id] = state
+            self._account(state, 1)
+
+    def _apply_guest(self, guest_id, row):
+        if row is None:
+            self._guests.pop(guest_id, None)
+        else:
+            self._guests[guest_id] = (_full_name(row), row['phone_num'])
+
+    def _apply_room(self, room_id, row):
+        if row is None:
+            self._rooms.pop(room_id, None)
+        else:
+            self._rooms[room_id] = (row['room_id'], row['type'], float(row['price']))
+
+    def _ensure_loaded(self):
+        self._drain()
+        # Изменения, пришедшие во время загрузки, применяются сразу после нее
+        while not self._loaded:
+            self._load()
+            self._drain()
+
+    def _load(self):
+        db = Database()
+        self._clear()
+        self._tracking = True
+        for room in db.fetch_all("SELECT id, room_id, type, price FROM rooms"):
+            self._apply_room(room['id'], room)
+
+        for guest in db.fetch_iter("SELECT id, surname, name, patronymic, phone_num FROM guests"):
+            self._apply_guest(guest['id'], guest)
+
+        query = "SELECT id, guest_id, room_id, check_in_date, check_out_date, is_active FROM bookings"
+        for row in db.fetch_iter(query, batch_size=5000):
+            state = self._state(row)
+            self._bookings[row['id']] = state
+            self._count_check_in(state, 1)
+        self._loaded = True
+        self.logger.info(f"Агрегаты отчетов построены: {len(self._bookings)} бронирований, "
+                         f"{len(self._rooms)} номеров")
+
+    def _period(self, start, end):
+        self._ensure_loaded()
+        key = (start, end)
+        period = self._periods.get(key)
+        if period is not None:
+            self._periods.move_to_end(key)
+            return period
+
+        period = _Period(start, end)
+        period.fill(np.array(list(self._bookings.values()), dtype=np.int64).reshape(-1, 5))
+
+        self._periods[key] = period
+        while len(self._periods) > self.max_periods:
+            self._periods.popitem(last=False)
+        return period
+
+    @staticmethod
+    def _state(row):
+        check_in, check_out = Booking._parse_dates(row['check_in_date'], row['check_out_date'])
+        return (int(row['guest_id']), int(row['room_id']), check_in.toordinal(), check_out.toordinal(),
+                int(bool(row['is_active'])))
+
+    def _account(self, state, sign):
+        self._count_check_in(state, sign)
+        for period in self._periods.values():
+            period.account(state, sign)
+
+    def _count_check_in(self, state, sign):
+        # Число бронирований и последний заезд гостя - по всем его бронированиям
+        guest_id, check_in = state[0], state[2]
+        check_ins = self._guest_check_ins.setdefault(guest_id, Counter())
+        _add(check_ins, check_in, sign)
+        if not check_ins:
+            del self._guest_check_ins[guest_id]
+
+
+report_aggregates = ReportAggregates()
+Booking.subscribe(report_aggregates.apply)
+Guest.subscribe(report_aggregates.apply_guest)
+HotelRoom.subscribe(report_aggregates.apply_room)
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+from config import REPORT_CACHE_SIZE
+from database import Database
+from log_config import get_logger
+
+# Таблицы, по которым строятся отчеты: запись в любую из них делает кэш устаревшим
+REPORT_TABLES = ('bookings', 'rooms', 'guests')
+
+
+class ReportCache:
+    """Ограниченный LRU-кэш готовых отчетов.
+
+    Ключ - (тип отчета, начало, конец, версия данных), где версия - счетчики записей
+    в bookings/rooms/guests (Database.data_version). После изменения данных ключ
+    меняется, и устаревшие отчеты просто вытесняются новыми.
+    """
+
+    def __init__(self, maxsize=REPORT_CACHE_SIZE):
+        self.logger = get_logger('reports.cache')
+        self.maxsize = maxsize
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, kind, start, end, build, refresh=False):
+        """Отчет из кэша или build() с сохранением результата.
+
+        refresh=True - построить заново, даже если отчет есть в кэше: версия данных
+        не меняется от изменений с других рабочих мест. Результат считается общим
+        для всех вызывающих: изменять его нельзя.
+        """
+        db = Database()
+        # Версия берется до расчета: изменения во время расчета дадут уже другой ключ
+        key = (kind, start, end, db.data_version(*REPORT_TABLES))
+        with self._lock:
+            if key in self._reports and not refresh:
+                self._reports.move_to_end(key)
+                self.hits += 1
+                return self._reports[key]
+            self.misses += 1
+
+        report = build()
+        # Незафиксированные данные транзакции могут быть откачены, их не кэшируем
+        if self.maxsize > 0 and not db.in_transaction():
+            with self._lock:
+                self._reports[key] = report
+                self._reports.move_to_end(key)
+                while len(self._reports) > self.maxsize:
+                    self._reports.popitem(last=False)
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._reports.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._reports),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+report_cache = ReportCache()
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+from database import Database
+from log_config import get_logger
+
+
+def _day_numbers(values):
+    """Даты (date или 'ГГГГ-ММ-ДД') -> номера дней от 1970-01-01"""
+    return np.array(values, dtype='datetime64[D]').astype(np.int64)
+
+
+def _day(value):
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+class ReportEngine:
+    """Расчет отчетов по занятости, финансам и гостям без привязки к интерфейсу.
+
+    Бронирования и номера читаются из БД один раз и хранятся колонками NumPy;
+    пересечение периодов бронирований с периодом отчета считается для всех
+    бронирований сразу (maximum/minimum/clip), суммы по номерам и гостям -
+    через groupby. Даты хранятся номерами дней (int64).
+
+    Во всех режимах REPORT_MODE отчеты считаются одинаково: дни пересечения
+    [заезд, выезд] с периодом включительно, цена - текущая цена номера;
+    занятость и финансы - по активным бронированиям, гости - по всем.
+    """
+
+    def __init__(self, bookings, rooms, guests=None):
+        self.bookings = bookings
+        self.rooms = rooms
+        self.guests = guests
+
+    @classmethod
+    def from_db(cls, with_guests=False):
+        """Прочитать бронирования, номера и (при with_guests) гостей из БД"""
+        db = Database()
+
+        columns = {'guest_id': [], 'room_id': [], 'check_in': [], 'check_out': [], 'is_active': []}
+        query = "SELECT guest_id, room_id, check_in_date, check_out_date, is_active FROM bookings"
+        for row in db.fetch_iter(query, batch_size=5000):
+            columns['guest_id'].append(row['guest_id'])
+            columns['room_id'].append(row['room_id'])
+            columns['check_in'].append(row['check_in_date'])
+            columns['check_out'].append(row['check_out_date'])
+            columns['is_active'].append(row['is_active'])
+        bookings = pd.DataFrame({
+            'guest_id': np.array(columns['guest_id'], dtype=np.int64),
+            'room_id': np.array(columns['room_id'], dtype=np.int64),
+            'check_in': _day_numbers(columns['check_in']),
+            'check_out': _day_numbers(columns['check_out']),
+            'is_active': np.array(columns['is_active'], dtype=bool),
+        })
+
+        rooms = pd.DataFrame(db.fetch_all("SELECT id, room_id AS number, type, price FROM rooms ORDER BY id"),
+                             columns=['id', 'number', 'type', 'price'])
+        rooms['price'] = rooms['price'].astype(float)
+
+        guests = None
+        if with_guests:
+            guests = pd.DataFrame(
+                db.fetch_all("SELECT id, surname, name, patronymic, phone_num FROM guests ORDER BY id"),
+                columns=['id', 'surname', 'name', 'patronymic', 'phone_num'])
+        get_logger('reports.engine').info(f"Данные для отчетов загружены: {len(bookings)} бронирований, "
+                                          f"{len(rooms)} номеров")
+        return cls(bookings, rooms, guests)
+
+    def _prices(self, room_ids):
+        """Цена ночи для каждого бронирования; NaN - номера нет в БД"""
+        return room_ids.map(self.rooms.set_index('id')['price']).to_numpy(dtype=float)
+
+    def occupancy(self, start, end):
+        """Занятость номеров за период с start по end включительно.
+
+        Считаются дни пересечения активных бронирований с периодом (включительно,
+        как и в остальных отчетах), выручка - по текущей цене номера.
+        Колонки: number, type, total_days, occupied_days, occupancy_rate, revenue.
+        """
+        total_days = (end - start).days + 1
+        lo, hi = _day(start), _day(end)
+
+        active = self.bookings[self.bookings['is_active']]
+        days = np.clip(np.minimum(active['check_out'].to_numpy(), hi)
+                       - np.maximum(active['check_in'].to_numpy(), lo) + 1, 0, None)
+        per_room = pd.Series(days).groupby(active['room_id'].to_numpy()).sum()
+
+        report = self.rooms[['number', 'type']].copy()
+        report['total_days'] = total_days
+        report['occupied_days'] = self.rooms['id'].map(per_room).fillna(0).astype(np.int64)
+        report['occupancy_rate'] = report['occupied_days'] / total_days * 100 if total_days > 0 else 0.0
+        report['revenue'] = report['occupied_days'] * self.rooms['price']
+        return report.reset_index(drop=True)
+
+    def financial(self, start, end):
+        """Итоги за период: выручка, средняя загрузка %, число бронирований.
+
+        Учитываются активные бронирования существующих номеров; дни пересечения
+        считаются включительно.
+        """
+        total_days = (end - start).days + 1
+        lo, hi = _day(start), _day(end)
+
+        active = self.bookings[self.bookings['is_active']]
+        prices = self._prices(active['room_id'])
+        overlap = (np.minimum(active['check_out'].to_numpy(), hi)
+                   - np.maximum(active['check_in'].to_numpy(), lo) + 1)
+        counted = (overlap > 0) & ~np.isnan(prices)
+
+        occupied_days = int(overlap[counted].sum())
+        possible_days = len(self.rooms) * total_days
+        return {
+            'room_revenue': float((overlap[counted] * prices[counted]).sum()),
+            'avg_occupancy': occupied_days / possible_days * 100 if possible_days > 0 else 0.0,
+            'total_bookings': int(counted.sum()),
+        }
+
+    def guest_stats(self, start, end):
+        """Статистика гостей, у которых есть бронирования (в порядке id гостя).
+
+        total_bookings и last_booking - по всем бронированиям гостя,
+        total_nights и total_spent - по дням пересечения с периодом (включительно).
+        Колонки: full_name, phone_num, total_bookings, total_nights, last_booking, total_spent.
+        """
+        if self.guests is None:
+            raise ValueError("Данные гостей не загружены: используйте from_db(with_guests=True)")
+        lo, hi = _day(start), _day(end)
+
+        bookings = self.bookings
+        nights = np.clip(np.minimum(bookings['check_out'].to_numpy(), hi)
+                         - np.maximum(bookings['check_in'].to_numpy(), lo) + 1, 0, None)
+        prices = np.nan_to_num(self._prices(bookings['room_id']))
+
+        stats = pd.DataFrame({
+            'guest_id': bookings['guest_id'].to_numpy(),
+            'check_in': bookings['check_in'].to_numpy(),
+            'nights': nights,
+            'spent': nights * prices,
+        }).groupby('guest_id').agg(total_bookings=('check_in', 'size'),
+                                   last_booking=('check_in', 'max'),
+                                   total_nights=('nights', 'sum'),
+                                   total_spent=('spent', 'sum'))
+
+        guests = self.guests.merge(stats, left_on='id', right_index=True, how='inner').sort_values('id')
+        # ФИО в том же виде, что и Person.full_name(); строковые операции pandas здесь медленнее
+        full_name = [f"{surname} {name} {patronymic}" if patronymic else f"{surname} {name}"
+                     for surname, name, patronymic in zip(guests['surname'].tolist(), guests['name'].tolist(),
+                                                          guests['patronymic'].tolist())]
+
+        report = pd.DataFrame({
+            'full_name': full_name,
+            'phone_num': guests['phone_num'].to_numpy(),
+            'total_bookings': guests['total_bookings'].to_numpy(dtype=np.int64),
+            'total_nights': guests['total_nights'].to_numpy(dtype=np.int64),
+            'last_booking': guests['last_booking'].to_numpy().astype('datetime64[D]'),
+            'total_spent': guests['total_spent'].to_numpy(dtype=float),
+        })
+        return report
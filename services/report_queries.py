@@ -0,0 +1,197 @@
+from datetime import date
+
+from database import Database
+from log_config import get_logger
+
+# Дни пересечения бронирования с периодом без единицы: DATEDIFF(LEAST(выезд, конец), GREATEST(заезд, начало))
+_OVERLAP = "DATEDIFF(LEAST(b.check_out_date, %s), GREATEST(b.check_in_date, %s))"
+
+
+def _as_date(value):
+    # MAX() по колонке DATE в SQLite возвращает строку
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+class ReportQueries:
+    """Отчеты по занятости, финансам и гостям, посчитанные в БД.
+
+    Пересечение периодов, группировка по номерам/гостям и выручка считаются
+    одним запросом на отчет; строки результата - те же, что у ReportEngine.
+    Для SQLite функции GREATEST/LEAST/DATEDIFF регистрирует SQLiteBackend.
+    """
+
+    @staticmethod
+    def occupancy(start, end):
+        """Занятость номеров за период с start по end включительно: список строк
+        (number, type, total_days, occupied_days, occupancy_rate, revenue)"""
+        total_days = (end - start).days + 1
+        # Дни пересечения активных бронирований с периодом, включительно
+        query = f"""
+            SELECT number, type, occupied_days, occupied_days * price AS revenue
+            FROM (
+                SELECT r.id, r.room_id AS number, r.type, r.price,
+                       COALESCE(SUM({_OVERLAP} + 1), 0) AS occupied_days
+                FROM rooms r
+                LEFT JOIN bookings b ON b.room_id = r.id AND b.is_active = TRUE
+                    AND b.check_in_date <= %s AND b.check_out_date >= %s
+                GROUP BY r.id, r.room_id, r.type, r.price
+            ) AS occupancy
+            ORDER BY id
+        """
+        rows = Database().fetch_all(query, (end, start, end, start))
+        get_logger('reports.queries').debug(f"Отчет по занятости: {len(rows)} строк")
+        return [(row['number'], row['type'], total_days, int(row['occupied_days']),
+                 int(row['occupied_days']) / total_days * 100 if total_days > 0 else 0.0,
+                 float(row['revenue']))
+                for row in rows]
+
+    @staticmethod
+    def financial(start, end):
+        """Итоги за период: выручка, средняя загрузка %, число бронирований
+        (активные бронирования существующих номеров, дни пересечения включительно)"""
+        total_days = (end - start).days + 1
+        query = f"""
+            SELECT COUNT(*) AS total_bookings,
+                   COALESCE(SUM({_OVERLAP} + 1), 0) AS occupied_days,
+                   COALESCE(SUM(({_OVERLAP} + 1) * r.price), 0) AS room_revenue,
+                   (SELECT COUNT(*) FROM rooms) AS room_count
+            FROM bookings b
+            JOIN rooms r ON r.id = b.room_id
+            WHERE b.is_active = TRUE AND b.check_in_date <= %s AND b.check_out_date >= %s
+        """
+        row = Database().fetch_one(query, (end, start, end, start, end, start))
+        possible_days = row['room_count'] * total_days
+        return {
+            'room_revenue': float(row['room_revenue']),
+            'avg_occupancy': int(row['occupied_days']) / possible_days * 100 if possible_days > 0 else 0.0,
+            'total_bookings': int(row['total_bookings']),
+        }
+
+    @staticmethod
+    def guest_stats(start, end):
+        """Статистика гостей, у которых есть бронирования (в порядке id гостя): список строк
+        (full_name, phone_num, total_bookings, total_nights, last_booking, total_spent)"""
+        # Дни считаются включительно, как в остальных отчетах; вне периода - 0
+        nights = f"GREATEST({_OVERLAP} + 1, 0)"
+        # Сначала агрегаты по guest_id, затем ФИО по первичному ключу гостя
+        query = f"""
+            SELECT g.surname, g.name, g.patronymic, g.phone_num,
+                   s.total_bookings, s.total_nights, s.last_booking, s.total_spent
+            FROM (
+                SELECT b.guest_id,
+                       COUNT(*) AS total_bookings,
+                       SUM({nights}) AS total_nights,
+                       MAX(b.check_in_date) AS last_booking,
+                       SUM({nights} * COALESCE(r.price, 0)) AS total_spent
+                FROM bookings b
+                LEFT JOIN rooms r ON r.id = b.room_id
+                GROUP BY b.guest_id
+            ) AS s
+            JOIN guests g ON g.id = s.guest_id
+            ORDER BY g.id
+        """
+        rows = Database().fetch_all(query, (end, start, end, start))
+        get_logger('reports.queries').debug(f"Отчет по гостям: {len(rows)} строк")
+        return [(f"{row['surname']} {row['name']} {row['patronymic']}" if row['patronymic']
+                 else f"{row['surname']} {row['name']}",
+                 row['phone_num'], int(row['total_bookings']), int(row['total_nights']),
+                 _as_date(row['last_booking']), float(row['total_spent']))
+                for row in rows]
+
+
+class FactReports:
+    """Те же отчеты по таблице фактов room_day_stats (дни бронирований).
+
+    Период отчета - диапазон по первичному ключу (day, ...), поэтому стоимость
+    запроса зависит от длины периода, а не от всей истории бронирований.
+    Дни и выручка - как в ReportQueries: дни пересечения включительно, текущая цена номера.
+    """
+
+    @staticmethod
+    def occupancy(start, end):
+        """Занятость номеров за период с start по end включительно: список строк
+        (number, type, total_days, occupied_days, occupancy_rate, revenue)"""
+        total_days = (end - start).days + 1
+        query = """
+            SELECT r.room_id AS number, r.type, r.price, COALESCE(s.occupied_days, 0) AS occupied_days
+            FROM rooms r
+            LEFT JOIN (
+                SELECT room_id, COUNT(*) AS occupied_days
+                FROM room_day_stats
+                WHERE day BETWEEN %s AND %s AND is_active = TRUE
+                GROUP BY room_id
+            ) AS s ON s.room_id = r.id
+            ORDER BY r.id
+        """
+        rows = Database().fetch_all(query, (start, end))
+        return [(row['number'], row['type'], total_days, int(row['occupied_days']),
+                 int(row['occupied_days']) / total_days * 100 if total_days > 0 else 0.0,
+                 int(row['occupied_days']) * float(row['price']))
+                for row in rows]
+
+    @staticmethod
+    def financial(start, end):
+        """Итоги за период: выручка, средняя загрузка %, число бронирований
+        (активные бронирования существующих номеров с днями в периоде)"""
+        total_days = (end - start).days + 1
+        # Дни сначала считаются по номерам, цена - одна на номер
+        query = """
+            SELECT COALESCE(SUM(s.occupied_days), 0) AS occupied_days,
+                   COALESCE(SUM(s.occupied_days * r.price), 0) AS room_revenue,
+                   COALESCE(SUM(s.bookings), 0) AS total_bookings,
+                   (SELECT COUNT(*) FROM rooms) AS room_count
+            FROM (
+                SELECT room_id, COUNT(*) AS occupied_days, COUNT(DISTINCT booking_id) AS bookings
+                FROM room_day_stats
+                WHERE day BETWEEN %s AND %s AND is_active = TRUE
+                GROUP BY room_id
+            ) AS s
+            JOIN rooms r ON r.id = s.room_id
+        """
+        row = Database().fetch_one(query, (start, end))
+        possible_days = row['room_count'] * total_days
+        return {
+            'room_revenue': float(row['room_revenue']),
+            'avg_occupancy': int(row['occupied_days']) / possible_days * 100 if possible_days > 0 else 0.0,
+            'total_bookings': int(row['total_bookings']),
+        }
+
+    @staticmethod
+    def guest_stats(start, end):
+        """Статистика гостей, у которых есть бронирования (в порядке id гостя): список строк
+        (full_name, phone_num, total_bookings, total_nights, last_booking, total_spent).
+
+        total_bookings и last_booking - по всем бронированиям (индекс idx_bookings_guest),
+        дни и расходы - по room_day_stats за период, включая завершенные и отмененные бронирования.
+        """
+        query = """
+            SELECT g.surname, g.name, g.patronymic, g.phone_num,
+                   b.total_bookings, COALESCE(s.total_nights, 0) AS total_nights,
+                   b.last_booking, COALESCE(s.total_spent, 0) AS total_spent
+            FROM (
+                SELECT guest_id, COUNT(*) AS total_bookings, MAX(check_in_date) AS last_booking
+                FROM bookings
+                GROUP BY guest_id
+            ) AS b
+            JOIN guests g ON g.id = b.guest_id
+            LEFT JOIN (
+                SELECT d.guest_id, SUM(d.days) AS total_nights, SUM(d.days * COALESCE(r.price, 0)) AS total_spent
+                FROM (
+                    SELECT guest_id, room_id, COUNT(*) AS days
+                    FROM room_day_stats
+                    WHERE day BETWEEN %s AND %s
+                    GROUP BY guest_id, room_id
+                ) AS d
+                LEFT JOIN rooms r ON r.id = d.room_id
+                GROUP BY d.guest_id
+            ) AS s ON s.guest_id = b.guest_id
+            ORDER BY g.id
+        """
+        rows = Database().fetch_all(query, (start, end))
+        return [(f"{row['surname']} {row['name']} {row['patronymic']}" if row['patronymic']
+                 else f"{row['surname']} {row['name']}",
+                 row['phone_num'], int(row['total_bookings']), int(row['total_nights']),
+                 _as_date(row['last_booking']), float(row['total_spent']))
+                for row in rows]
@@ -1,13 +1,24 @@
 import pytest
+import threading
+import time
 from datetime import date
-from database import Database
+from database import Database, ConnectionPool, MySQLBackend, SQLiteBackend, normalize_sql
 #from unittest.mock import Mock
-from exceptions import RoomNotFoundError, BookingError, InvalidDataError
+from exceptions import (RoomNotFoundError, BookingError, InvalidDataError, PoolTimeoutError, SchemaNotMigratedError,
+                        BookingConflictError)
 
 
 from models import Person, Employee, Guest
 from models import HotelRoom
 from models import Booking
+from models.cache import ModelCache, clear_caches
+from models.availability import RoomIntervals, availability_index
+from models.room_day_stats import room_day_stats
+from services.occupancy_calendar import OccupancyCalendar, occupancy_calendar
+from services.guest_search import guest_search
+from services.report_aggregates import report_aggregates
+from gui.virtual_treeview import ListSource, DataFrameSource, QuerySource
+from gui.task_executor import TaskExecutor
 
 
 def test_database_connection():
@@ -210,5 +221,1378 @@ class TestExceptions:
         with pytest.raises(InvalidDataError):
             Person("", "Doe", "123456789")
 
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.in_transaction = False
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool:
+
+    def test_same_connection_within_thread(self):
+        pool = ConnectionPool(FakeConnection, size=2)
+        with pool.checkout() as outer:
+            with pool.checkout() as inner:
+                assert inner is outer
+        assert pool.stats()['open'] == 1
+        assert pool.stats()['idle'] == 1
+
+    def test_pool_is_bounded(self):
+        pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+        conn = pool.acquire()
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+        pool.release(conn)
+        assert pool.acquire() is conn
+        assert pool.stats()['timeouts'] == 1
+
+    def test_idle_connections_are_reaped(self):
+        pool = ConnectionPool(FakeConnection, size=2, idle_timeout=0.01)
+        conn = pool.acquire()
+        pool.release(conn)
+        time.sleep(0.02)
+        assert pool.reap_idle() == 1
+        assert conn.closed
+        assert pool.stats()['open'] == 0
+
+
+@pytest.fixture
+def memory_db():
+    """Встроенная БД в памяти вместо сервера MySQL"""
+    db = Database()
+    db.use_backend(SQLiteBackend(':memory:'))
+    clear_caches()
+    availability_index.reset()
+    occupancy_calendar.reset()
+    guest_search.reset()
+    report_aggregates.reset()
+    yield db
+    db.use_backend(None)
+    clear_caches()
+    availability_index.reset()
+    occupancy_calendar.reset()
+    guest_search.reset()
+    report_aggregates.reset()
+
+
+@pytest.fixture
+def facts_mode(monkeypatch):
+    """Режим отчетов 'facts': бронирования ведут таблицу room_day_stats"""
+    monkeypatch.setattr(room_day_stats, 'enabled', True)
+
+
+# Тестовая гостиница: классы тестов переопределяют room_prices / hotel_rooms / hotel_guests /
+# hotel_bookings, если им нужен другой состав
+@pytest.fixture
+def room_prices():
+    return (100.0, 200.0, 300.0)
+
+
+@pytest.fixture
+def hotel_rooms(room_prices):
+    return [HotelRoom(str(101 + i), price, "Standard", 2) for i, price in enumerate(room_prices)]
+
+
+@pytest.fixture
+def hotel_guests():
+    return [Guest("Alice", "Smith", "987654321", "AB123456"), Guest("Bob", "Jones", "123456789", "CD654321")]
+
+
+@pytest.fixture
+def hotel_bookings():
+    return [Booking(1, 1, date(2026, 1, 10), date(2026, 1, 15)),
+            Booking(2, 2, date(2026, 1, 12), date(2026, 1, 14)),
+            Booking(1, 3, date(2026, 1, 1), date(2026, 1, 30), is_active=False)]
+
+
+@pytest.fixture
+def hotel(memory_db, hotel_rooms, hotel_guests, hotel_bookings):
+    """Номера, гости и бронирования тестовой гостиницы в БД в памяти"""
+    HotelRoom.save_many(hotel_rooms)
+    Guest.save_many(hotel_guests)
+    Booking.save_many(hotel_bookings)
+    return memory_db
+
+
+class TestSQLiteBackend:
+
+    def test_placeholders_translated(self):
+        backend = SQLiteBackend(':memory:')
+        assert backend.translate("SELECT * FROM rooms WHERE id=%s AND type LIKE '%%x'") == \
+            "SELECT * FROM rooms WHERE id=? AND type LIKE '%x'"
+
+    def test_schema_created(self, memory_db):
+        assert memory_db.fetch_one("SELECT NOW()")['NOW()']
+        assert memory_db.fetch_all("SELECT * FROM employees") == []
+
+    def test_models_roundtrip(self, memory_db):
+        HotelRoom("101", 100.0, "Standard", 2).save()
+        Guest("Alice", "Smith", "987654321", "AB123456").save()
+        Booking(1, 1, date(2026, 1, 1), date(2026, 1, 5)).save()
+
+        room = HotelRoom.get_by_room_id("101")
+        assert room.get_price() == 100.0
+        assert room.is_free()
+
+        booking = Booking.get_by_id(1)
+        assert booking.get_check_in_date() == date(2026, 1, 1)
+        assert Guest.get_by_id(1).full_name() == "Smith Alice"
+
+    def test_fetch_iter_streams_in_batches(self, memory_db):
+        for number in range(101, 111):
+            HotelRoom(str(number), 100.0, "Standard", 2).save()
+
+        rows = memory_db.fetch_iter("SELECT * FROM rooms ORDER BY id", batch_size=3)
+        assert next(rows)['room_id'] == "101"
+        assert [room.get_number() for room in HotelRoom.iter_all(batch_size=4)][-1] == "110"
+        assert len(list(rows)) == 9
+
+    def test_fetch_iter_in_memory_does_not_hold_connection(self, memory_db):
+        for number in range(101, 106):
+            HotelRoom(str(number), 100.0, "Standard", 2).save()
+        rows = memory_db.fetch_iter("SELECT * FROM rooms ORDER BY id", batch_size=2)
+        assert next(rows)['room_id'] == "101"
+        # Единственное соединение свободно: другой поток не ждет недочитанный генератор
+        counts = []
+        worker = threading.Thread(target=lambda: counts.append(len(HotelRoom.get_all())))
+        worker.start()
+        worker.join(5)
+        assert counts == [5]
+        del rows
+
+    def test_fetch_iter_streams_on_own_connection(self, tmp_path):
+        db = Database()
+        db.use_backend(SQLiteBackend(str(tmp_path / "hotel.db")))
+        clear_caches()
+        try:
+            for number in range(101, 106):
+                HotelRoom(str(number), 100.0, "Standard", 2).save()
+            pool = db.connect()
+            with db.transaction():
+                rows = db.fetch_iter("SELECT * FROM rooms ORDER BY id", batch_size=2)
+                assert next(rows)['room_id'] == "101"
+                assert pool.stats()['open'] == 2
+            # Брошенный генератор не сбивает соединение потока и возвращает свое соединение
+            rows.close()
+            assert getattr(pool._local, 'depth', 0) == 0
+            assert pool.stats()['open'] == 1
+            assert len(HotelRoom.get_all()) == 5
+        finally:
+            db.use_backend(None)
+            clear_caches()
+
+
+class TestBackupExport:
+
+    def test_backup_streams_all_tables(self, hotel, tmp_path, monkeypatch):
+        from openpyxl import load_workbook
+        from services import export_service
+        from services.export_service import ExportService
+        path = tmp_path / "backup.xlsx"
+        monkeypatch.setattr(export_service.filedialog, 'asksaveasfilename', lambda **kwargs: str(path))
+        monkeypatch.setattr(export_service, 'BACKUP_WIDTH_SAMPLE', 2)
+
+        success, message = ExportService.extract_excel_all_threaded()
+        assert success, message
+        workbook = load_workbook(path, read_only=True)
+        # Сотрудников нет - пустой лист не создается
+        assert workbook.sheetnames == ['Номера', 'Бронирования', 'Гости']
+        rooms = list(workbook['Номера'].values)
+        assert rooms[0] == ('ID', 'Номер', 'Тип', 'Цена', 'Статус', 'Вместимость')
+        assert len(rooms) == len(HotelRoom.get_all()) + 1
+        assert len(list(workbook['Бронирования'].values)) == Booking.count() + 1
+        assert [row[1] for row in workbook['Гости'].values][1:] == [guest.get_surname() for guest in Guest.iter_all()]
+        workbook.close()
+
+
+class TestMySQLSchema:
+
+    @staticmethod
+    def fake_connection(tables, indexes):
+        executed = []
+
+        class FakeCursor:
+            def execute(self, query, params=()):
+                executed.append(query)
+                self.rows = [(name,) for name in (tables if "information_schema.tables" in query else indexes)]
+
+            def fetchall(self):
+                return self.rows
+
+            def close(self):
+                pass
+
+        conn = FakeConnection()
+        conn.cursor = FakeCursor
+        conn.commit = lambda: None
+        return conn, executed
+
+    def test_connect_check_does_not_change_schema(self):
+        conn, executed = self.fake_connection([], [])
+        MySQLBackend()._check_schema(conn)
+        assert all(query.startswith("SELECT") for query in executed)
+        assert not conn.closed
+
+    def test_missing_required_table_fails_connect(self, monkeypatch):
+        import database
+        monkeypatch.setattr(database, 'REPORT_MODE', 'facts')
+        backend = MySQLBackend()
+        conn, executed = self.fake_connection([], [])
+        with pytest.raises(SchemaNotMigratedError, match="python -m database migrate"):
+            backend._check_schema(conn)
+        assert conn.closed
+        # Проверка повторяется при следующем подключении, пока таблицу не создадут
+        with pytest.raises(SchemaNotMigratedError):
+            backend._check_schema(self.fake_connection([], [])[0])
+        backend._check_schema(self.fake_connection(['room_day_stats'], [])[0])
+
+    def test_migrate_creates_missing(self, monkeypatch):
+        import database
+        from database import INDEXES
+        conn, executed = self.fake_connection(['room_day_stats'], [name for name in INDEXES if name != 'idx_bookings_guest'])
+        monkeypatch.setattr(database.mysql.connector, 'connect', lambda **params: conn)
+        assert MySQLBackend().migrate() == ['idx_bookings_guest']
+        assert executed[-1] == "CREATE INDEX idx_bookings_guest ON bookings (guest_id, check_in_date)"
+        assert conn.closed
+
+
+class TestBulkOperations:
+
+    def test_save_assigns_id(self, memory_db):
+        guest = Guest("Alice", "Smith", "987654321", "AB123456")
+        guest.save()
+        assert guest.id == 1
+
+    def test_save_many_assigns_ids(self, memory_db):
+        rooms = HotelRoom.save_many(HotelRoom(str(100 + i), 100.0, "Standard", 2) for i in range(1, 6))
+        assert [room.id for room in rooms] == [1, 2, 3, 4, 5]
+        assert HotelRoom.get_by_id(rooms[2].id).get_number() == "103"
+
+    def test_update_many(self, memory_db):
+        rooms = HotelRoom.save_many([HotelRoom("101", 100.0, "Standard", 2),
+                                     HotelRoom("102", 100.0, "Standard", 2)])
+        for room in rooms:
+            room.set_price(150.0)
+        HotelRoom.update_many(rooms)
+        assert [room.get_price() for room in HotelRoom.get_all()] == [150.0, 150.0]
+
+    def test_update_many_requires_ids(self, memory_db):
+        with pytest.raises(ValueError):
+            HotelRoom.update_many([HotelRoom("101", 100.0, "Standard", 2)])
+
+    @pytest.mark.parametrize("increment,expected_ids", [(1, [10, 11, 12]), (2, [10, 12, 14])])
+    def test_mysql_insert_many_ids(self, increment, expected_ids):
+        class FakeCursor:
+            lastrowid = None
+
+            def execute(self, query, params=()):
+                if query == "SELECT @@auto_increment_increment":
+                    return
+                self.lastrowid = 10 if self.lastrowid is None else self.lastrowid + increment
+
+            def executemany(self, query, params_seq):
+                self.lastrowid = 10
+
+            def fetchone(self):
+                return (increment,)
+
+            def close(self):
+                pass
+
+        conn = FakeConnection()
+        cursor = FakeCursor()
+        conn.cursor = lambda: cursor
+        backend = MySQLBackend()
+        backend._consecutive_ids[conn] = backend._has_consecutive_ids(conn)
+        assert backend.insert_many(conn, cursor, "INSERT INTO rooms ...", [(), (), ()]) == expected_ids
+
+
+class TestTransactions:
+
+    def test_commit_once_for_all_writes(self, memory_db):
+        with memory_db.transaction():
+            room = HotelRoom("101", 100.0, "Standard", 2)
+            room.save()
+            room.set_free(False)
+            room.update()
+            Booking(1, room.id, date(2026, 1, 1), date(2026, 1, 5)).save()
+
+        assert not HotelRoom.get_by_id(1).is_free()
+        assert len(Booking.get_all()) == 1
+
+    def test_rollback_on_error(self, memory_db):
+        with pytest.raises(RuntimeError):
+            with memory_db.transaction():
+                HotelRoom("101", 100.0, "Standard", 2).save()
+                with memory_db.transaction():
+                    Booking(1, 1, date(2026, 1, 1), date(2026, 1, 5)).save()
+                raise RuntimeError("ошибка посреди операции")
+
+        assert HotelRoom.get_all() == []
+        assert Booking.get_all() == []
+        assert not memory_db.in_transaction()
+
+
+class TestQueryStats:
+
+    def test_normalize_sql(self):
+        assert normalize_sql("SELECT *  FROM rooms\n WHERE id IN (%s, %s) AND price > 10") == \
+            "SELECT * FROM rooms WHERE id IN (...) AND price > ?"
+
+    def test_queries_grouped_with_caller(self, memory_db):
+        memory_db.query_stats.reset()
+        HotelRoom.save_many([HotelRoom("101", 100.0, "Standard", 2),
+                             HotelRoom("102", 100.0, "Standard", 2)])
+        HotelRoom.get_by_id(1)
+        HotelRoom.get_by_id(2)
+
+        stats = {item['sql']: item for item in memory_db.query_stats.summary()}
+        lookup = stats["SELECT * FROM rooms WHERE id=?"]
+        assert lookup['count'] == 2
+        assert lookup['rows'] == 2
+        assert lookup['callers'] == {'HotelRoom.get_by_id': 2}
+        assert "HotelRoom.save_many" in memory_db.dump_query_stats()
+
+
+class TestModelCache:
+
+    def test_lru_eviction(self):
+        cache = ModelCache('test', maxsize=2)
+        cache.put(1, {'id': 1})
+        cache.put(2, {'id': 2})
+        assert cache.get("1") == {'id': 1}
+        cache.put(3, {'id': 3})
+        assert cache.get(2) is None
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['size'] == 2
+
+    def test_repeated_lookups_skip_database(self, memory_db):
+        room = HotelRoom("101", 100.0, "Standard", 2)
+        room.save()
+        memory_db.query_stats.reset()
+
+        for _ in range(5):
+            assert HotelRoom.get_by_id(str(room.id)).get_number() == "101"
+        assert sum(item['count'] for item in memory_db.query_stats.summary()) == 1
+
+    def test_update_invalidates(self, memory_db):
+        room = HotelRoom("101", 100.0, "Standard", 2)
+        room.save()
+        HotelRoom.get_by_id(room.id)
+        room.set_price(250.0)
+        room.update()
+        assert HotelRoom.get_by_id(room.id).get_price() == 250.0
+
+        room.delete()
+        assert HotelRoom.get_by_id(room.id) is None
+
+    def test_row_cached_during_transaction_is_dropped_after_commit(self, memory_db):
+        room = HotelRoom("101", 100.0, "Standard", 2)
+        room.save()
+        with memory_db.transaction():
+            room.set_price(250.0)
+            room.update()
+            # Другой поток прочитал строку до фиксации и закэшировал ее
+            stale = {'id': room.id, 'room_id': "101", 'price': 100.0, 'type': "Standard",
+                     'capacity': 2, 'is_free': True}
+            reader = threading.Thread(target=HotelRoom._cache.put, args=(room.id, stale))
+            reader.start()
+            reader.join()
+        assert HotelRoom.get_by_id(room.id).get_price() == 250.0
+
+
+class TestBatchLookups:
+
+    def test_get_by_ids_returns_dict(self, memory_db):
+        HotelRoom.save_many(HotelRoom(str(100 + i), 100.0, "Standard", 2) for i in range(1, 6))
+        rooms = HotelRoom.get_by_ids(["2", 4, 4, 99])
+        assert sorted(rooms) == [2, 4]
+        assert rooms[4].get_number() == "104"
+
+    def test_get_by_ids_uses_cache_and_one_query(self, memory_db):
+        guests = Guest.save_many(Guest("Alice", "Smith", str(10000 + i), f"AB{i:06}") for i in range(10))
+        Guest.get_by_id(guests[0].id)
+        memory_db.query_stats.reset()
+
+        found = Guest.get_by_ids(guest.id for guest in guests)
+        assert len(found) == 10
+        assert sum(item['count'] for item in memory_db.query_stats.summary()) == 1
+
+
+class TestBookingDetails:
+
+    def test_list_with_details_joins_guest_and_room(self, memory_db):
+        HotelRoom.save_many([HotelRoom("101", 100.0, "Standard", 2), HotelRoom("102", 150.0, "Deluxe", 2)])
+        Guest.save_many([Guest("Alice", "Smith", "987654321", "AB123456", "Marie"),
+                         Guest("Bob", "Johnson", "555555555", "CD654321")])
+        Booking.save_many([Booking(1, 2, date(2026, 1, 1), date(2026, 1, 5)),
+                           Booking(2, 1, date(2026, 2, 1), date(2026, 2, 3), is_active=False),
+                           Booking(2, 7, date(2026, 3, 1), date(2026, 3, 3))])
+        memory_db.query_stats.reset()
+
+        rows = Booking.list_with_details()
+        assert [row['guest_name'] for row in rows] == ["Smith Alice Marie", "Johnson Bob", "Johnson Bob"]
+        assert [row['room_number'] for row in rows] == ["102", "101", None]
+        assert rows[1]['status'] == "Отменено"
+        assert sum(item['count'] for item in memory_db.query_stats.summary()) == 1
+
+    def test_list_with_details_filters_and_paging(self, memory_db):
+        HotelRoom("101", 100.0, "Standard", 2).save()
+        Guest("Alice", "Smith", "987654321", "AB123456").save()
+        Booking.save_many(Booking(1, 1, date(2026, 1, day), date(2026, 1, day + 1)) for day in range(1, 11))
+
+        rows = Booking.list_with_details({'date_from': date(2026, 1, 5)}, order='-check_in', limit=3, offset=1)
+        assert [row['check_in_date'].day for row in rows] == [9, 8, 7]
+        with pytest.raises(ValueError):
+            Booking.list_with_details(order='price; DROP TABLE bookings')
+
+
+class TestRoomAvailability:
+
+    @pytest.fixture
+    def booked_room(self, memory_db):
+        HotelRoom.save_many([HotelRoom("101", 100.0, "Standard", 2), HotelRoom("102", 100.0, "Standard", 2)])
+        Guest("Alice", "Smith", "987654321", "AB123456").save()
+        return Booking.save_many([Booking(1, 1, date(2026, 1, 10), date(2026, 1, 15)),
+                                  Booking(1, 1, date(2026, 1, 1), date(2026, 1, 5), is_active=False)])
+
+    @pytest.mark.parametrize("check_in,check_out,available", [
+        (date(2026, 1, 5), date(2026, 1, 10), True),    # вплотную до заезда
+        (date(2026, 1, 15), date(2026, 1, 20), True),   # заезд в день выезда
+        (date(2026, 1, 12), date(2026, 1, 13), False),  # внутри
+        (date(2026, 1, 8), date(2026, 1, 11), False),   # пересечение с началом
+        (date(2026, 1, 2), date(2026, 1, 4), True),     # отмененное бронирование
+    ])
+    def test_is_room_available(self, booked_room, check_in, check_out, available):
+        assert Booking.is_room_available(1, check_in, check_out) == available
+        assert Booking.is_room_available(2, check_in, check_out)
+
+    def test_conflicts_exclude_edited_booking(self, booked_room):
+        assert Booking.find_conflicts(1, "2026-01-09", "2026-01-11") == [booked_room[0].id]
+        assert Booking.find_conflicts(1, "2026-01-09", "2026-01-11", booked_room[0].id) == []
+        assert Booking.is_room_available(1, "2026-01-09", "2026-01-11", booked_room[0].id)
+
+
+class TestAvailabilityIndex:
+
+    def test_intervals_match_brute_force(self):
+        import random
+        rng = random.Random(7)
+        intervals = RoomIntervals()
+        periods = {}
+        for booking_id in range(1, 60):
+            start = rng.randint(0, 100)
+            periods[booking_id] = (start, start + rng.randint(1, 15))
+            intervals.add(booking_id, *periods[booking_id])
+        for booking_id in range(1, 60, 3):
+            intervals.remove(booking_id)
+            del periods[booking_id]
+
+        for _ in range(200):
+            start = rng.randint(0, 110)
+            end = start + rng.randint(1, 10)
+            expected = {i for i, (s, e) in periods.items() if s < end and e > start}
+            assert set(intervals.overlapping(start, end)) == expected
+            assert intervals.overlaps(start, end) == bool(expected)
+
+    @pytest.fixture
+    def rooms(self, memory_db):
+        HotelRoom.save_many([HotelRoom(str(100 + i), 100.0, "Standard", 2) for i in range(1, 4)])
+        Guest("Alice", "Smith", "987654321", "AB123456").save()
+        Booking(1, 1, date(2026, 1, 10), date(2026, 1, 15)).save()
+        return [1, 2, 3]
+
+    def test_index_follows_changes(self, rooms):
+        assert availability_index.free_rooms(rooms, date(2026, 1, 12), date(2026, 1, 14)) == [2, 3]
+
+        booking = Booking(1, 2, date(2026, 1, 12), date(2026, 1, 20))
+        booking.save()
+        assert availability_index.free_rooms(rooms, date(2026, 1, 12), date(2026, 1, 14)) == [3]
+
+        booking.set_is_active(False)
+        booking.update()
+        assert Booking.is_room_available(2, date(2026, 1, 12), date(2026, 1, 14))
+
+        Booking.get_by_id(1).delete()
+        assert availability_index.free_rooms(rooms, date(2026, 1, 12), date(2026, 1, 14)) == rooms
+
+    def test_rolled_back_booking_not_indexed(self, rooms):
+        with pytest.raises(RuntimeError):
+            with Database().transaction():
+                Booking(1, 3, date(2026, 2, 1), date(2026, 2, 5)).save()
+                raise RuntimeError("отмена")
+        assert Booking.is_room_available(3, date(2026, 2, 1), date(2026, 2, 5))
+
+    def test_reload_reads_external_changes(self, rooms):
+        assert not availability_index.is_free(1, date(2026, 1, 12), date(2026, 1, 14))
+        # Изменение с другого рабочего места: подписка о нем не узнает
+        Database().execute_query("UPDATE bookings SET is_active = FALSE WHERE id = %s", (1,))
+        assert not availability_index.is_free(1, date(2026, 1, 12), date(2026, 1, 14))
+        availability_index.reload()
+        assert availability_index.is_free(1, date(2026, 1, 12), date(2026, 1, 14))
+
+    def test_save_checks_conflicts_in_db(self, rooms):
+        # Бронь с другого рабочего места: индекс о ней не знает
+        availability_index.is_free(1, date(2026, 1, 1), date(2026, 1, 2))
+        Database().execute_query("INSERT INTO bookings (guest_id, room_id, check_in_date, check_out_date, is_active) "
+                                 "VALUES (%s, %s, %s, %s, TRUE)", (1, 2, date(2026, 3, 1), date(2026, 3, 5)))
+        assert Booking.is_room_available(2, date(2026, 3, 3), date(2026, 3, 6))
+        assert not Booking.is_room_available(2, date(2026, 3, 3), date(2026, 3, 6), use_index=False)
+        with pytest.raises(BookingConflictError):
+            Booking(1, 2, date(2026, 3, 3), date(2026, 3, 6)).save()
+
+        booking = Booking(1, 2, date(2026, 3, 5), date(2026, 3, 8))
+        booking.save()
+        booking.set_check_in_date(date(2026, 3, 4))
+        with pytest.raises(BookingConflictError):
+            booking.update()
+        # Отмененная бронь не проверяется
+        booking.set_is_active(False)
+        booking.update()
+
+    def test_index_matches_sql(self, rooms, monkeypatch):
+        import models.booking
+        Booking(1, 1, date(2026, 1, 20), date(2026, 1, 22)).save()
+        periods = [(date(2026, 1, d), date(2026, 1, d + n)) for d in range(5, 25) for n in (1, 3, 7)]
+        indexed = [Booking.find_conflicts(1, start, end) for start, end in periods]
+        monkeypatch.setattr(models.booking, 'AVAILABILITY_INDEX', False)
+        assert [Booking.find_conflicts(1, start, end) for start, end in periods] == indexed
+
+
+class TestFindAvailable:
+
+    @pytest.fixture
+    def hotel_rooms(self):
+        return [HotelRoom("101", 300.0, "Suite", 4), HotelRoom("102", 100.0, "Standard", 2),
+                HotelRoom("103", 150.0, "Standard", 3), HotelRoom("104", 200.0, "Deluxe", 2)]
+
+    @pytest.fixture
+    def hotel_bookings(self):
+        return [Booking(1, 2, date(2026, 3, 1), date(2026, 3, 5)),
+                Booking(1, 3, date(2026, 3, 1), date(2026, 3, 5), is_active=False)]
+
+    def test_sorted_by_price_without_booked(self, hotel):
+        rooms = HotelRoom.find_available(date(2026, 3, 3), date(2026, 3, 4))
+        assert [room.get_number() for room in rooms] == ["103", "104", "101"]
+
+    def test_adjacent_stay_is_free(self, hotel):
+        rooms = HotelRoom.find_available("2026-03-05", "2026-03-07")
+        assert [room.get_number() for room in rooms] == ["102", "103", "104", "101"]
+
+    def test_filters(self, hotel):
+        rooms = HotelRoom.find_available(date(2026, 3, 3), date(2026, 3, 4), min_capacity=3, max_price=250)
+        assert [room.get_number() for room in rooms] == ["103"]
+        rooms = HotelRoom.find_available(date(2026, 3, 6), date(2026, 3, 8), room_type="Standard")
+        assert [room.get_number() for room in rooms] == ["102", "103"]
+
+    def test_invalid_period(self, hotel):
+        with pytest.raises(InvalidDataError):
+            HotelRoom.find_available(date(2026, 3, 4), date(2026, 3, 4))
+
+
+class TestOccupancyCalendar:
+
+    @pytest.fixture
+    def room_prices(self):
+        return (100.0, 100.0, 100.0)
+
+    @pytest.fixture
+    def hotel_bookings(self):
+        return [Booking(1, 1, date(2026, 1, 10), date(2026, 1, 15)),
+                Booking(1, 1, date(2026, 1, 17), date(2026, 1, 20)),
+                Booking(1, 2, date(2026, 1, 12), date(2026, 1, 14)),
+                Booking(1, 3, date(2026, 1, 1), date(2026, 1, 30), is_active=False)]
+
+    def test_free_rooms_per_day(self, hotel):
+        free = occupancy_calendar.free_rooms_per_day(date(2026, 1, 9), date(2026, 1, 16))
+        assert free.tolist() == [3, 2, 2, 1, 1, 2, 3]
+
+    def test_rooms_free_for_range(self, hotel):
+        assert occupancy_calendar.rooms_free_for(date(2026, 1, 14), date(2026, 1, 17)) == [2, 3]
+        assert occupancy_calendar.rooms_free_for(date(2025, 12, 1), date(2025, 12, 5)) == [1, 2, 3]
+        # Перенос брони не конфликтует с ней самой
+        assert occupancy_calendar.rooms_free_for(date(2026, 1, 11), date(2026, 1, 16), exclude_booking_id=1) == [1, 3]
+
+    def test_first_free_gap(self, hotel):
+        assert occupancy_calendar.first_free_gap(1, 2, date(2026, 1, 10)) == date(2026, 1, 15)
+        assert occupancy_calendar.first_free_gap(1, 3, date(2026, 1, 10)) == date(2026, 1, 20)
+        assert occupancy_calendar.first_free_gap(1, 3, date(2026, 1, 10), date(2026, 1, 20)) is None
+        assert occupancy_calendar.first_free_gap(1, 3, date(2026, 1, 10), exclude_booking_id=1) == date(2026, 1, 10)
+
+    def test_earliest_free_gap_across_rooms(self, hotel):
+        assert occupancy_calendar.earliest_free_gap(3, date(2026, 1, 12), room_ids=[1, 2]) == (date(2026, 1, 14), 2)
+        assert occupancy_calendar.earliest_free_gap(3, date(2026, 1, 12)) == (date(2026, 1, 12), 3)
+        assert occupancy_calendar.earliest_free_gap(3, date(2026, 1, 12), date(2026, 1, 14), room_ids=[1, 2]) is None
+
+    def test_occupied_nights_and_updates(self, hotel):
+        assert occupancy_calendar.occupied_nights(date(2026, 1, 1), date(2026, 2, 1)) == {1: 8, 2: 2, 3: 0}
+
+        booking = Booking(1, 3, date(2026, 1, 30), date(2026, 2, 3))
+        booking.save()
+        assert occupancy_calendar.occupied_nights(date(2026, 1, 1), date(2026, 2, 1))[3] == 2
+
+        booking.set_is_active(False)
+        booking.update()
+        Booking.get_by_id(1).delete()
+        assert occupancy_calendar.occupied_nights(date(2026, 1, 1), date(2026, 2, 1)) == {1: 3, 2: 2, 3: 0}
+
+    def test_matches_find_available(self, hotel):
+        for start, end in [(date(2026, 1, d), date(2026, 1, d + n)) for d in range(5, 25) for n in (1, 3, 7)]:
+            expected = [room.id for room in HotelRoom.find_available(start, end)]
+            assert sorted(occupancy_calendar.rooms_free_for(start, end)) == sorted(expected)
+
+    def test_size_for_large_hotel(self):
+        # 1000 комнат x 5 лет - меньше 2 МБ
+        calendar = OccupancyCalendar()
+        calendar._loaded = True
+        calendar._extend(date(2026, 1, 1), date(2031, 1, 1))
+        calendar._rows(range(1, 1001))
+        assert calendar.nbytes() < 2 * 1024 * 1024
+
+
+class TestGuestLookup:
+
+    @pytest.fixture
+    def guests(self, memory_db):
+        return Guest.save_many([Guest("Alice", "Smith", "987654321", "AB123456"),
+                                Guest("Bob", "Smith", "555555555", "CD654321", "Jr"),
+                                Guest("Alice", "Smith", "111111111", "EF000000")])
+
+    def test_find_by_passport_and_phone(self, guests):
+        assert Guest.find_by_passport("CD654321").id == guests[1].id
+        assert Guest.find_by_phone(" 111111111 ").id == guests[2].id
+        assert Guest.find_by_passport("XX000000") is None
+        assert Guest.find_by_phone("") is None
+
+    def test_stale_key_index_entry_rechecked(self, guests):
+        guest = guests[0]
+        guest.set_passport_data("ZZ999999")
+        guest.update()
+        Guest._key_index.put(('passport_data', "AB123456"), guest.id)
+        assert Guest.find_by_passport("AB123456") is None
+        assert Guest.find_by_passport("ZZ999999").id == guest.id
+
+    def test_key_index_bounded_and_pruned_on_delete(self, guests, monkeypatch):
+        assert Guest._key_index.get(('passport_data', "AB123456")) == guests[0].id
+        guests[0].delete()
+        assert Guest._key_index.get(('passport_data', "AB123456")) is None
+        assert Guest._key_index.get(('phone_num', guests[0].get_phone_num())) is None
+
+        monkeypatch.setattr(Guest._key_index, 'maxsize', 2)
+        Guest.update_many(guests[1:])
+        assert Guest._key_index.stats()['size'] == 2
+        assert Guest.find_by_passport("CD654321").id == guests[1].id
+
+    def test_find_by_name(self, guests):
+        assert [guest.id for guest in Guest.find_by_name("Smith Alice")] == [guests[0].id, guests[2].id]
+        assert [guest.id for guest in Guest.find_by_name("Smith  Bob Jr")] == [guests[1].id]
+        assert Guest.find_by_name("Smith Bob") == []
+
+
+class TestChangeNotifier:
+
+    def test_each_model_has_own_listeners(self, memory_db, monkeypatch):
+        changes = []
+        monkeypatch.setattr(Guest, '_listeners', [])
+        monkeypatch.setattr(HotelRoom, '_listeners', [])
+        Guest.subscribe(lambda id, row: changes.append(('guest', id, row and row['surname'])))
+        HotelRoom(101, 100.0, "Standard", 2).save()
+        guest = Guest("Олег", "Сидоров", "89007770000", "GH111111")
+        with Database().transaction():
+            guest.save()
+            # До фиксации подписчики не вызываются
+            assert changes == []
+        guest.delete()
+        assert changes == [('guest', guest.id, "Сидоров"), ('guest', guest.id, None)]
+        assert Booking._listeners is not Guest._listeners
+
+class TestGuestSearch:
+
+    @pytest.fixture
+    def guests(self, memory_db):
+        return Guest.save_many([Guest("Иван", "Петров", "+7 (900) 111-22-33", "AB123456", "Сергеевич"),
+                                Guest("Петр", "Иванов", "89005554433", "CD654321"),
+                                Guest("Анна", "Петрова", "89001234567", "EF000000")])
+
+    def names(self, text, limit=20):
+        return [match['full_name'] for match in guest_search.search(text, limit)]
+
+    def test_prefix_search(self, guests):
+        # Сначала точное совпадение слова, затем более длинные по алфавиту
+        assert self.names("петр") == ["Иванов Петр", "Петров Иван Сергеевич", "Петрова Анна"]
+        assert self.names("петр ан") == ["Петрова Анна"]
+        assert self.names("ИВАН серг") == ["Петров Иван Сергеевич"]
+        assert self.names("петр", limit=1) == ["Иванов Петр"]
+        assert self.names("   ") == []
+
+    def test_phone_search(self, guests):
+        assert self.names("8900555") == ["Иванов Петр"]
+        assert self.names("7900") == ["Петров Иван Сергеевич"]
+
+    def test_fuzzy_fallback(self, guests):
+        assert "Петрова Анна" in self.names("петрава")
+
+    def test_updates_after_save_and_delete(self, guests):
+        assert self.names("сидор") == []
+        guest = Guest("Олег", "Сидоров", "89007770000", "GH111111")
+        guest.save()
+        assert self.names("сидор") == ["Сидоров Олег"]
+        guest.set_surname("Смирнов")
+        guest.update()
+        assert self.names("сидор") == []
+        assert self.names("смир") == ["Смирнов Олег"]
+        guest.delete()
+        assert self.names("смир") == []
+
+    def test_names_match_find_by_name(self, guests):
+        for match in guest_search.search("петр"):
+            assert match['id'] in [guest.id for guest in Guest.find_by_name(match['full_name'])]
+
+    def test_load_and_reload_in_background(self, guests):
+        assert not guest_search.loaded
+        worker = threading.Thread(target=guest_search.load)
+        worker.start()
+        worker.join(5)
+        assert guest_search.loaded
+        assert self.names("сидор") == []
+        # Изменение с другого рабочего места видно только после перестроения
+        Database().execute_query("UPDATE guests SET surname = %s WHERE id = %s", ("Сидоров", 2))
+        assert self.names("сидор") == []
+        guest_search.reload()
+        assert self.names("сидор") == ["Сидоров Петр"]
+
+    def test_search_during_reload_uses_previous_index(self, guests, monkeypatch):
+        guest_search.load()
+        built, release = threading.Event(), threading.Event()
+        build = guest_search._build
+
+        def slow_build():
+            data = build()
+            built.set()
+            release.wait(5)
+            return data
+
+        monkeypatch.setattr(guest_search, '_build', slow_build)
+        worker = threading.Thread(target=guest_search.reload)
+        worker.start()
+        assert built.wait(5)
+        # Поиск не ждет перестроения и идет по прежнему индексу
+        assert self.names("петр") == ["Иванов Петр", "Петров Иван Сергеевич", "Петрова Анна"]
+        # Изменение, сохраненное после чтения из БД, попадает и в новую копию
+        guest = Guest("Олег", "Сидоров", "89007770000", "GH111111")
+        guest.save()
+        release.set()
+        worker.join(5)
+        assert self.names("сидор") == ["Сидоров Олег"]
+        assert len(guest_search) == 4
+
+
+class TestPagination:
+
+    @pytest.fixture
+    def rooms(self, memory_db):
+        prices = [300.0, 100.0, 200.0, 100.0, 150.0, 100.0, 250.0]
+        return HotelRoom.save_many([HotelRoom(str(101 + i), price, "Standard", 2) for i, price in enumerate(prices)])
+
+    def collect(self, order_by, limit=3):
+        pages = []
+        after_id = None
+        while True:
+            page = HotelRoom.get_page(after_id=after_id, limit=limit, order_by=order_by)
+            pages.append([room.id for room in page])
+            if len(page) < limit:
+                return pages
+            after_id = page[-1].id
+
+    def test_pages_by_id(self, rooms):
+        assert self.collect('id') == [[1, 2, 3], [4, 5, 6], [7]]
+
+    @pytest.mark.parametrize("order_by", ['price', '-price'])
+    def test_pages_cover_ties_in_order(self, rooms, order_by):
+        pages = self.collect(order_by)
+        expected = sorted(rooms, key=lambda room: (room.get_price(), room.id), reverse=order_by.startswith('-'))
+        assert sum(pages, []) == [room.id for room in expected]
+        assert pages[0] == ([1, 7, 3] if order_by.startswith('-') else [2, 4, 6])
+
+    def test_invalid_order(self, rooms):
+        with pytest.raises(ValueError):
+            HotelRoom.get_page(order_by='type; DROP TABLE rooms')
+
+    def test_booking_details_after_id(self, rooms):
+        Guest("Alice", "Smith", "987654321", "AB123456").save()
+        Booking.save_many([Booking(1, room.id, date(2026, 1, 1), date(2026, 1, 3)) for room in rooms])
+        page = Booking.list_with_details({'after_id': 5}, order='id', limit=10)
+        assert [row['id'] for row in page] == [6, 7]
+        page = Booking.list_with_details({'after_id': 5}, order='-id', limit=2)
+        assert [row['id'] for row in page] == [4, 3]
+        with pytest.raises(ValueError):
+            Booking.list_with_details({'after_id': 5}, order='guest')
+
+
+class TestRowSources:
+
+    class FakeTable:
+        def __init__(self, size):
+            self.ids = list(range(1, size + 1))
+            self.calls = []
+
+        def fetch_page(self, after_id, offset, limit):
+            self.calls.append((after_id, offset))
+            start = self.ids.index(after_id) + 1 if after_id is not None else offset or 0
+            return [{'id': id} for id in self.ids[start:start + limit]]
+
+    def test_query_source_keyset_and_jumps(self):
+        table = self.FakeTable(250)
+        source = QuerySource(table.fetch_page, count=lambda: len(table.ids), page_size=100, cache_pages=2)
+        assert len(source) == 250
+        assert [row['id'] for row in source.rows(95, 105)] == list(range(96, 106))
+        assert table.calls == [(None, None), (100, None)]
+
+        # Прыжок полосой прокрутки на страницу без известного ключа - через OFFSET
+        table = self.FakeTable(250)
+        source = QuerySource(table.fetch_page, count=lambda: len(table.ids), page_size=100, cache_pages=2)
+        assert [row['id'] for row in source.rows(240, 250)] == list(range(241, 251))
+        assert table.calls == [(None, 200)]
+
+    def test_query_source_cache_bounded(self):
+        table = self.FakeTable(1000)
+        source = QuerySource(table.fetch_page, count=lambda: 1000, page_size=100, cache_pages=2)
+        for start in range(0, 1000, 50):
+            source.rows(start, start + 50)
+        assert len(source._pages) == 2
+        assert len(table.calls) == 10
+
+    def test_query_source_loaded_without_fetching(self):
+        table = self.FakeTable(250)
+        source = QuerySource(table.fetch_page, count=lambda: len(table.ids), page_size=100)
+        assert not source.loaded(95, 105)
+        assert table.calls == []
+        # Страницы читает фоновый поток, окно только проверяет loaded()
+        worker = threading.Thread(target=source.rows, args=(95, 105))
+        worker.start()
+        worker.join(5)
+        assert source.loaded(95, 105)
+        assert not source.loaded(195, 205)
+        assert [row['id'] for row in source.rows(95, 105)] == list(range(96, 106))
+        assert table.calls == [(None, None), (100, None)]
+        assert ListSource([1, 2]).loaded(0, 2)
+
+    def test_list_and_dataframe_sources(self):
+        import pandas as pd
+        assert ListSource([1, 2, 3]).rows(1, 10) == [2, 3]
+        source = DataFrameSource(pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z']}))
+        assert len(source) == 3
+        assert source.rows(1, 3) == [(2, 'y'), (3, 'z')]
+
+    def test_bookings_query_source(self, memory_db):
+        HotelRoom("101", 100.0, "Standard", 2).save()
+        Guest("Alice", "Smith", "987654321", "AB123456").save()
+        Booking.save_many([Booking(1, 1, date(2026, 1, d), date(2026, 1, d + 1)) for d in range(1, 26)])
+        source = QuerySource(lambda after_id, offset, limit: Booking.list_with_details(
+            {'after_id': after_id}, order='id', limit=limit, offset=offset), count=Booking.count, page_size=10)
+        assert len(source) == 25
+        assert [row['id'] for row in source.rows(0, 25)] == list(range(1, 26))
+        assert [row['id'] for row in source.rows(22, 25)] == [23, 24, 25]
+
+
+class TestStartupImports:
+
+    def test_heavy_modules_not_imported_by_main_window(self):
+        import subprocess
+        import sys
+        code = ("import sys, gui.main_window; "
+                "print(','.join(m for m in ('pandas', 'numpy', 'reportlab') if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == ""
+
+    def test_import_timer_records_new_modules(self):
+        from import_timer import ImportTimer
+        import sys
+        sys.modules.pop('colorsys', None)
+        timer = ImportTimer()
+        timer.start()
+        try:
+            import colorsys
+        finally:
+            timer.stop()
+        assert 'colorsys' in timer.timings
+        assert timer.report()[0][0] == 'colorsys'
+
+
+class TestTaskExecutor:
+
+    class Scheduler:
+        """Вместо виджета Tk: запоминает отложенные вызовы after()"""
+
+        def __init__(self):
+            self.calls = []
+
+        def after(self, ms, callback):
+            self.calls.append(callback)
+
+    @staticmethod
+    def drain(executor, timeout=5):
+        deadline = time.time() + timeout
+        while executor.busy and time.time() < deadline:
+            time.sleep(0.01)
+            executor.poll()
+        assert not executor.busy
+
+    def test_result_is_delivered_on_poll(self):
+        scheduler = self.Scheduler()
+        states, results = [], []
+        executor = TaskExecutor(scheduler, on_busy=states.append)
+
+        executor.submit(lambda task: 42, on_done=results.append)
+        assert states == [True]
+        assert scheduler.calls
+
+        self.drain(executor)
+        assert results == [42]
+        assert states == [True, False]
+
+    def test_failing_callback_does_not_stop_polling(self):
+        states, results = [], []
+        executor = TaskExecutor(self.Scheduler(), on_busy=states.append)
+
+        def on_done(result):
+            raise RuntimeError("ошибка в окне")
+
+        executor.submit(lambda task: 1, on_done=on_done)
+        executor.submit(lambda task: 2, on_done=results.append)
+        self.drain(executor)
+        assert results == [2]
+        assert states == [True, False]
+
+    def test_same_key_replaces_running_task(self):
+        executor = TaskExecutor(self.Scheduler())
+        release = threading.Event()
+        results = []
+
+        def slow(task):
+            release.wait(5)
+            return 'old'
+
+        first = executor.submit(slow, on_done=results.append, key='page')
+        executor.submit(lambda task: 'new', on_done=results.append, key='page')
+        release.set()
+
+        self.drain(executor)
+        assert first.cancelled
+        assert results == ['new']
+
+    def test_progress_and_error(self):
+        executor = TaskExecutor(self.Scheduler())
+        progress, errors = [], []
+
+        def failing(task):
+            task.progress(1, 2)
+            raise ValueError("нет данных")
+
+        executor.submit(failing, on_done=lambda result: pytest.fail("on_done"),
+                        on_error=errors.append, on_progress=lambda done, total, text: progress.append((done, total)))
+        self.drain(executor)
+        assert progress == [(1, 2)]
+        assert isinstance(errors[0], ValueError)
+
+    def test_cancelled_task_reports_nothing(self):
+        executor = TaskExecutor(self.Scheduler())
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def work(task):
+            started.set()
+            release.wait(5)
+            task.check_cancelled()
+            return 'done'
+
+        task = executor.submit(work, on_done=calls.append, on_error=calls.append)
+        started.wait(5)
+        task.cancel()
+        release.set()
+        self.drain(executor)
+        assert calls == []
+        assert task.done
+
+    def test_database_work_runs_in_worker_thread(self, memory_db):
+        guest = Guest("Alice", "Smith", "987654321", "AB123456")
+        guest.save()
+        executor = TaskExecutor(self.Scheduler())
+        results = []
+
+        executor.submit(lambda task: (threading.current_thread().name, Guest.get_by_id(guest.id).full_name()),
+                        on_done=results.append)
+        self.drain(executor)
+        thread_name, full_name = results[0]
+        assert thread_name.startswith("ui-task")
+        assert full_name == guest.full_name()
+
+
+class TestReportEngine:
+
+    @pytest.fixture
+    def room_prices(self):
+        return (100.0, 100.0, 100.0)
+
+    @pytest.fixture
+    def hotel_bookings(self):
+        return [Booking(1, 1, date(2026, 1, 10), date(2026, 1, 15)),
+                Booking(1, 1, date(2026, 1, 17), date(2026, 1, 20)),
+                Booking(1, 2, date(2026, 1, 12), date(2026, 1, 14)),
+                Booking(1, 3, date(2026, 1, 1), date(2026, 1, 30), is_active=False)]
+
+    @pytest.fixture
+    def engine(self, hotel):
+        from services.report_engine import ReportEngine
+        return ReportEngine.from_db(with_guests=True)
+
+    def test_occupancy_counts_active_days(self, engine):
+        report = engine.occupancy(date(2026, 1, 1), date(2026, 1, 31))
+        assert report['number'].tolist() == ['101', '102', '103']
+        assert report['total_days'].tolist() == [31, 31, 31]
+        assert report['occupied_days'].tolist() == [10, 3, 0]
+        assert report['revenue'].tolist() == [1000.0, 300.0, 0.0]
+
+    def test_financial_totals(self, engine):
+        totals = engine.financial(date(2026, 1, 11), date(2026, 1, 13))
+        assert totals['total_bookings'] == 2
+        assert totals['room_revenue'] == 500.0
+        assert totals['avg_occupancy'] == pytest.approx(5 / 9 * 100)
+
+    def test_guest_stats_skip_guests_without_bookings(self, engine):
+        report = engine.guest_stats(date(2026, 1, 11), date(2026, 1, 13))
+        assert report['full_name'].tolist() == ["Smith Alice"]
+        row = report.iloc[0]
+        assert row['total_bookings'] == 4
+        assert row['total_nights'] == 8
+        assert row['total_spent'] == 800.0
+        assert str(row['last_booking'])[:10] == "2026-01-17"
+
+    @pytest.mark.parametrize("start, end", [(date(2026, 1, 1), date(2026, 1, 31)),
+                                            (date(2026, 1, 11), date(2026, 1, 13)),
+                                            (date(2025, 6, 1), date(2025, 6, 30))])
+    def test_sql_mode_matches_engine(self, engine, start, end):
+        from services.report_queries import ReportQueries
+        expected = list(engine.occupancy(start, end).itertuples(index=False, name=None))
+        assert ReportQueries.occupancy(start, end) == pytest.approx(expected)
+        assert ReportQueries.financial(start, end) == pytest.approx(engine.financial(start, end))
+
+        guests = ReportQueries.guest_stats(start, end)
+        expected = engine.guest_stats(start, end)
+        assert [row[:4] for row in guests] == list(expected.iloc[:, :4].itertuples(index=False, name=None))
+        assert [row[4] for row in guests] == [date(2026, 1, 17)]
+        assert [row[5] for row in guests] == expected['total_spent'].tolist()
+
+    def test_sqlite_has_mysql_report_functions(self, memory_db):
+        row = Database().fetch_one("SELECT DATEDIFF(%s, %s) AS days, GREATEST(1, 3, 2) AS hi, LEAST(%s, %s) AS lo",
+                                   (date(2026, 3, 1), date(2026, 2, 1), date(2026, 1, 5), date(2026, 1, 3)))
+        assert row == {'days': 28, 'hi': 3, 'lo': '2026-01-03'}
+
+
+@pytest.mark.usefixtures('facts_mode')
+class TestRoomDayStats:
+
+    @staticmethod
+    def days(booking_id=None):
+        query = "SELECT day, room_id, guest_id, is_active FROM room_day_stats"
+        params = ()
+        if booking_id is not None:
+            query += " WHERE booking_id = %s"
+            params = (booking_id,)
+        return Database().fetch_all(query + " ORDER BY day, room_id", params)
+
+    def test_booking_writes_keep_days_current(self, hotel):
+        assert len(self.days(1)) == 6
+        assert self.days(2)[0] == {'day': date(2026, 1, 12), 'room_id': 2, 'guest_id': 2, 'is_active': True}
+        assert len(self.days(3)) == 30 and not any(row['is_active'] for row in self.days(3))
+
+        booking = Booking.get_by_id(1)
+        booking.set_check_out_date(date(2026, 1, 12))
+        booking.update()
+        assert [row['day'] for row in self.days(1)] == [date(2026, 1, 10), date(2026, 1, 11), date(2026, 1, 12)]
+
+        # Выезд не убирает дни из отчета по гостям
+        booking.set_is_active(False)
+        booking.update()
+        assert [row['is_active'] for row in self.days(1)] == [False] * 3
+
+        Booking.get_by_id(2).delete()
+        assert self.days(2) == []
+
+    def test_not_written_outside_facts_mode(self, hotel, monkeypatch):
+        monkeypatch.setattr(room_day_stats, 'enabled', False)
+        booking = Booking(2, 3, date(2026, 2, 1), date(2026, 2, 4))
+        booking.save()
+        booking.set_is_active(False)
+        booking.update()
+        assert self.days(booking.id) == []
+
+    def test_rolled_back_booking_leaves_no_days(self, hotel):
+        with pytest.raises(RuntimeError):
+            with Database().transaction():
+                Booking(2, 3, date(2026, 2, 1), date(2026, 2, 4)).save()
+                raise RuntimeError("отмена")
+        assert len(self.days()) == 39
+
+    def test_backfill_rebuilds_table(self, hotel):
+        from models.room_day_stats import room_day_stats
+        expected = self.days()
+        Database().execute_query("DELETE FROM room_day_stats")
+        assert room_day_stats.backfill(batch_size=2) == 39
+        assert self.days() == expected
+
+    def test_failed_backfill_keeps_table(self, hotel, monkeypatch):
+        from models.room_day_stats import room_day_stats
+        expected = self.days()
+        days = room_day_stats._days
+        batches = []
+
+        def failing_days(rows):
+            batches.append(rows)
+            if len(batches) == 2:
+                raise RuntimeError("сбой")
+            return days(rows)
+
+        monkeypatch.setattr(room_day_stats, '_days', failing_days)
+        with pytest.raises(RuntimeError):
+            room_day_stats.backfill(batch_size=2)
+        # Удаление откатывается вместе с уже записанной частью
+        assert self.days() == expected
+
+    def test_fact_reports(self, hotel):
+        from services.report_queries import FactReports
+        occupancy = FactReports.occupancy(date(2026, 1, 1), date(2026, 1, 31))
+        assert [row[3] for row in occupancy] == [6, 3, 0]
+        assert [row[5] for row in occupancy] == [600.0, 600.0, 0.0]
+
+        totals = FactReports.financial(date(2026, 1, 11), date(2026, 1, 13))
+        assert totals == {'room_revenue': 700.0, 'avg_occupancy': pytest.approx(5 / 9 * 100), 'total_bookings': 2}
+
+        guests = FactReports.guest_stats(date(2026, 1, 11), date(2026, 1, 13))
+        assert guests == [("Smith Alice", "987654321", 2, 6, date(2026, 1, 10), 1200.0),
+                          ("Jones Bob", "123456789", 1, 2, date(2026, 1, 12), 400.0)]
+
+
+@pytest.mark.usefixtures('facts_mode')
+class TestReportModes:
+    """Все режимы REPORT_MODE дают одинаковые отчеты"""
+
+    @pytest.fixture
+    def room_prices(self):
+        return (100.0, 200.0, 300.0, 400.0)
+
+    @pytest.fixture
+    def hotel_guests(self, hotel_guests):
+        # Гость без бронирований в отчет не попадает
+        return hotel_guests + [Guest("Carol", "White", "555000111", "EF000111")]
+
+    @pytest.fixture
+    def hotel_bookings(self):
+        return [Booking(1, 1, date(2026, 1, 10), date(2026, 1, 15)),
+                Booking(2, 1, date(2026, 1, 12), date(2026, 1, 14)),
+                Booking(2, 2, date(2026, 1, 15), date(2026, 1, 20)),
+                Booking(1, 3, date(2026, 1, 1), date(2026, 1, 30), is_active=False),
+                Booking(2, 4, date(2026, 1, 5), date(2026, 1, 8))]
+
+    @staticmethod
+    def reports(start, end):
+        from services.report_engine import ReportEngine
+        from services.report_queries import FactReports, ReportQueries
+        engine = ReportEngine.from_db(with_guests=True)
+        guests = [row[:4] + (row[4].date(),) + row[5:]
+                  for row in engine.guest_stats(start, end).itertuples(index=False, name=None)]
+        results = {'engine': (list(engine.occupancy(start, end).itertuples(index=False, name=None)),
+                              engine.financial(start, end), guests)}
+        for mode, backend in (('sql', ReportQueries), ('facts', FactReports), ('incremental', report_aggregates)):
+            results[mode] = (backend.occupancy(start, end), backend.financial(start, end),
+                             backend.guest_stats(start, end))
+        return results
+
+    @pytest.mark.parametrize("start, end", [(date(2026, 1, 1), date(2026, 1, 31)),
+                                            (date(2026, 1, 11), date(2026, 1, 13)),
+                                            (date(2025, 6, 1), date(2025, 6, 30)),
+                                            (date(2025, 1, 1), date(2026, 12, 31))])
+    def test_modes_agree(self, hotel, start, end):
+        report_aggregates.occupancy(start, end)
+
+        # Выезд, смена цены и удаление номера после построения агрегатов
+        booking = Booking.get_by_id(1)
+        booking.set_is_active(False)
+        booking.update()
+        room = HotelRoom.get_by_id(2)
+        room.set_price(250.0)
+        room.update()
+        HotelRoom.get_by_id(4).delete()
+
+        results = self.reports(start, end)
+        for mode in ('sql', 'facts', 'incremental'):
+            assert results[mode] == results['engine'], mode
+
+    def test_checked_out_stay_counts_for_guest(self, hotel):
+        booking = Booking.get_by_id(1)
+        booking.set_is_active(False)
+        booking.update()
+        results = self.reports(date(2026, 1, 1), date(2026, 1, 31))
+        for occupancy, totals, guests in results.values():
+            assert [row[3] for row in occupancy] == [3, 6, 0, 4]
+            assert totals['room_revenue'] == 3100.0
+            assert guests[0][2:4] == (2, 36)
+
+
+class TestReportCache:
+
+    def test_data_version_changes_after_commit(self, memory_db):
+        before = memory_db.data_version('rooms', 'guests')
+        with memory_db.transaction():
+            HotelRoom("101", 100.0, "Standard", 2).save()
+            assert memory_db.data_version('rooms', 'guests') == before
+        after = memory_db.data_version('rooms', 'guests')
+        assert after[1] > before[1] and after[2] == before[2]
+
+        with pytest.raises(RuntimeError):
+            with memory_db.transaction():
+                Guest("Alice", "Smith", "987654321", "AB123456").save()
+                raise RuntimeError("отмена")
+        assert memory_db.data_version('rooms', 'guests') == after
+
+    def test_hit_until_data_changes(self, memory_db):
+        from services.report_cache import ReportCache
+        cache = ReportCache(maxsize=2)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return [len(builds)]
+
+        start, end = date(2026, 1, 1), date(2026, 1, 31)
+        assert cache.get_or_build('occupancy', start, end, build) == [1]
+        assert cache.get_or_build('occupancy', start, end, build) == [1]
+        assert cache.get_or_build('financial', start, end, build) == [2]
+
+        Booking(1, 1, date(2026, 1, 10), date(2026, 1, 15)).save()
+        assert cache.get_or_build('occupancy', start, end, build) == [3]
+        assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 3, 'hit_rate': 0.25}
+
+    def test_refresh_rebuilds_cached_report(self, memory_db):
+        from services.report_cache import ReportCache
+        cache = ReportCache()
+        start, end = date(2026, 1, 1), date(2026, 1, 31)
+        cache.get_or_build('occupancy', start, end, lambda: ['старый'])
+        # Изменение с другого рабочего места версию данных не меняет
+        assert cache.get_or_build('occupancy', start, end, lambda: ['новый'], refresh=True) == ['новый']
+        assert cache.get_or_build('occupancy', start, end, lambda: pytest.fail("отчет должен быть в кэше")) == ['новый']
+
+    def test_lru_eviction(self, memory_db):
+        from services.report_cache import ReportCache
+        cache = ReportCache(maxsize=2)
+        months = [(date(2026, month, 1), date(2026, month, 28)) for month in (1, 2, 3)]
+        for start, end in months:
+            cache.get_or_build('occupancy', start, end, lambda: [start])
+        cache.get_or_build('occupancy', *months[2], lambda: pytest.fail("отчет должен быть в кэше"))
+        assert cache.get_or_build('occupancy', *months[0], lambda: ['заново']) == ['заново']
+        assert cache.stats()['size'] == 2
+
+
+@pytest.mark.usefixtures('facts_mode')
+class TestReportAggregates:
+
+    @pytest.fixture
+    def hotel_bookings(self, hotel_bookings):
+        return hotel_bookings + [Booking(2, 1, date(2026, 1, 14), date(2026, 1, 20))]
+
+    @staticmethod
+    def assert_matches_facts(start, end):
+        from services.report_queries import FactReports
+        assert report_aggregates.occupancy(start, end) == FactReports.occupancy(start, end)
+        assert report_aggregates.financial(start, end) == FactReports.financial(start, end)
+        assert report_aggregates.guest_stats(start, end) == FactReports.guest_stats(start, end)
+
+    def test_matches_fact_reports(self, hotel):
+        self.assert_matches_facts(date(2026, 1, 1), date(2026, 1, 31))
+        self.assert_matches_facts(date(2026, 1, 13), date(2026, 1, 16))
+
+    def test_booking_changes_update_reports(self, hotel):
+        start, end = date(2026, 1, 1), date(2026, 1, 31)
+        report_aggregates.occupancy(start, end)
+
+        booking = Booking.get_by_id(1)
+        booking.set_check_out_date(date(2026, 1, 13))
+        booking.update()
+        Booking.get_by_id(3).delete()
+        Booking(2, 3, date(2026, 1, 28), date(2026, 2, 3)).save()
+        guest = Guest.get_by_id(2)
+        guest.set_phone_num("555000111")
+        guest.update()
+        self.assert_matches_facts(start, end)
+
+    def test_rolled_back_booking_is_not_counted(self, hotel):
+        start, end = date(2026, 1, 1), date(2026, 1, 31)
+        before = report_aggregates.financial(start, end)
+        with pytest.raises(RuntimeError):
+            with Database().transaction():
+                Booking(2, 3, date(2026, 1, 5), date(2026, 1, 8)).save()
+                raise RuntimeError("отмена")
+        assert report_aggregates.financial(start, end) == before
+
+    def test_room_changes_rebuild(self, hotel):
+        start, end = date(2026, 1, 1), date(2026, 1, 31)
+        report_aggregates.occupancy(start, end)
+        HotelRoom("104", 400.0, "Suite", 4).save()
+        assert len(report_aggregates.occupancy(start, end)) == 4
+
+        room = HotelRoom.get_by_id(1)
+        room.set_price(150.0)
+        room.update()
+        self.assert_matches_facts(start, end)
+
+    def test_front_desk_flow_does_not_rebuild(self, hotel, monkeypatch):
+        start, end = date(2026, 1, 1), date(2026, 1, 31)
+        report_aggregates.occupancy(start, end)
+        monkeypatch.setattr(report_aggregates, '_load', lambda: pytest.fail("агрегаты перестроены"))
+
+        # Как BookingDialog._create_booking: бронь и статус номера одной транзакцией
+        booking = Booking(2, 3, date(2026, 1, 22), date(2026, 1, 26))
+        with Database().transaction():
+            booking.save()
+            room = HotelRoom.get_by_id(3)
+            room.set_free(False)
+            room.update()
+
+        # Как BookingsTab.check_out
+        with Database().transaction():
+            room = HotelRoom.get_by_id(3)
+            room.set_free(True)
+            room.update()
+            booking.set_is_active(False)
+            booking.update()
+
+        self.assert_matches_facts(start, end)
+
+    def test_apply_does_not_wait_for_report(self, hotel):
+        start, end = date(2026, 1, 1), date(2026, 1, 31)
+        report_aggregates.occupancy(start, end)
+        # Другой поток строит отчет и держит блокировку
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with report_aggregates._lock:
+                locked.set()
+                release.wait()
+
+        worker = threading.Thread(target=hold_lock)
+        worker.start()
+        locked.wait()
+        Booking(2, 3, date(2026, 1, 22), date(2026, 1, 26)).save()
+        release.set()
+        worker.join()
+        self.assert_matches_facts(start, end)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file